@@ -1,345 +1,31 @@
-import gradio as gr
-import boto3
-from PIL import Image
 import io
-import base64
-import json
 import os
-import cv2
-import numpy as np
+import sqlite3
 import tempfile
-import uuid
 import time
-from pathlib import Path
+import uuid
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+# 处理逻辑在core模块中，OpenCV、PIL和boto3通过core按需加载
+from core import (
+    ADAPTIVE_SAMPLING, AWS_JOB_CONCURRENCY_LIMIT, BEDROCK_CONCURRENCY_LIMIT, BEDROCK_LIMITER,
+    CASCADE_MODEL_NAME, CPU_WORKERS, DEFAULT_IMAGE_ENCODING, OCR_RUNS, OcrRunBudget, QUEUE_MAX_SIZE,
+    RESULTS_STORE, S3_BYTE_CACHE, S3_CONCURRENCY_LIMIT, S3_TRANSFER_WORKERS, SEARCH_KINDS,
+    TEXT_PRESENCE_THRESHOLDS, TRANSCRIBE_CONCURRENCY_LIMIT,
+    build_subtitle_timeline, check_batch_ocr_job, check_transcribe_job_status, commit_s3_changes,
+    compare_image_encodings, detect_subtitle_region, encode_image_for_bedrock, extract_text,
+    extract_text_stream, extract_video_frames, format_subtitle_cues, gallery_thumbnails, get_ocr_run,
+    invoke_bedrock_ocr, iter_transcribe_job_status, list_s3_changes, list_s3_images, list_s3_videos,
+    ocr_local_frames, open_frame_archive, open_video_capture, pack_frame_archive, parse_s3_path,
+    read_s3_frame, register_ocr_run, resolve_s3_frame, run_batch_transcription, run_frame_pipeline,
+    run_in_cpu_pool, select_image, submit_batch_ocr_job, summarize_ocr_usage, transcribe_video,
+    unpack_frame_archive, upload_frames_to_s3,
+)
+from core import LazyModule, boto3, cv2, Image
 
-def get_model_id(model_name):
-    """根据界面选择的模型名称返回Bedrock模型ID"""
-    model_mapping = {
-        "Claude 3 Opus": "us.anthropic.claude-3-opus-20240229-v1:0",
-        "Claude 3 Sonnet": "us.anthropic.claude-3-sonnet-20240229-v1:0",
-        "Claude 3.5 Haiku": "us.anthropic.claude-3-5-haiku-20241022-v1:0",
-        "Claude 3.5 Sonnet v2": "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
-        "Claude 3.5 Sonnet v1": "us.anthropic.claude-3-5-sonnet-20240620-v1:0",
-        "Claude 3.7 Sonnet": "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
-        "Nova Lite": "us.amazon.nova-lite-v1:0",
-        "Nova Pro": "us.amazon.nova-pro-v1:0"
-    }
-    return model_mapping.get(model_name)
-
-def get_language_name(lang_code):
-    """将语言代码转换为完整名称"""
-    language_map = {
-        "SA": "梵文/阿拉伯语",
-        "JP": "日语",
-        "KR": "韩语",
-        "FR": "法语",
-        "IT": "意大利语",
-        "DE": "德语",
-        "UA": "乌克兰语",
-        "TR": "土耳其语"
-    }
-    return language_map.get(lang_code, "未知语言")
-
-def list_s3_videos(s3_path):
-    """列出S3路径下的所有视频文件并返回用于展示的格式"""
-    try:
-        if not s3_path:
-            return [], []
-            
-        # 处理s3://前缀
-        if s3_path.startswith('s3://'):
-            s3_path = s3_path[5:]  # 移除's3://'前缀
-            
-        # 解析bucket和prefix
-        parts = s3_path.strip('/').split('/', 1)
-        bucket = parts[0]
-        prefix = parts[1] if len(parts) > 1 else ""
-        
-        # 创建S3客户端
-        s3_client = boto3.client('s3')
-        
-        # 列出对象
-        response = s3_client.list_objects_v2(
-            Bucket=bucket,
-            Prefix=prefix
-        )
-        
-        # 筛选视频文件并生成预览URL
-        video_list = []
-        metadata_list = []
-        
-        for item in response.get('Contents', []):
-            if item['Key'].lower().endswith(('.mp4', '.mov', '.avi', '.mkv', '.wmv')):
-                # 生成预签名URL，有效期更长以支持视频播放
-                url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': bucket, 'Key': item['Key']},
-                    ExpiresIn=86400  # 24小时
-                )
-                video_list.append(url)
-                metadata_list.append({
-                    "key": item['Key'],
-                    "name": item['Key'].split('/')[-1],
-                    "size": item['Size']
-                })
-        
-        return [video_list, metadata_list]  # 返回视频URL列表和元数据列表
-    
-    except Exception as e:
-        print(f"S3视频列表错误: {str(e)}")
-        return [[f"错误: {str(e)}"], [{"key": "error"}]]
-
-def list_s3_images(s3_path):
-    """列出S3路径下的所有图片并返回用于Gallery展示的格式"""
-    try:
-        if not s3_path:
-            return [], []
-            
-        # 处理s3://前缀
-        if s3_path.startswith('s3://'):
-            s3_path = s3_path[5:]  # 移除's3://'前缀
-            
-        # 解析bucket和prefix
-        parts = s3_path.strip('/').split('/', 1)
-        bucket = parts[0]
-        prefix = parts[1] if len(parts) > 1 else ""
-        
-        # 创建S3客户端
-        s3_client = boto3.client('s3')
-        
-        # 列出对象
-        response = s3_client.list_objects_v2(
-            Bucket=bucket,
-            Prefix=prefix
-        )
-        
-        # 筛选图片文件并生成预览URL
-        image_list = []
-        metadata_list = []
-        
-        for item in response.get('Contents', []):
-            if item['Key'].lower().endswith(('.png', '.jpg', '.jpeg')):
-                # 生成预签名URL
-                url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': bucket, 'Key': item['Key']},
-                    ExpiresIn=3600
-                )
-                image_list.append(url)
-                metadata_list.append({"key": item['Key']})
-        
-        return [image_list, metadata_list]  # 返回图片URL列表和元数据列表
-    
-    except Exception as e:
-        print(f"S3列表错误: {str(e)}")
-        return [[f"错误: {str(e)}"], [{"key": "error"}]]
+# Gradio同样按需加载：进程池的工作进程会重新执行本模块（作为__mp_main__），不应在每个工作进程中导入Gradio
+gr = LazyModule("gradio")
 
-def select_image(evt, s3_path):
-    """处理图片选择事件，加载选中的图片"""
-    try:
-        if not evt or not s3_path:
-            return None
-            
-        # 从事件中获取选中的图片Key
-        image_key = evt
-        
-        # 处理s3://前缀
-        if s3_path.startswith('s3://'):
-            s3_path = s3_path[5:]  # 移除's3://'前缀
-            
-        # 解析bucket和key
-        parts = s3_path.strip('/').split('/', 1)
-        bucket = parts[0]
-        
-        # 创建S3客户端并下载图片
-        s3_client = boto3.client('s3')
-        response = s3_client.get_object(Bucket=bucket, Key=image_key)
-        
-        # 转换为PIL图像
-        image_data = response['Body'].read()
-        image = Image.open(io.BytesIO(image_data))
-        
-        return image
-        
-    except Exception as e:
-        print(f"选择图片错误: {str(e)}")
-        return None
-
-def extract_text(image, model_name, language, system_prompt, user_prompt):
-    """使用Bedrock提取图像中的文字"""
-    try:
-        if image is None:
-            return "请先选择一个图片"
-            
-        # 获取模型ID
-        model_id = get_model_id(model_name)
-        
-        # 创建Bedrock客户端
-        bedrock_runtime = boto3.client(
-            service_name='bedrock-runtime',
-            region_name='us-west-2'  # 使用us-west-2区域进行跨区域调用
-        )
-        
-        # 准备提示词
-        language_name = get_language_name(language)
-        # 将语言信息添加到用户提示中
-        full_user_prompt = f"{user_prompt}\n语言: {language_name}"
-        
-        # 回到之前使用的invoke_model方法，因为它对Claude是有效的
-        if "Claude" in model_name:
-            # 将图像转换为base64编码
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            image_bytes = buffered.getvalue()
-            image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-            
-            # Claude模型使用invoke_model API，这是已知可用的方法
-            request_body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1000,
-                "system": system_prompt,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": full_user_prompt
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/png",
-                                    "data": image_base64
-                                }
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            print(f"使用Claude模型: {model_id}")
-            
-            # 发送请求
-            response = bedrock_runtime.invoke_model(
-                modelId=model_id,
-                body=json.dumps(request_body)
-            )
-            
-            # 解析响应
-            response_body = json.loads(response['body'].read())
-            return response_body['content'][0]['text']
-            
-        else:
-            # Nova模型使用invoke_model API直接处理图像，但使用不同的请求结构
-            print(f"使用Nova模型: {model_id}")
-            
-            try:
-                # 将图像转换为PNG格式
-                buffered = io.BytesIO()
-                # 如果是RGBA格式(带透明度的PNG)，则转换为RGB
-                if image.mode == 'RGBA':
-                    image = image.convert('RGB')
-                image.save(buffered, format="PNG")
-                image_bytes = buffered.getvalue()
-                image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-                
-                # 根据用户提供的示例构建请求
-                # 系统消息
-                system_list = [
-                    {
-                        "text": system_prompt
-                    }
-                ]
-                
-                # 用户消息，先放图像再放文本
-                message_list = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "image": {
-                                    "format": "png",
-                                    "source": {
-                                        "bytes": image_base64
-                                    }
-                                }
-                            },
-                            {
-                                "text": full_user_prompt
-                            }
-                        ]
-                    }
-                ]
-                
-                # 推理配置
-                inf_params = {
-                    "maxTokens": 1000,
-                    "temperature": 0.1,
-                    "topP": 0.9,
-                    "topK": 50
-                }
-                
-                # 构建完整请求
-                request_body = {
-                    "schemaVersion": "messages-v1",
-                    "messages": message_list,
-                    "system": system_list,
-                    "inferenceConfig": inf_params
-                }
-                
-                # 打印调试信息，但不包含图像数据
-                debug_request = {
-                    "schemaVersion": "messages-v1",
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "image": {
-                                        "format": "png",
-                                        "source": {"bytes": "[图像数据已省略]"}
-                                    }
-                                },
-                                {
-                                    "text": full_user_prompt
-                                }
-                            ]
-                        }
-                    ],
-                    "system": system_list,
-                    "inferenceConfig": inf_params
-                }
-                print(f"Nova请求结构(不含图像数据): {json.dumps(debug_request)}")
-                
-                # 使用invoke_model API
-                response = bedrock_runtime.invoke_model(
-                    modelId=model_id,
-                    body=json.dumps(request_body)
-                )
-                
-                # 解析响应
-                response_body = json.loads(response['body'].read())
-                print(f"Nova响应结构: {json.dumps(response_body)}")
-                
-                # 从响应中提取文本
-                if 'output' in response_body and 'message' in response_body['output'] and 'content' in response_body['output']['message']:
-                    content = response_body['output']['message']['content']
-                    if isinstance(content, list) and len(content) > 0 and 'text' in content[0]:
-                        return content[0]['text']
-                
-                # 如果无法找到预期的结构，返回完整响应
-                return f"完整Nova响应: {json.dumps(response_body)}"
-                    
-            except Exception as nova_error:
-                error_message = f"Nova API错误: {str(nova_error)}"
-                print(f"Nova调用错误: {str(nova_error)}")
-                return error_message
-        
-    except Exception as e:
-        return f"错误: {str(e)}"
 
 def create_subtitle_recognition_ui():
     """创建字幕截图文字识别界面"""
@@ -348,8 +34,10 @@ def create_subtitle_recognition_ui():
         image_keys = gr.State([])
         area_selection = gr.State({"x": 120, "y": 1300, "width": 850, "height": 220})
         
-        # 全局变量存储提取的帧路径
-        global extracted_frame_paths
+        # 每个用户会话独立保存提取的帧路径
+        frame_paths_state = gr.State([])
+        # 当前选中图片的来源（S3 URI或本地帧路径），用于在结果库中记录和查找识别结果
+        selected_image_ref = gr.State("")
         
         # 视频上传与播放区域
         with gr.Row():
@@ -361,6 +49,15 @@ def create_subtitle_recognition_ui():
                     height=400
                 )
                 
+                # S3视频不需要下载，提取帧时只读取解码用到的字节范围；已上传本地视频时优先使用本地视频
+                with gr.Row():
+                    s3_video_input = gr.Textbox(
+                        label="或直接使用S3视频",
+                        placeholder="s3://bucket/videos/movie.mp4",
+                        scale=4
+                    )
+                    s3_video_button = gr.Button("读取S3视频", scale=1)
+                
                 # 添加视频分辨率显示
                 video_dimensions = gr.HTML(
                     """
@@ -394,10 +91,76 @@ def create_subtitle_recognition_ui():
                         value=1.0, 
                         step=0.1
                     )
+                    max_frames_input = gr.Number(
+                        label="最多提取帧数 (0表示不限制)",
+                        value=50,
+                        step=1
+                    )
+                
+                # 自适应采样：画面变化时密集采样，稳定时稀疏采样
+                with gr.Row():
+                    adaptive_checkbox = gr.Checkbox(
+                        label="自适应采样（忽略截图频率）",
+                        value=False
+                    )
+                    adaptive_min_fps_input = gr.Number(
+                        label="最低采样率 (帧/秒)",
+                        value=ADAPTIVE_SAMPLING["min_fps"],
+                        minimum=0.1
+                    )
+                    adaptive_max_fps_input = gr.Number(
+                        label="最高采样率 (帧/秒)",
+                        value=ADAPTIVE_SAMPLING["max_fps"],
+                        minimum=0.1
+                    )
+                
+                # 自动检测字幕区域
+                with gr.Row():
+                    detect_samples_input = gr.Slider(
+                        label="检测采样帧数",
+                        minimum=5,
+                        maximum=60,
+                        value=30,
+                        step=1
+                    )
+                    detect_region_button = gr.Button("自动检测字幕区域", variant="secondary")
+                
+                # 文字预筛选设置，跳过没有字幕的帧
+                with gr.Accordion("文字预筛选", open=False):
+                    with gr.Row():
+                        text_filter_checkbox = gr.Checkbox(label="启用文字预筛选", value=True)
+                        drop_empty_checkbox = gr.Checkbox(label="丢弃可能为空的帧", value=False)
+                    with gr.Row():
+                        min_contrast_input = gr.Number(
+                            label="最小对比度",
+                            value=TEXT_PRESENCE_THRESHOLDS["min_contrast"],
+                            step=1
+                        )
+                        min_components_input = gr.Number(
+                            label="最少字符连通域",
+                            value=TEXT_PRESENCE_THRESHOLDS["min_components"],
+                            step=1
+                        )
+                    with gr.Row():
+                        min_edge_input = gr.Number(
+                            label="最小边缘密度",
+                            value=TEXT_PRESENCE_THRESHOLDS["min_edge_density"],
+                            step=0.005
+                        )
+                        max_edge_input = gr.Number(
+                            label="最大边缘密度",
+                            value=TEXT_PRESENCE_THRESHOLDS["max_edge_density"],
+                            step=0.01
+                        )
                 
                 # 提取按钮
                 video_extract_button = gr.Button("开始截取", variant="primary")
                 
+                # 流水线处理：解码、上传和识别同时进行
+                with gr.Row():
+                    pipeline_upload_checkbox = gr.Checkbox(label="流水线中同时上传到S3", value=False)
+                    pipeline_button = gr.Button("流水线处理（提取→上传→识别）", variant="secondary")
+                
                 # 提取结果信息
                 extract_info = gr.Textbox(
                     label="提取结果信息", 
@@ -428,6 +191,15 @@ def create_subtitle_recognition_ui():
                 # 添加删除按钮 - 不再需要索引输入框
                 delete_frames_btn = gr.Button("删除选中的帧", variant="secondary")
                 
+                # 帧归档：一次提取的所有帧打包为单个文件，便于保存和在机器之间传输
+                with gr.Accordion("帧归档", open=False):
+                    with gr.Row():
+                        export_archive_button = gr.Button("导出帧归档", variant="secondary")
+                        import_archive_button = gr.Button("导入帧归档", variant="secondary")
+                    with gr.Row():
+                        export_archive_file = gr.File(label="导出的帧归档", interactive=False)
+                        import_archive_file = gr.File(label="选择要导入的帧归档 (.vfa)", file_types=[".vfa"])
+                
                 # 添加状态变量存储当前选中的帧索引
                 selected_frame_index = gr.State(None)
                 
@@ -438,6 +210,7 @@ def create_subtitle_recognition_ui():
                         placeholder="例如: s3://bucket-name/screenshots/",
                         value="s3://general-demo-3/madhouse-ads-videos/subtitle-screen-shots/"
                     )
+                    upload_bundle_checkbox = gr.Checkbox(label="打包为单个归档上传", value=False)
                     s3_upload_button = gr.Button("上传到S3", variant="primary")
                 
                 # 上传结果信息
@@ -447,6 +220,52 @@ def create_subtitle_recognition_ui():
                     lines=2,
                     interactive=False
                 )
+                
+                # 直接识别本地提取的帧，无需先上传到S3再下载
+                with gr.Row():
+                    local_skip_empty = gr.Checkbox(label="跳过可能为空的帧", value=True)
+                    local_archive_s3 = gr.Checkbox(label="识别后上传到S3归档", value=False)
+                    local_ocr_button = gr.Button("识别提取的帧", variant="primary")
+                    retry_dead_letters_button = gr.Button("重试失败的帧", variant="secondary")
+                
+                # 识别预算：限制一次运行的Token和成本，用完后暂停或停止
+                with gr.Accordion("预算控制", open=False):
+                    with gr.Row():
+                        budget_max_cost = gr.Number(label="成本上限 (美元，0表示不限)", value=0, minimum=0)
+                        budget_max_tokens = gr.Number(label="Token上限 (0表示不限)", value=0, minimum=0, precision=0)
+                        budget_on_limit = gr.Radio(choices=["暂停", "停止"], label="达到上限后", value="暂停")
+                    with gr.Row():
+                        budget_extra_cost = gr.Number(label="追加成本 (美元)", value=1.0, minimum=0)
+                        budget_extra_tokens = gr.Number(label="追加Token", value=100000, minimum=0, precision=0)
+                        budget_resume_button = gr.Button("追加预算并继续识别", variant="secondary")
+                ocr_run_id = gr.State("")
+                
+                # 帧识别结果
+                pipeline_results = gr.Dataframe(
+                    headers=["帧", "时间 (秒)", "S3 Key", "识别结果"],
+                    label="帧识别结果"
+                )
+                
+                # 根据提取的帧生成带时间轴的字幕文件
+                with gr.Accordion("生成字幕文件 (SRT/VTT)", open=False):
+                    with gr.Row():
+                        timeline_format = gr.Radio(choices=["srt", "vtt"], label="字幕格式", value="srt")
+                        timeline_similarity = gr.Slider(
+                            label="文字相似度合并阈值",
+                            minimum=0.5,
+                            maximum=1.0,
+                            value=0.8,
+                            step=0.05
+                        )
+                        timeline_change_threshold = gr.Number(
+                            label="画面变化阈值 (变化像素百分比)",
+                            value=0.5,
+                            step=0.1
+                        )
+                    timeline_button = gr.Button("识别并生成字幕文件", variant="primary")
+                    timeline_info = gr.Textbox(label="生成结果", lines=2, interactive=False)
+                    timeline_preview = gr.Textbox(label="字幕预览", lines=10, interactive=False)
+                    timeline_file = gr.File(label="下载字幕文件")
         
         # 重新组织字幕截图文字识别界面，按照用户要求调整布局
         with gr.Row():
@@ -454,7 +273,7 @@ def create_subtitle_recognition_ui():
             with gr.Column(scale=1):
                 # 模型和语言选择区域
                 model_dropdown = gr.Dropdown(
-                    choices=["Claude 3 Opus", "Claude 3 Sonnet", "Claude 3.5 Haiku", "Claude 3.5 Sonnet v1", "Claude 3.5 Sonnet v2", "Claude 3.7 Sonnet", "Nova Lite", "Nova Micro", "Nova Pro"],
+                    choices=["Claude 3 Opus", "Claude 3 Sonnet", "Claude 3.5 Haiku", "Claude 3.5 Sonnet v1", "Claude 3.5 Sonnet v2", "Claude 3.7 Sonnet", "Nova Lite", "Nova Micro", "Nova Pro", CASCADE_MODEL_NAME],
                     label="Bedrock 模型选择",
                     value="Claude 3.7 Sonnet"
                 )
@@ -465,6 +284,39 @@ def create_subtitle_recognition_ui():
                     value="FR"
                 )
                 
+                # 图像编码设置，减小发送给Bedrock的请求体
+                with gr.Accordion("图像编码设置", open=False):
+                    with gr.Row():
+                        encoding_format = gr.Dropdown(
+                            choices=["PNG", "JPEG", "WEBP"],
+                            label="编码格式",
+                            value=DEFAULT_IMAGE_ENCODING["image_format"]
+                        )
+                        encoding_quality = gr.Slider(
+                            label="JPEG/WEBP 质量",
+                            minimum=10,
+                            maximum=100,
+                            value=DEFAULT_IMAGE_ENCODING["quality"],
+                            step=5
+                        )
+                    with gr.Row():
+                        encoding_max_dimension = gr.Number(
+                            label="最长边上限 (像素，0表示不缩放)",
+                            value=DEFAULT_IMAGE_ENCODING["max_dimension"],
+                            step=1
+                        )
+                        encoding_grayscale = gr.Checkbox(
+                            label="转换为灰度图",
+                            value=DEFAULT_IMAGE_ENCODING["grayscale"]
+                        )
+                    with gr.Row():
+                        compare_run_ocr = gr.Checkbox(label="比较时实际调用模型", value=False)
+                        compare_encoding_button = gr.Button("比较编码设置", variant="secondary")
+                    encoding_compare_table = gr.Dataframe(
+                        headers=["编码设置", "格式", "尺寸", "图片字节数", "Base64字节数", "输入Token", "识别结果"],
+                        label="编码比较结果"
+                    )
+                
                 # 提示词
                 system_prompt = gr.Textbox(
                     label="系统提示词",
@@ -478,14 +330,50 @@ def create_subtitle_recognition_ui():
                     lines=5
                 )
                 
+                # 流式输出可以在模型生成过程中逐步显示结果
+                stream_checkbox = gr.Checkbox(label="流式输出", value=True)
+                
                 # 处理按钮放在提示词下面
                 extract_button = gr.Button("图片处理", variant="primary")
                 
+                # 响应耗时信息
+                timing_text = gr.Textbox(label="响应耗时", value="", interactive=False)
+                
                 # 结果显示区域放在处理按钮下面
                 result_text = gr.Textbox(
                     label="识别文字结果", 
                     lines=20
                 )
+                
+                # 批量推理：大量帧通过Bedrock批量推理任务处理，避免逐张同步调用
+                with gr.Accordion("批量推理（Batch Inference）", open=False):
+                    batch_source = gr.Radio(
+                        choices=["S3图片列表", "本地提取的帧"],
+                        label="帧来源",
+                        value="S3图片列表"
+                    )
+                    batch_s3_path = gr.Textbox(
+                        label="批量推理S3工作目录",
+                        placeholder="例如: s3://bucket-name/batch-inference/",
+                        value="s3://general-demo-3/madhouse-ads-videos/batch-inference/"
+                    )
+                    batch_incremental = gr.Checkbox(
+                        label="增量处理：只识别S3图片目录中新增或修改的图片",
+                        value=False
+                    )
+                    batch_role_arn = gr.Textbox(
+                        label="服务角色ARN",
+                        placeholder="arn:aws:iam::123456789012:role/BedrockBatchInferenceRole"
+                    )
+                    batch_submit_button = gr.Button("提交批量推理任务", variant="primary")
+                    with gr.Row():
+                        batch_job_arn = gr.Textbox(label="批量任务ARN", interactive=True)
+                        batch_check_button = gr.Button("检查批量任务", variant="secondary")
+                    batch_status = gr.Textbox(label="批量任务状态", lines=3, interactive=False)
+                    batch_results = gr.Dataframe(
+                        headers=["帧", "识别结果", "错误"],
+                        label="批量识别结果"
+                    )
             
             # 右侧列：图片预览和选中的图片
             with gr.Column(scale=2):
@@ -514,7 +402,9 @@ def create_subtitle_recognition_ui():
         browse_button.click(
             fn=update_gallery, 
             inputs=subtitle_s3_path, 
-            outputs=[image_gallery, image_keys]
+            outputs=[image_gallery, image_keys],
+            concurrency_id="s3",
+            concurrency_limit=S3_CONCURRENCY_LIMIT
         )
         
         # 修复图片选择处理
@@ -523,17 +413,138 @@ def create_subtitle_recognition_ui():
                 selected_index = evt.index
                 if metadata_list and selected_index < len(metadata_list):
                     key = metadata_list[selected_index]["key"]
-                    return select_image(key, s3_path)
-                return None
+                    image = select_image(key, s3_path)
+                    
+                    # 后台预取相邻的图片，切换图片时可以直接从缓存读取
+                    bucket, _ = parse_s3_path(s3_path)
+                    neighbours = [
+                        resolve_s3_frame(bucket, metadata_list[i]["key"])
+                        for i in range(max(0, selected_index - 2), min(len(metadata_list), selected_index + 3))
+                        if i != selected_index and metadata_list[i]["key"] != "error"
+                    ]
+                    S3_BYTE_CACHE.prefetch(bucket, neighbours)
+                    
+                    # 之前识别过的图片直接显示结果库中的结果
+                    image_ref = f"s3://{bucket}/{key}"
+                    stored_text = RESULTS_STORE.latest_ocr_text(image_ref)
+                    return image, image_ref, stored_text if stored_text is not None else gr.update()
+                return None, "", gr.update()
             except Exception as e:
                 print(f"图片选择错误: {str(e)}")
-                return None
-            
-        image_gallery.select(fn=handle_select, inputs=[subtitle_s3_path, image_keys], outputs=selected_image)
+                return None, "", gr.update()
+            
+        image_gallery.select(
+            fn=handle_select,
+            inputs=[subtitle_s3_path, image_keys],
+            outputs=[selected_image, selected_image_ref, result_text],
+            concurrency_id="s3",
+            concurrency_limit=S3_CONCURRENCY_LIMIT
+        )
+        def handle_extract(image, model_name, language, system_prompt_value, user_prompt_value,
+                           max_dimension, grayscale, image_format, quality, stream, image_ref=""):
+            """处理图片识别，流式模式下逐步更新结果"""
+            text = ""
+            errors = []
+            if stream:
+                for text, timing in extract_text_stream(image, model_name, language, system_prompt_value,
+                                                        user_prompt_value, max_dimension, grayscale, image_format, quality,
+                                                        errors=errors):
+                    yield text, timing
+            else:
+                start_time = time.time()
+                text = extract_text(image, model_name, language, system_prompt_value, user_prompt_value,
+                                    max_dimension, grayscale, image_format, quality, errors=errors)
+                yield text, f"总耗时: {time.time() - start_time:.2f} 秒"
+            
+            # 保存识别结果，错误信息不作为识别结果保存
+            if image_ref and image is not None:
+                RESULTS_STORE.record_ocr_results(
+                    [{"image_ref": image_ref, "text": "" if errors else text, "error": errors[0] if errors else ""}],
+                    model_name, language
+                )
+        
         extract_button.click(
-            fn=extract_text, 
-            inputs=[selected_image, model_dropdown, language_dropdown, system_prompt, user_prompt],
-            outputs=result_text
+            fn=handle_extract, 
+            inputs=[selected_image, model_dropdown, language_dropdown, system_prompt, user_prompt,
+                    encoding_max_dimension, encoding_grayscale, encoding_format, encoding_quality, stream_checkbox,
+                    selected_image_ref],
+            outputs=[result_text, timing_text],
+            api_name="ocr",
+            concurrency_id="bedrock",
+            concurrency_limit=BEDROCK_CONCURRENCY_LIMIT
+        )
+        
+        def handle_batch_submit(source, s3_path, metadata_list, frame_paths, batch_path, role_arn, model_name, language,
+                                system_prompt_value, user_prompt_value, max_dimension, grayscale, image_format, quality,
+                                incremental=False):
+            """收集帧并提交批量推理任务"""
+            frame_items = []
+            change_set = None
+            change_info = ""
+            if source == "本地提取的帧":
+                for frame_path in frame_paths or []:
+                    if os.path.exists(frame_path):
+                        frame_items.append((frame_path, Image.open(frame_path)))
+            else:
+                if incremental:
+                    # 增量处理：只取相对于处理清单新增或修改的图片
+                    try:
+                        change_set = list_s3_changes(s3_path, f"batch_ocr:{model_name}:{language}", ('.png', '.jpg', '.jpeg'))
+                    except Exception as e:
+                        print(f"列出S3变更错误: {str(e)}")
+                        return f"列出新增图片失败: {str(e)}", ""
+                    stats = change_set["stats"]
+                    change_info = (f"\n增量处理: 共 {stats['listed']} 张图片，新增或修改 {stats['changed']} 张，"
+                                   f"跳过 {stats['skipped_by_watermark'] + stats['unchanged']} 张已处理的图片")
+                    if not change_set["changed"]:
+                        return "没有新增或修改的图片" + change_info, ""
+                    keys = [item["key"] for item in change_set["changed"]]
+                else:
+                    keys = [meta["key"] for meta in metadata_list or [] if meta.get("key") and meta["key"] != "error"]
+                # 并发下载S3图片
+                with ThreadPoolExecutor(max_workers=S3_TRANSFER_WORKERS) as executor:
+                    images = executor.map(lambda key: select_image(key, s3_path), keys)
+                    for key, image in zip(keys, images):
+                        if image is not None:
+                            frame_items.append((key, image))
+            
+            result = submit_batch_ocr_job(
+                frame_items, batch_path, role_arn, model_name, language, system_prompt_value, user_prompt_value,
+                change_set=change_set,
+                max_dimension=max_dimension, grayscale=grayscale, image_format=image_format, quality=quality
+            )
+            return result["message"] + change_info, result.get("job_arn", "")
+        
+        def handle_batch_check(job_arn):
+            """检查批量推理任务并展示关联后的结果"""
+            result = check_batch_ocr_job(job_arn)
+            rows = [[item["frame_key"], item["text"], item["error"]] for item in result.get("results", [])]
+            return result["message"], rows
+        
+        batch_submit_button.click(
+            fn=handle_batch_submit,
+            inputs=[batch_source, subtitle_s3_path, image_keys, frame_paths_state, batch_s3_path, batch_role_arn,
+                    model_dropdown, language_dropdown, system_prompt, user_prompt,
+                    encoding_max_dimension, encoding_grayscale, encoding_format, encoding_quality, batch_incremental],
+            outputs=[batch_status, batch_job_arn],
+            concurrency_id="s3",
+            concurrency_limit=S3_CONCURRENCY_LIMIT
+        )
+        
+        batch_check_button.click(
+            fn=handle_batch_check,
+            inputs=batch_job_arn,
+            outputs=[batch_status, batch_results],
+            concurrency_id="aws_jobs",
+            concurrency_limit=AWS_JOB_CONCURRENCY_LIMIT
+        )
+        
+        compare_encoding_button.click(
+            fn=compare_image_encodings,
+            inputs=[selected_image, model_dropdown, language_dropdown, system_prompt, user_prompt, compare_run_ocr],
+            outputs=encoding_compare_table,
+            concurrency_id="bedrock",
+            concurrency_limit=BEDROCK_CONCURRENCY_LIMIT
         )
         
         # 添加视频处理相关的事件处理函数
@@ -541,10 +552,23 @@ def create_subtitle_recognition_ui():
             """更新区域选择参数"""
             return {"x": int(x), "y": int(y), "width": int(width), "height": int(height)}
             
-        def extract_frames_from_video(video_path, selection, fps):
+        def extract_frames_from_video(video_path, selection, fps, max_frames=50, text_filter=False, drop_empty=False,
+                                      min_contrast=None, min_components=None, min_edge=None, max_edge=None,
+                                      adaptive=False, min_fps=None, max_fps=None, s3_video_path=""):
             """从视频中提取帧"""
+            video_path = video_path or (s3_video_path or "").strip()
             if not video_path:
-                return "请先上传或选择一个视频", []
+                return "请先上传或选择一个视频", [], []
+            
+            # 收集文字预筛选阈值
+            text_thresholds = {
+                key: value for key, value in {
+                    "min_contrast": min_contrast,
+                    "min_components": min_components,
+                    "min_edge_density": min_edge,
+                    "max_edge_density": max_edge
+                }.items() if value is not None
+            }
             
             x = selection["x"]
             y = selection["y"]
@@ -552,7 +576,10 @@ def create_subtitle_recognition_ui():
             height = selection["height"]
             
             # 获取视频分辨率以验证坐标
-            cap = cv2.VideoCapture(video_path)
+            try:
+                cap, _ = open_video_capture(video_path)
+            except Exception as e:
+                return f"无法打开视频: {str(e)}", [], []
             if cap.isOpened():
                 video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
                 video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -561,7 +588,7 @@ def create_subtitle_recognition_ui():
                 # 验证坐标是否在视频范围内
                 if x < 0 or y < 0 or x >= video_width or y >= video_height:
                     error_msg = f"坐标错误：(x={x}, y={y}) 不在视频范围 (0~{video_width-1}, 0~{video_height-1}) 内"
-                    return error_msg, []
+                    return error_msg, [], []
                 
                 if x + width > video_width:
                     old_width = width
@@ -586,8 +613,14 @@ def create_subtitle_recognition_ui():
             if height <= 0:
                 height = min(200, video_height - y)
                 
-            # 调用提取帧函数
-            info, frames = extract_video_frames(video_path, x, y, width, height, fps)
+            # 在进程池中调用提取帧函数
+            sampling_options = {
+                key: float(value) for key, value in {"min_fps": min_fps, "max_fps": max_fps}.items() if value
+            }
+            info, frames = run_in_cpu_pool(extract_video_frames, video_path, x, y, width, height, fps,
+                                           text_filter=text_filter, text_thresholds=text_thresholds,
+                                           drop_empty=drop_empty, max_frames=int(max_frames or 0),
+                                           adaptive=adaptive, sampling_options=sampling_options)
             
             # 添加坐标信息到结果中
             complete_info = f"视频分辨率: {video_width}x{video_height}\n"
@@ -599,101 +632,50 @@ def create_subtitle_recognition_ui():
                 
             complete_info += info
             
-            # 将提取的帧保存到全局变量中，方便后续上传
-            global extracted_frame_paths
-            extracted_frame_paths = frames
-            
-            return complete_info, frames
+            # Gallery展示缩略图，原图路径保存到会话状态中，方便后续上传
+            return complete_info, gallery_thumbnails(frames), frames
             
-        def delete_frame_by_index(index):
+        def delete_frame_by_index(index, frame_paths):
             """删除指定索引的帧"""
-            global extracted_frame_paths
-            
             index = int(index) # 确保是整数
             
-            if not extracted_frame_paths:
-                return "没有可删除的帧，请先提取视频帧", extracted_frame_paths
+            if not frame_paths:
+                return "没有可删除的帧，请先提取视频帧", gallery_thumbnails(frame_paths), frame_paths
                 
             # 确保索引在有效范围内
-            if index >= 0 and index < len(extracted_frame_paths):
-                # 删除指定索引的帧
-                deleted_path = extracted_frame_paths.pop(index)
+            if index >= 0 and index < len(frame_paths):
+                # 删除指定索引的帧，返回新列表而不修改会话状态中的原列表；帧归档中只标记删除
+                archive = open_frame_archive(os.path.dirname(frame_paths[index]))
+                if archive is not None:
+                    archive.delete([os.path.basename(frame_paths[index])])
+                frame_paths = frame_paths[:index] + frame_paths[index+1:]
                 
                 # 更新提示信息
-                result = f"已删除索引为 {index} 的帧，当前剩余 {len(extracted_frame_paths)} 帧"
+                result = f"已删除索引为 {index} 的帧，当前剩余 {len(frame_paths)} 帧"
                 
-                return result, extracted_frame_paths
+                return result, gallery_thumbnails(frame_paths), frame_paths
             else:
-                return f"无效的索引: {index}。有效范围: 0-{len(extracted_frame_paths)-1}", extracted_frame_paths
-                
-        def upload_frames_to_s3(s3_path):
-            """将提取的帧上传到S3"""
-            global extracted_frame_paths
-            
-            if not extracted_frame_paths or len(extracted_frame_paths) == 0:
-                return "没有可上传的帧，请先提取视频帧", None
-                
-            if not s3_path:
-                return "请提供有效的S3路径", None
-                
-            try:
-                # 处理s3://前缀
-                if s3_path.startswith('s3://'):
-                    s3_path = s3_path[5:]  # 移除's3://'前缀
-                    
-                # 解析bucket和prefix
-                parts = s3_path.strip('/').split('/', 1)
-                if len(parts) < 2:
-                    return f"无效的S3路径: {s3_path}，格式应为 s3://bucket-name/path/", None
-                    
-                bucket = parts[0]
-                prefix = parts[1]
-                
-                # 确保prefix以/结尾
-                if not prefix.endswith('/'):
-                    prefix += '/'
-                    
-                # 创建S3客户端
-                s3_client = boto3.client('s3')
-                
-                # 创建时间戳文件夹
-                timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-                folder_prefix = f"{prefix}{timestamp}/"
-                
-                # 上传文件
-                success_count = 0
-                for idx, frame_path in enumerate(extracted_frame_paths):
-                    if os.path.exists(frame_path):
-                        file_name = os.path.basename(frame_path)
-                        s3_key = f"{folder_prefix}{file_name}"
-                        
-                        s3_client.upload_file(
-                            Filename=frame_path,
-                            Bucket=bucket,
-                            Key=s3_key
-                        )
-                        success_count += 1
-                
-                # 返回上传结果和完整的S3路径
-                full_s3_path = f"s3://{bucket}/{folder_prefix}"
-                return f"成功上传 {success_count} 帧到 {full_s3_path}", full_s3_path
-                
-            except Exception as e:
-                print(f"上传到S3时出错: {str(e)}")
-                return f"上传失败: {str(e)}"
+                return f"无效的索引: {index}。有效范围: 0-{len(frame_paths)-1}", gallery_thumbnails(frame_paths), frame_paths
                 
         def handle_subtitle_video_upload(video_path):
             """处理字幕识别页面的视频上传"""
             if video_path is None:
                 return None, "请上传视频文件"
             
+            return video_path, video_dimensions_html(video_path)
+        
+        def handle_s3_video_source(s3_video_path):
+            """读取S3视频的分辨率，只下载文件头等少量字节"""
+            s3_video_path = (s3_video_path or "").strip()
+            if not s3_video_path.startswith("s3://"):
+                return "<p>请输入 s3://bucket/key 格式的视频路径</p>"
+            return video_dimensions_html(s3_video_path)
+        
+        def video_dimensions_html(video_path):
+            """读取视频分辨率，返回分辨率信息的HTML"""
             try:
-                # 获取文件信息
-                file_size = os.path.getsize(video_path)
-                file_name = os.path.basename(video_path)
-                
                 # 获取视频分辨率
-                cap = cv2.VideoCapture(video_path)
+                cap, _ = open_video_capture(video_path)
                 if cap.isOpened():
                     # 获取视频属性
                     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -723,12 +705,12 @@ def create_subtitle_recognition_ui():
                     # 释放资源
                     cap.release()
                     
-                    return video_path, dimensions_html
+                    return dimensions_html
                 else:
-                    return video_path, "<p>无法读取视频分辨率信息</p>"
+                    return "<p>无法读取视频分辨率信息</p>"
             except Exception as e:
-                print(f"视频上传错误: {str(e)}")
-                return None, f"<p>视频处理错误: {str(e)}</p>"
+                print(f"视频读取错误: {str(e)}")
+                return f"<p>视频处理错误: {str(e)}</p>"
         
         # 注册视频上传事件
         upload_video.change(
@@ -737,6 +719,14 @@ def create_subtitle_recognition_ui():
             outputs=[upload_video, video_dimensions]
         )
         
+        s3_video_button.click(
+            fn=handle_s3_video_source,
+            inputs=s3_video_input,
+            outputs=video_dimensions,
+            concurrency_id="cpu",
+            concurrency_limit=CPU_WORKERS
+        )
+        
         # 注册区域选择事件
         gr.on(
             [x_input.change, y_input.change, width_input.change, height_input.change],
@@ -745,476 +735,419 @@ def create_subtitle_recognition_ui():
             outputs=area_selection
         )
         
+        def handle_detect_region(video_path, sample_count, x, y, width, height, s3_video_path=""):
+            """自动检测字幕区域并填充坐标输入框"""
+            video_path = video_path or (s3_video_path or "").strip()
+            if not video_path:
+                return x, y, width, height, "请先上传或选择一个视频"
+            
+            region, info = run_in_cpu_pool(detect_subtitle_region, video_path, sample_count=int(sample_count))
+            if region is None:
+                # 检测失败时保留当前坐标
+                return x, y, width, height, info
+            
+            return region["x"], region["y"], region["width"], region["height"], info
+        
+        # 注册区域检测事件，坐标输入框变化后会自动更新area_selection
+        detect_region_button.click(
+            fn=handle_detect_region,
+            inputs=[upload_video, detect_samples_input, x_input, y_input, width_input, height_input, s3_video_input],
+            outputs=[x_input, y_input, width_input, height_input, extract_info],
+            api_name="detect_region",
+            concurrency_id="cpu",
+            concurrency_limit=CPU_WORKERS
+        )
+        
         # 注册帧提取事件
         video_extract_button.click(
             fn=extract_frames_from_video,
-            inputs=[upload_video, area_selection, fps_input],
-            outputs=[extract_info, extracted_frames]
+            inputs=[upload_video, area_selection, fps_input, max_frames_input, text_filter_checkbox, drop_empty_checkbox,
+                    min_contrast_input, min_components_input, min_edge_input, max_edge_input,
+                    adaptive_checkbox, adaptive_min_fps_input, adaptive_max_fps_input, s3_video_input],
+            outputs=[extract_info, extracted_frames, frame_paths_state],
+            api_name="extract_frames",
+            concurrency_id="cpu",
+            concurrency_limit=CPU_WORKERS
+        )
+        
+        def handle_pipeline(video_path, selection, fps, max_frames, upload_enabled, s3_path,
+                            model_name, language, system_prompt_value, user_prompt_value,
+                            max_dimension, grayscale, image_format, quality,
+                            text_filter, min_contrast, min_components, min_edge, max_edge,
+                            max_cost, max_tokens, on_limit, s3_video_path=""):
+            """流水线处理视频：边解码边上传边识别，逐步更新结果"""
+            video_path = video_path or (s3_video_path or "").strip()
+            if not video_path:
+                yield "请先上传或选择一个视频", [], [], [], ""
+                return
+            
+            text_thresholds = {
+                key: value for key, value in {
+                    "min_contrast": min_contrast,
+                    "min_components": min_components,
+                    "min_edge_density": min_edge,
+                    "max_edge_density": max_edge
+                }.items() if value is not None
+            }
+            encoding_options = {
+                "max_dimension": max_dimension,
+                "grayscale": grayscale,
+                "image_format": image_format,
+                "quality": quality
+            }
+            
+            budget = create_ocr_budget(max_cost, max_tokens, on_limit)
+            
+            run_id = ""
+            for results, info in run_frame_pipeline(
+                video_path, selection["x"], selection["y"], selection["width"], selection["height"], fps,
+                model_name, language, system_prompt_value, user_prompt_value,
+                s3_path=s3_path if upload_enabled else None, max_frames=int(max_frames or 0),
+                text_filter=text_filter, text_thresholds=text_thresholds, encoding_options=encoding_options,
+                budget=budget
+            ):
+                frames = [item["path"] for item in results if "path" in item]
+                rows = [
+                    [item.get("file_name", ""), item.get("timestamp", ""), item.get("s3_key", ""), ocr_result_cell(item)]
+                    for item in results
+                ]
+                yield info, gallery_thumbnails(frames), frames, rows, run_id
+            
+            if results:
+                run_id, budget_info = finish_budget_run(
+                    budget, model_name, results,
+                    {item["path"]: row for item, row in zip(results, rows) if "path" in item},
+                    {"model_name": model_name, "language": language, "system_prompt": system_prompt_value,
+                     "user_prompt": user_prompt_value, "encoding_options": encoding_options, "skip_empty": False}
+                )
+                yield info + budget_info, gallery_thumbnails(frames), frames, rows, run_id
+        
+        pipeline_button.click(
+            fn=handle_pipeline,
+            inputs=[upload_video, area_selection, fps_input, max_frames_input, pipeline_upload_checkbox, upload_s3_path,
+                    model_dropdown, language_dropdown, system_prompt, user_prompt,
+                    encoding_max_dimension, encoding_grayscale, encoding_format, encoding_quality,
+                    text_filter_checkbox, min_contrast_input, min_components_input, min_edge_input, max_edge_input,
+                    budget_max_cost, budget_max_tokens, budget_on_limit, s3_video_input],
+            outputs=[extract_info, extracted_frames, frame_paths_state, pipeline_results, ocr_run_id],
+            concurrency_id="cpu",
+            concurrency_limit=CPU_WORKERS
+        )
+        
+        def ocr_result_cell(item):
+            """帧识别结果表格中"识别结果"一列的内容"""
+            if item.get("error"):
+                return item["error"]
+            if item.get("budget_skipped"):
+                return "(预算用完，未识别)"
+            if item.get("skipped"):
+                return "(预筛选跳过)"
+            return item.get("text", "")
+        
+        def create_ocr_budget(max_cost, max_tokens, on_limit):
+            """根据界面设置创建识别预算，未设置上限时只统计不限制"""
+            return OcrRunBudget(
+                max_cost=max_cost or 0,
+                max_tokens=max_tokens or 0,
+                on_limit="stop" if on_limit == "停止" else "pause"
+            )
+        
+        def finish_budget_run(budget, model_name, results, rows, params, run_id=None):
+            """保存本次运行各视频的用量，预算暂停时登记剩余的帧以便继续，返回(运行ID, 预算信息)
+
+            rows为帧路径到结果表格行的映射，继续识别时在其中更新剩余帧的结果。
+            """
+            run_id = run_id or uuid.uuid4().hex[:12]
+            if budget.per_video:
+                RESULTS_STORE.save_video_costs(run_id, model_name, budget.per_video)
+            
+            info = f"\n本次运行用量: {budget.summary()}"
+            for source in list(budget.per_video)[:5]:
+                summary = RESULTS_STORE.video_cost_summary(source)
+                info += (f"\n{os.path.basename(source)} 累计 {summary['runs']} 次运行，"
+                         f"Token {summary['input_tokens'] + summary['output_tokens']}，成本 ${summary['cost']:.4f}")
+            
+            remaining = [item["path"] for item in results if item.get("budget_skipped")]
+            if budget.status == "paused" and remaining:
+                register_ocr_run(run_id, {
+                    "budget": budget,
+                    "remaining": remaining,
+                    "rows": rows,
+                    "params": params
+                })
+                info += f"\n预算已用完，{len(remaining)} 帧暂停识别，可追加预算后继续"
+            else:
+                OCR_RUNS.pop(run_id, None)
+                if budget.status == "stopped":
+                    info += f"\n预算已用完，识别已停止，{len(remaining)} 帧未识别"
+            return run_id, info
+        
+        def handle_local_ocr(frame_paths, model_name, language, system_prompt_value, user_prompt_value,
+                             max_dimension, grayscale, image_format, quality, skip_empty, archive, s3_path,
+                             max_cost=0, max_tokens=0, on_limit="暂停"):
+            """直接识别本地提取的帧，可选地上传到S3归档"""
+            if not frame_paths:
+                return "没有可识别的帧，请先提取视频帧", [], ""
+            
+            encoding_options = {
+                "max_dimension": max_dimension,
+                "grayscale": grayscale,
+                "image_format": image_format,
+                "quality": quality
+            }
+            budget = create_ocr_budget(max_cost, max_tokens, on_limit)
+            results, stats = ocr_local_frames(
+                frame_paths, model_name, language, system_prompt_value, user_prompt_value,
+                encoding_options=encoding_options, skip_empty=skip_empty, budget=budget
+            )
+            
+            info = f"共 {stats['frames']} 帧，识别 {stats['ocr_calls']} 帧，跳过空帧 {stats['skipped']} 帧"
+            if stats["errors"]:
+                info += f"，失败 {stats['errors']} 帧（可点击\"重试失败的帧\"重新识别）"
+            usage_summary = summarize_ocr_usage(results)
+            if usage_summary:
+                info += f"\n{usage_summary}"
+            info += f"\n{BEDROCK_LIMITER.status()}"
+            
+            s3_keys = {}
+            if archive:
+                # 归档上传是可选步骤，不影响识别结果
+                upload_info, full_s3_path = upload_frames_to_s3(s3_path, frame_paths)
+                info += f"\n{upload_info}"
+                if full_s3_path:
+                    _, folder_prefix = parse_s3_path(full_s3_path)
+                    s3_keys = {path: f"{folder_prefix}{os.path.basename(path)}" for path in frame_paths}
+            
+            rows = [
+                [os.path.basename(item["path"]), item.get("timestamp", ""), s3_keys.get(item["path"], ""),
+                 ocr_result_cell(item)]
+                for item in results
+            ]
+            
+            run_id, budget_info = finish_budget_run(
+                budget, model_name, results, {item["path"]: row for item, row in zip(results, rows)},
+                {"model_name": model_name, "language": language, "system_prompt": system_prompt_value,
+                 "user_prompt": user_prompt_value, "encoding_options": encoding_options, "skip_empty": False}
+            )
+            return info + budget_info, rows, run_id
+        
+        def handle_resume_ocr(run_id, extra_cost, extra_tokens):
+            """追加预算后继续识别已暂停运行中剩余的帧"""
+            run = get_ocr_run(run_id)
+            if not run:
+                return "没有已暂停的识别运行（暂停超过6小时的运行会被清理）", gr.update(), run_id
+            
+            budget = run["budget"]
+            if not budget.raise_limits(extra_cost, extra_tokens):
+                return f"追加后预算仍不足，请追加更多预算\n{budget.summary()}", gr.update(), run_id
+            
+            params = run["params"]
+            results, stats = ocr_local_frames(
+                run["remaining"], params["model_name"], params["language"], params["system_prompt"],
+                params["user_prompt"], encoding_options=params["encoding_options"], skip_empty=params["skip_empty"],
+                budget=budget
+            )
+            for item in results:
+                row = run["rows"].get(item["path"])
+                if row is not None:
+                    row[3] = ocr_result_cell(item)
+            
+            info = f"继续识别 {stats['ocr_calls']} 帧"
+            if stats["errors"]:
+                info += f"，失败 {stats['errors']} 帧"
+            run_id, budget_info = finish_budget_run(budget, params["model_name"], results, run["rows"], params,
+                                                    run_id=run_id)
+            return info + budget_info, list(run["rows"].values()), run_id
+        
+        def handle_retry_dead_letters(frame_paths, model_name, language, system_prompt_value, user_prompt_value,
+                                      max_dimension, grayscale, image_format, quality, s3_path):
+            """重新识别重试多次后仍失败（在死信列表中）的帧"""
+            failed_paths = [entry["item"] for entry in BEDROCK_LIMITER.pop_dead_letters(frame_paths or [])]
+            failed_paths = [path for path in frame_paths or [] if path in set(failed_paths)]
+            if not failed_paths:
+                return f"没有需要重试的帧\n{BEDROCK_LIMITER.status()}", gr.update(), gr.update()
+            return handle_local_ocr(failed_paths, model_name, language, system_prompt_value, user_prompt_value,
+                                    max_dimension, grayscale, image_format, quality, False, False, s3_path)
+        
+        retry_dead_letters_button.click(
+            fn=handle_retry_dead_letters,
+            inputs=[frame_paths_state, model_dropdown, language_dropdown, system_prompt, user_prompt,
+                    encoding_max_dimension, encoding_grayscale, encoding_format, encoding_quality, upload_s3_path],
+            outputs=[s3_upload_result, pipeline_results, ocr_run_id],
+            concurrency_id="bedrock",
+            concurrency_limit=BEDROCK_CONCURRENCY_LIMIT
+        )
+        
+        local_ocr_button.click(
+            fn=handle_local_ocr,
+            inputs=[frame_paths_state, model_dropdown, language_dropdown, system_prompt, user_prompt,
+                    encoding_max_dimension, encoding_grayscale, encoding_format, encoding_quality,
+                    local_skip_empty, local_archive_s3, upload_s3_path,
+                    budget_max_cost, budget_max_tokens, budget_on_limit],
+            outputs=[s3_upload_result, pipeline_results, ocr_run_id],
+            concurrency_id="bedrock",
+            concurrency_limit=BEDROCK_CONCURRENCY_LIMIT
+        )
+        
+        budget_resume_button.click(
+            fn=handle_resume_ocr,
+            inputs=[ocr_run_id, budget_extra_cost, budget_extra_tokens],
+            outputs=[s3_upload_result, pipeline_results, ocr_run_id],
+            concurrency_id="bedrock",
+            concurrency_limit=BEDROCK_CONCURRENCY_LIMIT
         )
         
         # 添加帧选择事件处理函数
-        def handle_frame_select(evt: gr.SelectData):
-            """处理帧选择事件，记录选中的帧索引"""
+        def handle_frame_select(evt: gr.SelectData, frame_paths):
+            """处理帧选择事件，记录选中的帧索引，并直接加载本地帧用于识别"""
             selected_index = evt.index
-            return selected_index
+            image = None
+            image_ref = ""
+            stored_text = None
+            if frame_paths and 0 <= selected_index < len(frame_paths) and os.path.exists(frame_paths[selected_index]):
+                image_ref = frame_paths[selected_index]
+                image = Image.open(image_ref)
+                stored_text = RESULTS_STORE.latest_ocr_text(image_ref)
+            return selected_index, image, image_ref, stored_text if stored_text is not None else gr.update()
             
         # 注册帧选择事件
         extracted_frames.select(
             fn=handle_frame_select,
-            inputs=[],
-            outputs=selected_frame_index
+            inputs=frame_paths_state,
+            outputs=[selected_frame_index, selected_image, selected_image_ref, result_text]
         )
         
         # 修改删除帧事件处理函数，使用选中的帧索引
-        def delete_selected_frame(selected_index):
+        def delete_selected_frame(selected_index, frame_paths):
             """删除选中的帧"""
             if selected_index is None:
-                return "请先选择要删除的帧", extracted_frame_paths
+                return "请先选择要删除的帧", gallery_thumbnails(frame_paths), frame_paths
             
-            return delete_frame_by_index(selected_index)
+            return delete_frame_by_index(selected_index, frame_paths)
             
         # 注册删除帧事件
         delete_frames_btn.click(
             fn=delete_selected_frame,
-            inputs=selected_frame_index,
-            outputs=[s3_upload_result, extracted_frames]
+            inputs=[selected_frame_index, frame_paths_state],
+            outputs=[s3_upload_result, extracted_frames, frame_paths_state]
+        )
+        
+        def handle_export_archive(frame_paths):
+            """将当前的帧（不含已删除的帧）打包为帧归档供下载"""
+            if not frame_paths:
+                return "没有可导出的帧，请先提取视频帧", None
+            try:
+                output_path = os.path.join(tempfile.mkdtemp(), f"frames-{datetime.now().strftime('%Y%m%d-%H%M%S')}.vfa")
+                pack_frame_archive(frame_paths, output_path)
+                return f"已导出 {len(frame_paths)} 帧，文件大小 {os.path.getsize(output_path) / 1024 / 1024:.1f} MB", output_path
+            except Exception as e:
+                print(f"导出帧归档错误: {str(e)}")
+                return f"导出帧归档时发生错误: {str(e)}", None
+        
+        def handle_import_archive(archive_file):
+            """展开上传的帧归档，恢复帧列表"""
+            if not archive_file:
+                return "请先选择帧归档文件", gr.update(), gr.update()
+            try:
+                frame_paths = unpack_frame_archive(archive_file)
+                return f"已从帧归档导入 {len(frame_paths)} 帧", gallery_thumbnails(frame_paths), frame_paths
+            except Exception as e:
+                print(f"导入帧归档错误: {str(e)}")
+                return f"导入帧归档时发生错误: {str(e)}", gr.update(), gr.update()
+        
+        export_archive_button.click(
+            fn=handle_export_archive,
+            inputs=[frame_paths_state],
+            outputs=[s3_upload_result, export_archive_file]
+        )
+        
+        import_archive_button.click(
+            fn=handle_import_archive,
+            inputs=[import_archive_file],
+            outputs=[s3_upload_result, extracted_frames, frame_paths_state],
+            concurrency_id="cpu",
+            concurrency_limit=CPU_WORKERS
         )
         
         # 定义上传后格式化输出的函数
-        def upload_and_format_result(s3_path):
+        def upload_and_format_result(s3_path, frame_paths, current_browse_path, bundle=False):
             """上传帧到S3并格式化输出结果，同时更新浏览路径"""
-            result_text, full_s3_path = upload_frames_to_s3(s3_path)
+            result_text, full_s3_path = upload_frames_to_s3(s3_path, frame_paths, bundle)
             
             # 如果上传成功且返回了有效的S3路径
             if full_s3_path:
                 # 返回格式化的结果字符串和上传路径（用于更新浏览路径）
-                return f"成功上传帧到 {full_s3_path}", full_s3_path
+                return result_text if bundle else f"成功上传帧到 {full_s3_path}", full_s3_path
             else:
                 # 上传失败，返回错误信息，不更新浏览路径
-                return result_text, subtitle_s3_path.value
+                return result_text, current_browse_path
+        
+        def handle_build_timeline(frame_paths, model_name, language, system_prompt_value, user_prompt_value,
+                                  max_dimension, grayscale, image_format, quality,
+                                  format_type, similarity_threshold, change_threshold):
+            """对提取的帧进行OCR并生成SRT/VTT字幕文件"""
+            if not frame_paths:
+                return "没有可处理的帧，请先提取视频帧", "", None
+            
+            error_count = 0
+            
+            def ocr_frame(frame_path):
+                nonlocal error_count
+                try:
+                    image_bytes, encoded_format, _, _ = encode_image_for_bedrock(
+                        Image.open(frame_path), max_dimension, grayscale, image_format, quality
+                    )
+                    text, usage = invoke_bedrock_ocr(
+                        image_bytes, encoded_format, model_name, language, system_prompt_value, user_prompt_value,
+                        item_ref=frame_path
+                    )
+                    RESULTS_STORE.record_ocr_results(
+                        [{"image_ref": frame_path, "text": text, "usage": usage}], model_name, language
+                    )
+                    return text
+                except Exception as e:
+                    print(f"帧识别错误 ({frame_path}): {str(e)}")
+                    error_count += 1
+                    return ""
+            
+            cues, stats = build_subtitle_timeline(
+                frame_paths, ocr_frame,
+                change_threshold=float(change_threshold),
+                similarity_threshold=float(similarity_threshold)
+            )
+            subtitle = format_subtitle_cues(cues, format_type)
+            
+            output_path = os.path.join(tempfile.mkdtemp(), f"subtitles.{format_type}")
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(subtitle["raw_content"])
+            
+            info = f"共 {stats['frames']} 帧，OCR调用 {stats['ocr_calls']} 次（跳过未变化的帧 {stats['skipped_ocr']} 个），"
+            info += f"生成字幕 {stats['cues']} 条"
+            if error_count:
+                info += f"\n识别失败 {error_count} 帧"
+            return info, subtitle["raw_content"], output_path
+        
+        timeline_button.click(
+            fn=handle_build_timeline,
+            inputs=[frame_paths_state, model_dropdown, language_dropdown, system_prompt, user_prompt,
+                    encoding_max_dimension, encoding_grayscale, encoding_format, encoding_quality,
+                    timeline_format, timeline_similarity, timeline_change_threshold],
+            outputs=[timeline_info, timeline_preview, timeline_file],
+            concurrency_id="bedrock",
+            concurrency_limit=BEDROCK_CONCURRENCY_LIMIT
+        )
         
         # 注册S3上传事件 - 完成上传并更新浏览路径
         s3_upload_button.click(
             fn=upload_and_format_result,
-            inputs=upload_s3_path,
-            outputs=[s3_upload_result, subtitle_s3_path]
-        )
-        
-        # 浏览按钮点击事件 - 手动触发浏览
-        browse_button.click(
-            fn=update_gallery, 
-            inputs=subtitle_s3_path, 
-            outputs=[image_gallery, image_keys]
+            inputs=[upload_s3_path, frame_paths_state, subtitle_s3_path, upload_bundle_checkbox],
+            outputs=[s3_upload_result, subtitle_s3_path],
+            concurrency_id="s3",
+            concurrency_limit=S3_CONCURRENCY_LIMIT
         )
         
         return subtitle_ui, image_keys, subtitle_s3_path
 
-def transcribe_video(s3_video_path, language_code):
-    """使用AWS Transcribe服务转录S3视频中的语音"""
-    try:
-        # 创建Transcribe客户端，指定us-west-2区域
-        transcribe_client = boto3.client('transcribe', region_name='us-west-2')
-        
-        # 生成唯一的任务名称
-        job_name = f"transcribe-job-{uuid.uuid4()}"
-        
-        # 将语言代码映射到AWS Transcribe支持的格式
-        language_mapping = {
-            "SA": "ar-SA",  # 阿拉伯语
-            "JP": "ja-JP",  # 日语
-            "KR": "ko-KR",  # 韩语
-            "FR": "fr-FR",  # 法语
-            "IT": "it-IT",  # 意大利语
-            "DE": "de-DE",  # 德语
-            "UA": "uk-UA",  # 乌克兰语
-            "TR": "tr-TR"   # 土耳其语
-        }
-        
-        # 获取对应的AWS Transcribe语言代码
-        aws_language_code = language_mapping.get(language_code, "en-US")  # 默认使用英语
-        
-        # 解析S3路径
-        if s3_video_path.startswith('s3://'):
-            s3_video_path = s3_video_path[5:]  # 移除's3://'前缀
-            
-        # 获取文件扩展名
-        file_extension = s3_video_path.split('.')[-1].lower()
-        # 映射文件扩展名到媒体格式
-        media_format_mapping = {
-            'mp4': 'mp4',
-            'mov': 'mov',
-            'avi': 'avi',
-            'mkv': 'mkv',
-            'wmv': 'wmv'
-        }
-        media_format = media_format_mapping.get(file_extension, 'mp4')  # 默认使用mp4
-        
-        # 解析bucket和key
-        parts = s3_video_path.strip('/').split('/', 1)
-        bucket = parts[0]
-        key = parts[1] if len(parts) > 1 else ""
-        
-        # 启动转录任务
-        # 确保MediaFileUri是正确的S3 URI格式
-        if not s3_video_path.startswith('s3://'):
-            s3_uri = f"s3://{bucket}/{key}"
-        else:
-            s3_uri = s3_video_path
-            
-        print(f"使用S3 URI: {s3_uri}")
-        
-        # 检查bucket是否存在
-        s3_client = boto3.client('s3')
-        try:
-            s3_client.head_bucket(Bucket=bucket)
-            print(f"确认S3存储桶存在: {bucket}")
-            
-            # 配置字幕输出
-            subtitle_formats = ["srt", "vtt"]
-            
-            # 启动转录任务，包含字幕输出配置
-            response = transcribe_client.start_transcription_job(
-                TranscriptionJobName=job_name,
-                Media={'MediaFileUri': s3_uri},
-                MediaFormat=media_format,
-                LanguageCode=aws_language_code,
-                Subtitles={
-                    'Formats': subtitle_formats,
-                    'OutputStartIndex': 1
-                }
-            )
-            
-            # 返回任务名称和初始状态
-            return {
-                "status": "STARTED",
-                "job_name": job_name,
-                "message": f"已启动转录任务 {job_name}，正在处理中...\n\n任务可能需要几分钟到几小时不等，具体取决于视频长度。\n请点击'检查任务状态'按钮查看进度。"
-            }
-            
-        except Exception as bucket_error:
-            print(f"检查存储桶时出错: {str(bucket_error)}")
-            return {
-                "status": "ERROR",
-                "message": f"转录错误: 无法访问存储桶 {bucket}，请确认存储桶存在且有访问权限"
-            }
-            
-    except Exception as e:
-        return {
-            "status": "ERROR",
-            "message": f"转录错误: {str(e)}"
-        }
-
-def translate_text(text, source_language_code):
-    """使用AWS Translate将文本翻译成中文"""
-    try:
-        # 创建Translate客户端
-        translate_client = boto3.client('translate', region_name='us-west-2')
-        
-        # 调用翻译API
-        response = translate_client.translate_text(
-            Text=text,
-            SourceLanguageCode=source_language_code,
-            TargetLanguageCode='zh'  # 中文
-        )
-        
-        # 返回翻译结果
-        return response['TranslatedText']
-    except Exception as e:
-        print(f"翻译错误: {str(e)}")
-        return f"[翻译失败: {str(e)}]"
-
-def parse_subtitle_file(url, format_type):
-    """下载并解析字幕文件内容"""
-    try:
-        import requests
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            content = response.text
-            
-            # 根据不同格式解析内容
-            if format_type == "srt":
-                # 处理SRT格式，保留时间戳信息
-                lines = content.split('\n')
-                parsed_content = []
-                
-                # 用于存储当前字幕条目
-                current_index = None
-                current_timestamp = None
-                current_text = []
-                
-                for line in lines:
-                    line = line.strip()
-                    
-                    # 处理序号行
-                    if line.isdigit():
-                        # 如果已有内容，先保存之前的条目
-                        if current_index is not None and current_timestamp is not None and current_text:
-                            parsed_content.append({
-                                "index": current_index,
-                                "timestamp": current_timestamp,
-                                "text": " ".join(current_text)
-                            })
-                        
-                        # 开始新条目
-                        current_index = line
-                        current_timestamp = None
-                        current_text = []
-                        continue
-                    
-                    # 处理时间戳行
-                    if '-->' in line:
-                        current_timestamp = line
-                        continue
-                    
-                    # 处理文本行
-                    if line:
-                        current_text.append(line)
-                
-                # 添加最后一个条目
-                if current_index is not None and current_timestamp is not None and current_text:
-                    parsed_content.append({
-                        "index": current_index,
-                        "timestamp": current_timestamp,
-                        "text": " ".join(current_text)
-                    })
-                
-                return {
-                    "format": format_type,
-                    "raw_content": content,
-                    "parsed_content": parsed_content
-                }
-                
-            elif format_type == "vtt":
-                # 简单处理VTT格式，提取文本内容
-                lines = content.split('\n')
-                parsed_content = []
-                current_text = ""
-                
-                # 跳过VTT头部
-                start_parsing = False
-                
-                for line in lines:
-                    if not start_parsing:
-                        if line.strip() == "":
-                            start_parsing = True
-                        continue
-                    
-                    # 跳过时间戳行
-                    if '-->' in line:
-                        if current_text:
-                            parsed_content.append(current_text.strip())
-                            current_text = ""
-                        continue
-                    
-                    # 收集文本行
-                    if line.strip():
-                        current_text += line + " "
-                    elif current_text:
-                        parsed_content.append(current_text.strip())
-                        current_text = ""
-                
-                # 添加最后一段文本
-                if current_text:
-                    parsed_content.append(current_text.strip())
-                
-                return {
-                    "format": format_type,
-                    "raw_content": content,
-                    "parsed_content": parsed_content
-                }
-            
-            else:
-                # 其他格式直接返回原始内容
-                return {
-                    "format": format_type,
-                    "raw_content": content,
-                    "parsed_content": [content]
-                }
-        else:
-            return {
-                "format": format_type,
-                "error": f"下载失败: HTTP状态码 {response.status_code}"
-            }
-    
-    except Exception as e:
-        return {
-            "format": format_type,
-            "error": f"解析错误: {str(e)}"
-        }
-
-def check_transcribe_job_status(job_name):
-    """检查AWS Transcribe任务状态"""
-    try:
-        # 创建Transcribe客户端，指定us-west-2区域
-        transcribe_client = boto3.client('transcribe', region_name='us-west-2')
-        
-        # 获取任务状态
-        response = transcribe_client.get_transcription_job(
-            TranscriptionJobName=job_name
-        )
-        
-        # 提取任务状态
-        job_status = response['TranscriptionJob']['TranscriptionJobStatus']
-        
-        # 根据状态返回不同的信息
-        if job_status == 'COMPLETED':
-            # 任务完成，获取转录结果
-            transcript_uri = response['TranscriptionJob']['Transcript']['TranscriptFileUri']
-            
-            # 获取字幕文件URI（如果有）
-            subtitle_files = {}
-            subtitle_contents = {}
-            
-            if 'Subtitles' in response['TranscriptionJob']:
-                for subtitle in response['TranscriptionJob']['Subtitles'].get('SubtitleFileUris', []):
-                    # 从URI中提取格式，处理带有安全令牌的URL
-                    if '?' in subtitle:
-                        # 如果URL包含查询参数，从基本部分提取格式
-                        base_url = subtitle.split('?')[0]
-                        format_match = base_url.split('.')[-1]
-                    else:
-                        format_match = subtitle.split('.')[-1]
-                    
-                    # 检查是否是支持的格式
-                    if format_match in ['srt', 'vtt']:
-                        subtitle_files[format_match] = subtitle
-                        # 下载并解析字幕文件内容
-                        subtitle_contents[format_match] = parse_subtitle_file(subtitle, format_match)
-                        print(f"已处理 {format_match} 格式字幕")
-                    else:
-                        print(f"不支持的字幕格式: {format_match}")
-            
-            # 下载转录结果
-            import requests
-            transcript_response = requests.get(transcript_uri)
-            transcript_data = transcript_response.json()
-            
-            # 提取转录文本
-            transcript_text = transcript_data['results']['transcripts'][0]['transcript']
-            
-            # 获取语言代码
-            language_code = response['TranscriptionJob']['LanguageCode']
-            source_language = language_code.split('-')[0]  # 提取主要语言代码，如'fr-FR'变为'fr'
-            
-            # 翻译转录文本
-            translated_transcript = translate_text(transcript_text, source_language)
-            
-            # 翻译字幕内容
-            if "srt" in subtitle_contents:
-                srt_content = subtitle_contents["srt"]
-                if "parsed_content" in srt_content and isinstance(srt_content["parsed_content"], list):
-                    for item in srt_content["parsed_content"]:
-                        if isinstance(item, dict) and "text" in item:
-                            # 翻译字幕文本
-                            item["translated_text"] = translate_text(item["text"], source_language)
-            
-            # 构建结果
-            result = {
-                "status": "COMPLETED",
-                "transcript": transcript_text,
-                "translated_transcript": translated_transcript,
-                "subtitle_files": subtitle_files,
-                "subtitle_contents": subtitle_contents,
-                "message": "转录任务已完成！",
-                "source_language": source_language
-            }
-            
-            return result
-            
-        elif job_status == 'FAILED':
-            # 任务失败
-            failure_reason = response['TranscriptionJob'].get('FailureReason', '未知错误')
-            return {
-                "status": "FAILED",
-                "message": f"转录任务失败: {failure_reason}"
-            }
-            
-        else:
-            # 任务仍在进行中
-            progress = response['TranscriptionJob'].get('Progress', 0)
-            return {
-                "status": job_status,
-                "progress": progress,
-                "message": f"转录任务状态: {job_status}, 进度: {progress}%"
-            }
-            
-    except Exception as e:
-        return {
-            "status": "ERROR",
-            "message": f"检查任务状态时出错: {str(e)}"
-        }
-
-def extract_video_frames(video_path, x, y, width, height, fps):
-    """从视频中提取指定区域的帧"""
-    if not video_path or not isinstance(video_path, str):
-        return "视频路径无效", []
-    
-    try:
-        # 打开视频文件
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            return "无法打开视频文件", []
-        
-        # 获取视频属性
-        video_fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / video_fps if video_fps > 0 else 0
-        
-        # 计算提取的帧间隔
-        frame_interval = int(video_fps / fps) if fps > 0 else 1
-        if frame_interval < 1:
-            frame_interval = 1
-        
-        # 准备存储提取的帧
-        extracted_frames = []
-        temp_dir = tempfile.mkdtemp()
-        
-        # 按指定间隔提取帧
-        frame_count = 0
-        saved_count = 0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 按指定间隔提取帧
-            if frame_count % frame_interval == 0:
-                # 确保坐标不超出边界
-                frame_height, frame_width = frame.shape[:2]
-                crop_x = max(0, min(x, frame_width - 1))
-                crop_y = max(0, min(y, frame_height - 1))
-                crop_width = min(width, frame_width - crop_x)
-                crop_height = min(height, frame_height - crop_y)
-                
-                # 裁剪区域
-                if crop_width > 0 and crop_height > 0:
-                    cropped = frame[crop_y:crop_y+crop_height, crop_x:crop_x+crop_width]
-                    
-                    # 保存裁剪的帧
-                    output_path = os.path.join(temp_dir, f"frame_{saved_count:04d}.jpg")
-                    cv2.imwrite(output_path, cropped)
-                    extracted_frames.append(output_path)
-                    saved_count += 1
-                
-                # 限制提取的帧数量，避免过多
-                if saved_count >= 50:  # 最多提取50帧
-                    break
-            
-            frame_count += 1
-        
-        # 释放资源
-        cap.release()
-        
-        # 返回结果信息和提取的帧路径
-        result_info = f"成功从视频中提取了 {saved_count} 帧，帧率: {fps} fps"
-        return result_info, extracted_frames
-    
-    except Exception as e:
-        # 处理异常
-        return f"提取视频帧时发生错误: {str(e)}", []
-
 def create_video_subtitles_ui():
     """创建视频字幕获取界面"""
     with gr.Column() as video_ui:
@@ -1225,10 +1158,6 @@ def create_video_subtitles_ui():
         # 存储选中需要删除的帧索引
         selected_frames = gr.State([])
         
-        # 全局变量存储提取的帧路径
-        global extracted_frame_paths
-        extracted_frame_paths = []
-        
         # S3视频和本地上传整合在同一页面
         with gr.Row():
             with gr.Column(scale=1):
@@ -1291,6 +1220,46 @@ def create_video_subtitles_ui():
                     )
                     check_status_button = gr.Button("检查任务状态", variant="secondary")
                 
+                # 从本地结果库加载以前的转录任务
+                with gr.Row():
+                    history_jobs = gr.Dropdown(
+                        label="历史转录任务",
+                        choices=[],
+                        interactive=True
+                    )
+                    history_refresh_button = gr.Button("刷新历史任务", variant="secondary")
+                
+                # 批量转录：选择多个视频或整个前缀，在并发上限内排队执行
+                with gr.Accordion("批量转录", open=False):
+                    batch_video_select = gr.CheckboxGroup(
+                        label="选择要转录的视频（先点击\"浏览S3视频\"）",
+                        choices=[]
+                    )
+                    batch_concurrency = gr.Slider(
+                        minimum=1,
+                        maximum=100,
+                        value=TRANSCRIBE_CONCURRENCY_LIMIT,
+                        step=1,
+                        label="同时运行的转录任务上限（需低于Transcribe并发任务配额）"
+                    )
+                    batch_incremental = gr.Checkbox(
+                        label="增量处理：转录整个前缀时只处理新增或修改的视频",
+                        value=False
+                    )
+                    with gr.Row():
+                        batch_selected_button = gr.Button("转录选中的视频", variant="primary")
+                        batch_prefix_button = gr.Button("转录整个前缀", variant="secondary")
+                    batch_progress = gr.Dataframe(
+                        headers=["文件名", "任务ID", "状态", "进度 (%)", "说明"],
+                        label="批量转录进度",
+                        interactive=False
+                    )
+                    batch_result_select = gr.Dropdown(
+                        label="查看已完成任务的结果",
+                        choices=[],
+                        interactive=True
+                    )
+                
                 # 转录结果显示
                 transcribe_result = gr.Textbox(
                     label="转录结果",
@@ -1314,8 +1283,10 @@ def create_video_subtitles_ui():
                         meta["size"]
                     ])
                 
-                return dataframe_data, metadata, urls
-            return [], [], []
+                # 同步更新批量转录的视频选项
+                choices = [(meta["name"], meta["key"]) for meta in metadata]
+                return dataframe_data, metadata, urls, gr.update(choices=choices, value=[])
+            return [], [], [], gr.update(choices=[], value=[])
             
         def select_s3_video(evt: gr.SelectData, metadata_list, url_list):
             try:
@@ -1330,14 +1301,14 @@ def create_video_subtitles_ui():
                     
                     # 提示用户不直接加载视频（避免超时问题）
                     # 不返回视频URL，而是返回视频信息
-                    return None, info_text + "\n\n注意：S3视频无法直接播放，请下载后观看。"
+                    return None, info_text + "\n\n注意：S3视频无法直接播放，请下载后观看；提取字幕帧时可在\"字幕识别\"页面直接输入S3路径，无需下载整个视频。"
                 return None, "未能找到视频信息"
             except Exception as e:
                 print(f"视频选择错误: {str(e)}")
                 return None, f"错误: {str(e)}"
         
-        def handle_upload(video_path):
-            """处理本地视频上传，并获取视频信息"""
+        def handle_upload(video_path, detect_region=False):
+            """处理本地视频上传，并获取视频信息；detect_region为True时在进程池中自动检测字幕区域作为默认坐标"""
             if video_path is None:
                 return None, "请上传视频文件"
             
@@ -1363,12 +1334,22 @@ def create_video_subtitles_ui():
                     video_info += f"帧率: {fps:.2f} fps\n"
                     video_info += f"时长: {duration/60:.2f} 分钟\n"
                     
-                    # 使用固定的默认值而不是根据视频大小计算
+                    # 优先使用自动检测的字幕区域，检测失败时回退到固定的默认值
                     default_x = 120
                     default_y = 1300
                     default_width = 850
                     default_height = 220
                     
+                    region, detect_info = None, ""
+                    if detect_region:
+                        region, detect_info = run_in_cpu_pool(detect_subtitle_region, video_path)
+                    if region is not None:
+                        default_x = region["x"]
+                        default_y = region["y"]
+                        default_width = region["width"]
+                        default_height = region["height"]
+                        video_info += f"{detect_info}\n"
+                    
                     # HTML显示
                     dimensions_html = f"""
                     <div style="padding: 15px; background-color: #f0f8ff; border: 1px solid #add8e6; border-radius: 5px; margin: 10px 0;">
@@ -1401,126 +1382,6 @@ def create_video_subtitles_ui():
             """更新区域选择参数"""
             return {"x": int(x), "y": int(y), "width": int(width), "height": int(height)}
             
-        def extract_frames_from_video(video_path, selection, fps):
-            """从视频中提取帧"""
-            if not video_path:
-                return "请先上传或选择一个视频", []
-            
-            x = selection["x"]
-            y = selection["y"]
-            width = selection["width"]
-            height = selection["height"]
-            
-            # 获取视频分辨率以验证坐标
-            cap = cv2.VideoCapture(video_path)
-            if cap.isOpened():
-                video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                cap.release()
-                
-                # 验证坐标是否在视频范围内
-                if x < 0 or y < 0 or x >= video_width or y >= video_height:
-                    error_msg = f"坐标错误：(x={x}, y={y}) 不在视频范围 (0~{video_width-1}, 0~{video_height-1}) 内"
-                    return error_msg, []
-                
-                if x + width > video_width:
-                    old_width = width
-                    width = video_width - x
-                    info_msg = f"注意: 宽度超出范围，已自动调整为 {width} (原值: {old_width})"
-                else:
-                    info_msg = ""
-                
-                if y + height > video_height:
-                    old_height = height
-                    height = video_height - y
-                    if info_msg:
-                        info_msg += f"\n高度超出范围，已自动调整为 {height} (原值: {old_height})"
-                    else:
-                        info_msg = f"注意: 高度超出范围，已自动调整为 {height} (原值: {old_height})"
-            else:
-                info_msg = "警告: 无法读取视频信息，坐标可能不准确"
-            
-            # 确保宽度和高度不为0
-            if width <= 0:
-                width = min(200, video_width - x)
-            if height <= 0:
-                height = min(200, video_height - y)
-                
-            # 调用提取帧函数
-            info, frames = extract_video_frames(video_path, x, y, width, height, fps)
-            
-            # 添加坐标信息到结果中
-            complete_info = f"视频分辨率: {video_width}x{video_height}\n"
-            complete_info += f"提取区域: 从 ({x},{y}) 开始，宽度 {width}，高度 {height}\n"
-            complete_info += f"实际区域: ({x},{y}) 到 ({x+width},{y+height})\n"
-            
-            if info_msg:
-                complete_info += f"{info_msg}\n"
-                
-            complete_info += info
-            
-            # 将提取的帧保存到全局变量中，方便后续上传
-            global extracted_frame_paths
-            extracted_frame_paths = frames
-            
-            return complete_info, frames
-            
-        def upload_frames_to_s3(s3_path):
-            """将提取的帧上传到S3"""
-            global extracted_frame_paths
-            
-            if not extracted_frame_paths or len(extracted_frame_paths) == 0:
-                return "没有可上传的帧，请先提取视频帧"
-                
-            if not s3_path:
-                return "请提供有效的S3路径"
-                
-            try:
-                # 处理s3://前缀
-                if s3_path.startswith('s3://'):
-                    s3_path = s3_path[5:]  # 移除's3://'前缀
-                    
-                # 解析bucket和prefix
-                parts = s3_path.strip('/').split('/', 1)
-                if len(parts) < 2:
-                    return f"无效的S3路径: {s3_path}，格式应为 s3://bucket-name/path/"
-                    
-                bucket = parts[0]
-                prefix = parts[1]
-                
-                # 确保prefix以/结尾
-                if not prefix.endswith('/'):
-                    prefix += '/'
-                    
-                # 创建S3客户端
-                s3_client = boto3.client('s3')
-                
-                # 创建时间戳文件夹
-                timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-                folder_prefix = f"{prefix}{timestamp}/"
-                
-                # 上传文件
-                success_count = 0
-                for idx, frame_path in enumerate(extracted_frame_paths):
-                    if os.path.exists(frame_path):
-                        file_name = os.path.basename(frame_path)
-                        s3_key = f"{folder_prefix}{file_name}"
-                        
-                        s3_client.upload_file(
-                            Filename=frame_path,
-                            Bucket=bucket,
-                            Key=s3_key
-                        )
-                        success_count += 1
-                
-                # 根据用户反馈，不上传索引文件
-                
-                return f"成功上传 {success_count} 帧到 s3://{bucket}/{folder_prefix}"
-                
-            except Exception as e:
-                print(f"上传到S3时出错: {str(e)}")
-                return f"上传失败: {str(e)}"
-        
         # 生成下载链接
         def generate_download_link(metadata_list, url_list, selected_index=None):
             if not metadata_list or not url_list or selected_index is None:
@@ -1542,12 +1403,16 @@ def create_video_subtitles_ui():
         
         # 保存当前选中的行索引
         selected_row_index = gr.State(None)
+        # 保存批量转录任务的状态和结果
+        batch_jobs_state = gr.State([])
         
         # 注册事件处理
         browse_button.click(
             fn=update_s3_video_list,
             inputs=video_s3_path,
-            outputs=[s3_video_list, video_keys, video_urls]
+            outputs=[s3_video_list, video_keys, video_urls, batch_video_select],
+            concurrency_id="s3",
+            concurrency_limit=S3_CONCURRENCY_LIMIT
         )
         
         def handle_s3_video_selection(evt: gr.SelectData, metadata_list, url_list):
@@ -1616,13 +1481,16 @@ def create_video_subtitles_ui():
         
         # 添加检查任务状态的函数
         def handle_check_status(job_name):
-            """检查转录任务状态"""
+            """检查转录任务状态，任务完成时先显示转录文本，翻译好的字幕陆续补上"""
             if not job_name:
-                return "请输入有效的任务ID", False, ""
-            
-            # 调用检查状态函数
-            result = check_transcribe_job_status(job_name)
+                yield "请输入有效的任务ID", False, ""
+                return
             
+            for result in iter_transcribe_job_status(job_name):
+                yield render_transcribe_result(result)
+        
+        def render_transcribe_result(result):
+            """将转录任务结果转换为结果文本和字幕HTML"""
             # 添加调试信息
             print(f"检查任务状态返回结果: {result.get('status', 'UNKNOWN')}")
             if "subtitle_contents" in result:
@@ -1723,18 +1591,127 @@ def create_video_subtitles_ui():
                 # 兼容旧格式
                 return str(result), False, ""
         
+        def handle_batch_transcribe(s3_path, selected_keys, language_code, max_concurrent):
+            """批量转录选中的视频，持续更新进度表"""
+            if not selected_keys:
+                yield [], [], gr.update(choices=[])
+                return
+            
+            bucket, _ = parse_s3_path(s3_path)
+            s3_uris = [f"s3://{bucket}/{key}" for key in selected_keys]
+            print(f"批量转录 {len(s3_uris)} 个视频, 语言: {language_code}, 并发上限: {max_concurrent}")
+            
+            for jobs in run_batch_transcription(s3_uris, language_code, max_concurrent):
+                rows = [[job["name"], job["job_name"], job["status"], job["progress"], job["message"]] for job in jobs]
+                completed = [
+                    (f"{job['name']} ({job['job_name']})", index)
+                    for index, job in enumerate(jobs)
+                    if job["status"] == "COMPLETED"
+                ]
+                yield rows, jobs, gr.update(choices=completed)
+        
+        def handle_batch_transcribe_prefix(s3_path, language_code, max_concurrent, incremental=False):
+            """批量转录当前S3路径下的所有视频，增量模式下只转录新增或修改的视频"""
+            if not incremental:
+                videos_and_metadata = list_s3_videos(s3_path)
+                metadata = videos_and_metadata[1] if len(videos_and_metadata) == 2 else []
+                keys = [meta["key"] for meta in metadata]
+                yield from handle_batch_transcribe(s3_path, keys, language_code, max_concurrent)
+                return
+            
+            try:
+                change_set = list_s3_changes(s3_path, f"transcribe:{language_code}", ('.mp4', '.mov', '.avi', '.mkv', '.wmv'))
+            except Exception as e:
+                print(f"列出S3变更错误: {str(e)}")
+                yield [["", "", "ERROR", 0, f"列出新增视频失败: {str(e)}"]], [], gr.update(choices=[])
+                return
+            print(f"增量转录: {change_set['stats']}")
+            
+            keys = [item["key"] for item in change_set["changed"]]
+            jobs = []
+            for rows, jobs, choices in handle_batch_transcribe(s3_path, keys, language_code, max_concurrent):
+                yield rows, jobs, choices
+            
+            # 转录完成的视频记入清单，失败的视频下次运行时会重新处理
+            commit_s3_changes(change_set, [key for key, job in zip(keys, jobs) if job["status"] == "COMPLETED"])
+        
+        def handle_batch_result_select(index, jobs):
+            """显示批量任务中某个已完成任务的结果，复用单个任务的结果展示"""
+            if index is None or not jobs or index >= len(jobs) or not jobs[index].get("result"):
+                return gr.update(), gr.update(), gr.update()
+            job = jobs[index]
+            transcript_display, _, subtitle_html = render_transcribe_result(job["result"])
+            return transcript_display, job["job_name"], subtitle_html
+        
         # 注册Transcribe按钮事件
         transcribe_button.click(
             fn=handle_transcribe,
             inputs=[video_keys, selected_row_index, transcribe_language],
-            outputs=[transcribe_result, job_name_input, subtitle_links]
+            outputs=[transcribe_result, job_name_input, subtitle_links],
+            concurrency_id="aws_jobs",
+            concurrency_limit=AWS_JOB_CONCURRENCY_LIMIT
         )
         
         # 注册检查状态按钮事件
         check_status_button.click(
             fn=handle_check_status,
             inputs=job_name_input,
-            outputs=[transcribe_result, subtitle_links, subtitle_links]  # 第三个参数是HTML内容
+            outputs=[transcribe_result, subtitle_links, subtitle_links],  # 第三个参数是HTML内容
+            concurrency_id="aws_jobs",
+            concurrency_limit=AWS_JOB_CONCURRENCY_LIMIT
+        )
+        
+        # 注册批量转录事件，长时间运行的轮询任务使用单独的并发组，不占用单个任务的名额
+        batch_selected_button.click(
+            fn=handle_batch_transcribe,
+            inputs=[video_s3_path, batch_video_select, transcribe_language, batch_concurrency],
+            outputs=[batch_progress, batch_jobs_state, batch_result_select],
+            concurrency_id="transcribe_batch",
+            concurrency_limit=AWS_JOB_CONCURRENCY_LIMIT
+        )
+        
+        batch_prefix_button.click(
+            fn=handle_batch_transcribe_prefix,
+            inputs=[video_s3_path, transcribe_language, batch_concurrency, batch_incremental],
+            outputs=[batch_progress, batch_jobs_state, batch_result_select],
+            concurrency_id="transcribe_batch",
+            concurrency_limit=AWS_JOB_CONCURRENCY_LIMIT
+        )
+        
+        batch_result_select.change(
+            fn=handle_batch_result_select,
+            inputs=[batch_result_select, batch_jobs_state],
+            outputs=[transcribe_result, job_name_input, subtitle_links]
+        )
+        
+        def refresh_history_jobs():
+            """列出本地结果库中保存的转录任务"""
+            jobs = RESULTS_STORE.list_transcription_jobs()
+            choices = [
+                (f"{job['name'] or job['source'] or '未知视频'} | {job['status']} | "
+                 f"{datetime.fromtimestamp(job['created_at']).strftime('%Y-%m-%d %H:%M')}", job["job_name"])
+                for job in jobs
+            ]
+            return gr.update(choices=choices, value=None)
+        
+        def handle_history_select(job_name):
+            """显示历史任务的结果，已完成的任务直接从结果库读取"""
+            if not job_name:
+                return gr.update(), gr.update(), gr.update()
+            transcript_display, _, subtitle_html = render_transcribe_result(check_transcribe_job_status(job_name))
+            return transcript_display, job_name, subtitle_html
+        
+        history_refresh_button.click(
+            fn=refresh_history_jobs,
+            outputs=history_jobs
+        )
+        
+        history_jobs.change(
+            fn=handle_history_select,
+            inputs=history_jobs,
+            outputs=[transcribe_result, job_name_input, subtitle_links],
+            concurrency_id="aws_jobs",
+            concurrency_limit=AWS_JOB_CONCURRENCY_LIMIT
         )
         
         # 修改为只返回视频信息，不设置坐标
@@ -1781,27 +1758,6 @@ def create_video_subtitles_ui():
         
         # 删除对不存在的extract_button和upload_video的引用
         
-        # 删除指定索引的帧
-        def delete_frame_by_index(index):
-            global extracted_frame_paths
-            
-            index = int(index) # 确保是整数
-            
-            if not extracted_frame_paths:
-                return "没有可删除的帧，请先提取视频帧", extracted_frame_paths
-                
-            # 确保索引在有效范围内
-            if index >= 0 and index < len(extracted_frame_paths):
-                # 删除指定索引的帧
-                deleted_path = extracted_frame_paths.pop(index)
-                
-                # 更新提示信息
-                result = f"已删除索引为 {index} 的帧，当前剩余 {len(extracted_frame_paths)} 帧"
-                
-                return result, extracted_frame_paths
-            else:
-                return f"无效的索引: {index}。有效范围: 0-{len(extracted_frame_paths)-1}", extracted_frame_paths
-        
         # 删除对不存在的delete_frames_btn的引用
         
         # 删除对不存在的s3_upload_button的引用
@@ -1810,6 +1766,111 @@ def create_video_subtitles_ui():
         upload_s3_path_placeholder = gr.State("s3://general-demo-3/madhouse-ads-videos/subtitle-screen-shots/")
         return video_ui, video_s3_path, upload_s3_path_placeholder
 
+def create_search_ui():
+    """创建字幕搜索界面"""
+    with gr.Column() as search_ui:
+        search_matches = gr.State([])
+        
+        with gr.Row():
+            search_query = gr.Textbox(
+                label="搜索内容",
+                placeholder="输入要查找的原文或中文翻译，例如广告中的一句台词",
+                scale=4
+            )
+            search_button = gr.Button("搜索", variant="primary", scale=1)
+        
+        search_kinds = gr.CheckboxGroup(
+            choices=[(label, kind) for kind, label in SEARCH_KINDS.items()],
+            value=list(SEARCH_KINDS),
+            label="搜索范围"
+        )
+        
+        search_info = gr.Textbox(label="搜索信息", interactive=False)
+        search_results = gr.Dataframe(
+            headers=["类型", "视频", "时间", "内容"],
+            label="搜索结果（点击一行跳转到对应的视频位置）",
+            interactive=False
+        )
+        
+        with gr.Row():
+            search_player = gr.HTML()
+            search_frame = gr.Image(label="对应的帧", type="pil")
+        search_detail = gr.Textbox(label="详细信息", lines=3, interactive=False)
+        
+        def handle_search(query, kinds):
+            """在本地结果库中搜索"""
+            if not query or not query.strip():
+                return "请输入搜索内容", [], []
+            
+            start_time = time.time()
+            matches = RESULTS_STORE.search(query, kinds or None)
+            if not RESULTS_STORE.search_enabled:
+                return f"全文搜索不可用：需要SQLite 3.34及以上版本（当前为{sqlite3.sqlite_version}）", [], []
+            elapsed = (time.time() - start_time) * 1000
+            rows = [
+                [SEARCH_KINDS.get(match["kind"], match["kind"]), os.path.basename(match["source"] or ""),
+                 match["timestamp"], match["snippet"]]
+                for match in matches
+            ]
+            return f"找到 {len(matches)} 条结果，用时 {elapsed:.1f} 毫秒", rows, matches
+        
+        def handle_result_select(evt: gr.SelectData, matches):
+            """跳转到搜索结果对应的视频和时间点"""
+            selected_index = evt.index[0]
+            if not matches or selected_index >= len(matches):
+                return "", None, ""
+            
+            match = matches[selected_index]
+            source = match["source"] or ""
+            start_seconds = match["start_seconds"] or 0
+            detail = f"来源: {source}\n时间: {match['timestamp'] or '无'}\n任务/图片: {match['ref']}"
+            
+            player_html = ""
+            frame = None
+            try:
+                if source.startswith("s3://") and source.lower().endswith(('.mp4', '.mov', '.avi', '.mkv', '.wmv')):
+                    # 使用预签名URL播放S3视频，并通过媒体片段定位到时间点
+                    bucket, key = parse_s3_path(source)
+                    url = boto3.client('s3').generate_presigned_url(
+                        'get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=3600
+                    )
+                    player_html = f'<video src="{url}#t={start_seconds}" controls autoplay style="width:100%;"></video>'
+                
+                ref = match["ref"] or ""
+                if match["kind"] == "ocr":
+                    if os.path.exists(ref):
+                        frame = Image.open(ref)
+                    elif ref.startswith("s3://"):
+                        bucket, key = parse_s3_path(ref)
+                        frame = Image.open(io.BytesIO(read_s3_frame(bucket, key)))
+            except Exception as e:
+                print(f"加载搜索结果错误: {str(e)}")
+                detail += f"\n加载失败: {str(e)}"
+            
+            return player_html, frame, detail
+        
+        search_button.click(
+            fn=handle_search,
+            inputs=[search_query, search_kinds],
+            outputs=[search_info, search_results, search_matches]
+        )
+        
+        search_query.submit(
+            fn=handle_search,
+            inputs=[search_query, search_kinds],
+            outputs=[search_info, search_results, search_matches]
+        )
+        
+        search_results.select(
+            fn=handle_result_select,
+            inputs=search_matches,
+            outputs=[search_player, search_frame, search_detail],
+            concurrency_id="s3",
+            concurrency_limit=S3_CONCURRENCY_LIMIT
+        )
+    
+    return search_ui
+
 def create_app():
     """创建主应用"""
     with gr.Blocks(theme=gr.themes.Soft()) as demo:
@@ -1831,6 +1892,7 @@ def create_app():
                 with gr.Column():
                     video_btn = gr.Button("视频字幕获取", variant="primary")
                     subtitle_btn = gr.Button("字幕截图文字识别", variant="secondary")
+                    search_btn = gr.Button("字幕搜索", variant="secondary")
                 
                 # S3配置区域
                 gr.Markdown("### S3路径设置", elem_id="s3-settings-title")
@@ -1856,6 +1918,7 @@ def create_app():
                 # 创建内容区容器 - 默认显示视频字幕获取标签页
                 subtitle_container = gr.Column(visible=False)
                 video_container = gr.Column(visible=True)
+                search_container = gr.Column(visible=False)
                 
                 # 向容器中添加UI组件
                 with subtitle_container:
@@ -1863,22 +1926,39 @@ def create_app():
                 
                 with video_container:
                     video_ui, video_s3_path, upload_s3_path = create_video_subtitles_ui()
+                
+                with search_container:
+                    search_ui = create_search_ui()
         
         # 导航切换事件处理
         def show_subtitle_tab():
             return {
                 subtitle_container: gr.Column(visible=True),
                 video_container: gr.Column(visible=False),
+                search_container: gr.Column(visible=False),
                 subtitle_btn: gr.Button(variant="primary"),
-                video_btn: gr.Button(variant="secondary")
+                video_btn: gr.Button(variant="secondary"),
+                search_btn: gr.Button(variant="secondary")
             }
             
         def show_video_tab():
             return {
                 subtitle_container: gr.Column(visible=False),
                 video_container: gr.Column(visible=True),
+                search_container: gr.Column(visible=False),
+                subtitle_btn: gr.Button(variant="secondary"),
+                video_btn: gr.Button(variant="primary"),
+                search_btn: gr.Button(variant="secondary")
+            }
+            
+        def show_search_tab():
+            return {
+                subtitle_container: gr.Column(visible=False),
+                video_container: gr.Column(visible=False),
+                search_container: gr.Column(visible=True),
                 subtitle_btn: gr.Button(variant="secondary"),
-                video_btn: gr.Button(variant="primary")
+                video_btn: gr.Button(variant="secondary"),
+                search_btn: gr.Button(variant="primary")
             }
             
         # 加载S3设置函数
@@ -1900,13 +1980,19 @@ def create_app():
         subtitle_btn.click(
             fn=show_subtitle_tab,
             inputs=None,
-            outputs=[subtitle_container, video_container, subtitle_btn, video_btn]
+            outputs=[subtitle_container, video_container, search_container, subtitle_btn, video_btn, search_btn]
         )
         
         video_btn.click(
             fn=show_video_tab,
             inputs=None,
-            outputs=[subtitle_container, video_container, subtitle_btn, video_btn]
+            outputs=[subtitle_container, video_container, search_container, subtitle_btn, video_btn, search_btn]
+        )
+        
+        search_btn.click(
+            fn=show_search_tab,
+            inputs=None,
+            outputs=[subtitle_container, video_container, search_container, subtitle_btn, video_btn, search_btn]
         )
         
         # 注册加载设置按钮事件
@@ -1922,6 +2008,8 @@ def create_app():
             ]
         )
         
+    # 未单独设置并发组的事件（界面切换、读取视频信息等轻量操作）使用默认并发数
+    demo.queue(default_concurrency_limit=CPU_WORKERS * 2, max_size=QUEUE_MAX_SIZE)
     return demo
 
 if __name__ == "__main__":
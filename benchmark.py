@@ -0,0 +1,122 @@
+"""视频字幕工具的性能测试脚本
+
+用法:
+    # 先启动应用: python app.py
+    python benchmark.py load --video sample.mp4 --users 1,2,5,10
+    # 冷启动导入耗时（每次在新的Python进程中导入）
+    python benchmark.py import --modules core,app --repeats 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 在子进程中执行：测量导入耗时，可选地测量构建界面的耗时，并记录导入后已加载的重依赖
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+import_seconds = time.perf_counter() - start
+build_seconds = None
+if sys.argv[2] == "1" and hasattr(module, "create_app"):
+    start = time.perf_counter()
+    module.create_app()
+    build_seconds = time.perf_counter() - start
+heavy = [name for name in ("gradio", "boto3", "botocore", "cv2", "numpy", "PIL.Image") if name in sys.modules]
+print(json.dumps({"import": import_seconds, "build": build_seconds, "heavy": heavy}))
+"""
+
+def run_load_test(url, video_path, user_counts, requests_per_user=3, api_name="/detect_region"):
+    """模拟多个用户同时调用接口，返回每个并发级别的延迟统计"""
+    from gradio_client import Client, handle_file
+
+    results = []
+    for users in user_counts:
+        # 每个模拟用户使用独立的客户端，对应独立的会话
+        clients = [Client(url, verbose=False) for _ in range(users)]
+
+        def simulate_user(client):
+            latencies = []
+            for _ in range(requests_per_user):
+                start = time.time()
+                client.predict(
+                    handle_file(video_path), 20, 120, 1300, 850, 220,
+                    api_name=api_name
+                )
+                latencies.append(time.time() - start)
+            return latencies
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            latencies = [latency for user_latencies in executor.map(simulate_user, clients)
+                         for latency in user_latencies]
+        elapsed = time.time() - start
+
+        latencies.sort()
+        results.append({
+            "users": users,
+            "requests": len(latencies),
+            "p50": statistics.median(latencies),
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "throughput": len(latencies) / elapsed
+        })
+    return results
+
+def run_import_test(modules, repeats=5, build_app=False):
+    """在新的Python进程中反复导入模块，返回每个模块的冷启动导入耗时统计"""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for module in modules:
+        samples = []
+        for _ in range(repeats):
+            output = subprocess.run(
+                [sys.executable, "-c", IMPORT_PROBE, module, "1" if build_app else "0"],
+                cwd=repo_dir, capture_output=True, text=True, check=True
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        
+        import_times = [sample["import"] for sample in samples]
+        build_times = [sample["build"] for sample in samples if sample["build"] is not None]
+        results.append({
+            "module": module,
+            "p50": statistics.median(import_times),
+            "max": max(import_times),
+            "build": statistics.median(build_times) if build_times else None,
+            "heavy": samples[-1]["heavy"]
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="视频字幕工具性能测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load_parser = subparsers.add_parser("load", help="多用户并发负载测试")
+    load_parser.add_argument("--url", default="http://127.0.0.1:7860/", help="应用地址")
+    load_parser.add_argument("--video", required=True, help="用于测试的本地视频文件")
+    load_parser.add_argument("--users", default="1,2,5,10", help="逗号分隔的并发用户数")
+    load_parser.add_argument("--requests", type=int, default=3, help="每个用户的请求次数")
+
+    import_parser = subparsers.add_parser("import", help="模块冷启动导入耗时")
+    import_parser.add_argument("--modules", default="core,app", help="逗号分隔的模块名")
+    import_parser.add_argument("--repeats", type=int, default=5, help="每个模块的测量次数")
+    import_parser.add_argument("--build", action="store_true", help="同时测量create_app构建界面的耗时")
+    
+    args = parser.parse_args()
+
+    if args.command == "load":
+        user_counts = [int(value) for value in args.users.split(",")]
+        print(f"{'用户数':>6} {'请求数':>6} {'P50(秒)':>9} {'P95(秒)':>9} {'吞吐(次/秒)':>12}")
+        for row in run_load_test(args.url, args.video, user_counts, args.requests):
+            print(f"{row['users']:>6} {row['requests']:>6} {row['p50']:>9.2f} {row['p95']:>9.2f} {row['throughput']:>12.2f}")
+    elif args.command == "import":
+        print(f"{'模块':>6} {'P50(秒)':>9} {'最大(秒)':>9} {'构建界面(秒)':>12}  已加载的重依赖")
+        for row in run_import_test(args.modules.split(","), args.repeats, args.build):
+            build = f"{row['build']:>12.2f}" if row["build"] is not None else f"{'-':>12}"
+            print(f"{row['module']:>6} {row['p50']:>9.2f} {row['max']:>9.2f} {build}  {', '.join(row['heavy']) or '无'}")
+
+if __name__ == "__main__":
+    main()
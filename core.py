@@ -0,0 +1,4126 @@
+"""视频字幕工具的处理逻辑：帧提取、OCR、转录、翻译和本地结果库
+
+不依赖Gradio，命令行工具和工作进程可以直接导入；numpy、OpenCV、PIL和boto3在首次使用时才加载，
+界面层（app.py）只负责组装Gradio组件和事件。
+"""
+import importlib
+import io
+import base64
+import json
+import multiprocessing
+import os
+import hashlib
+import shutil
+import sqlite3
+import struct
+import tempfile
+import uuid
+import random
+import re
+import time
+import difflib
+import unicodedata
+import queue
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+class LazyModule:
+    """延迟导入的模块代理，首次访问模块属性时才真正导入"""
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# 导入耗时较长的依赖按需加载
+boto3 = LazyModule("boto3")
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+Image = LazyModule("PIL.Image")
+botocore_exceptions = LazyModule("botocore.exceptions")
+
+def get_model_id(model_name):
+    """根据界面选择的模型名称返回Bedrock模型ID"""
+    model_mapping = {
+        "Claude 3 Opus": "us.anthropic.claude-3-opus-20240229-v1:0",
+        "Claude 3 Sonnet": "us.anthropic.claude-3-sonnet-20240229-v1:0",
+        "Claude 3.5 Haiku": "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+        "Claude 3.5 Sonnet v2": "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
+        "Claude 3.5 Sonnet v1": "us.anthropic.claude-3-5-sonnet-20240620-v1:0",
+        "Claude 3.7 Sonnet": "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+        "Nova Lite": "us.amazon.nova-lite-v1:0",
+        "Nova Pro": "us.amazon.nova-pro-v1:0"
+    }
+    return model_mapping.get(model_name)
+
+def get_language_name(lang_code):
+    """将语言代码转换为完整名称"""
+    language_map = {
+        "SA": "梵文/阿拉伯语",
+        "JP": "日语",
+        "KR": "韩语",
+        "FR": "法语",
+        "IT": "意大利语",
+        "DE": "德语",
+        "UA": "乌克兰语",
+        "TR": "土耳其语"
+    }
+    return language_map.get(lang_code, "未知语言")
+
+# 并发配置：CPU密集的视频处理在进程池中执行，I/O密集的AWS调用按服务分组限流
+CPU_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+BEDROCK_CONCURRENCY_LIMIT = 8
+S3_CONCURRENCY_LIMIT = 8
+AWS_JOB_CONCURRENCY_LIMIT = 4
+S3_TRANSFER_WORKERS = 16
+QUEUE_MAX_SIZE = 100
+
+# 进程池在首次使用时创建。此时Gradio服务器已有多个线程，fork会把其他线程持有的锁一起复制到子进程中，
+# 因此工作进程由forkserver从一个预先导入了core的单线程进程中fork出来。
+# 注意工作进程仍会重新执行主模块（python app.py时为app.py，作为__mp_main__），
+# 所以app.py也按需加载Gradio，否则每个工作进程都要导入一次Gradio
+_cpu_pool = None
+
+def run_in_cpu_pool(fn, *args, **kwargs):
+    """在进程池中执行CPU密集型函数，避免阻塞其他用户的请求"""
+    global _cpu_pool
+    if _cpu_pool is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["core"])
+        else:
+            # Windows没有forkserver
+            context = multiprocessing.get_context("spawn")
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=context)
+    return _cpu_pool.submit(fn, *args, **kwargs).result()
+
+def parse_s3_path(s3_path):
+    """解析S3路径，返回(bucket, prefix)"""
+    if not s3_path:
+        return "", ""
+    
+    # 处理s3://前缀
+    if s3_path.startswith('s3://'):
+        s3_path = s3_path[5:]  # 移除's3://'前缀
+    
+    # 解析bucket和prefix
+    parts = s3_path.lstrip('/').split('/', 1)
+    bucket = parts[0]
+    prefix = parts[1] if len(parts) > 1 else ""
+    return bucket, prefix
+
+# 本地结果库：保存视频、帧、OCR结果、转录任务和字幕翻译，重启后可以直接查询历史结果
+RESULTS_DB_PATH = os.environ.get("RESULTS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.db"))
+
+RESULTS_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    name TEXT,
+    created_at REAL
+);
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    video_id INTEGER REFERENCES videos(id),
+    path TEXT NOT NULL UNIQUE,
+    frame_index INTEGER,
+    timestamp REAL,
+    likely_text INTEGER,
+    s3_uri TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_frames_video ON frames(video_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_frames_s3_uri ON frames(s3_uri);
+CREATE TABLE IF NOT EXISTS ocr_results (
+    id INTEGER PRIMARY KEY,
+    frame_id INTEGER REFERENCES frames(id),
+    image_ref TEXT NOT NULL,
+    model TEXT,
+    language TEXT,
+    text TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    error TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_image_ref ON ocr_results(image_ref, created_at);
+CREATE INDEX IF NOT EXISTS idx_ocr_frame ON ocr_results(frame_id);
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    job_arn TEXT PRIMARY KEY,
+    collected_at REAL
+);
+CREATE TABLE IF NOT EXISTS transcription_jobs (
+    job_name TEXT PRIMARY KEY,
+    video_id INTEGER REFERENCES videos(id),
+    language_code TEXT,
+    status TEXT,
+    transcript TEXT,
+    translated_transcript TEXT,
+    source_language TEXT,
+    subtitle_files TEXT,
+    subtitle_contents TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_video ON transcription_jobs(video_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON transcription_jobs(status, created_at);
+CREATE TABLE IF NOT EXISTS translated_cues (
+    id INTEGER PRIMARY KEY,
+    job_name TEXT NOT NULL REFERENCES transcription_jobs(job_name),
+    cue_index INTEGER,
+    timestamp TEXT,
+    text TEXT,
+    translated_text TEXT,
+    UNIQUE(job_name, cue_index)
+);
+CREATE TABLE IF NOT EXISTS prefix_manifests (
+    prefix TEXT NOT NULL,
+    task TEXT NOT NULL,
+    key TEXT NOT NULL,
+    etag TEXT,
+    last_modified REAL,
+    processed_at REAL,
+    PRIMARY KEY (prefix, task, key)
+);
+CREATE TABLE IF NOT EXISTS prefix_watermarks (
+    prefix TEXT NOT NULL,
+    task TEXT NOT NULL,
+    watermark REAL,
+    updated_at REAL,
+    PRIMARY KEY (prefix, task)
+);
+CREATE TABLE IF NOT EXISTS video_costs (
+    run_id TEXT NOT NULL,
+    video_id INTEGER NOT NULL REFERENCES videos(id),
+    model TEXT,
+    calls INTEGER,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cost REAL,
+    updated_at REAL,
+    PRIMARY KEY (run_id, video_id)
+);
+CREATE INDEX IF NOT EXISTS idx_video_costs_video ON video_costs(video_id);
+"""
+
+# 全文索引单独创建：SQLite低于3.34时不支持trigram分词，此时只关闭搜索功能，不影响结果库的其他功能。
+# trigram索引无法匹配少于3个字符的查询，search_bigrams为每条内容保存所有相邻两个字符，用于常见的两字中日韩词语
+SEARCH_INDEX_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    content,
+    kind UNINDEXED,
+    source UNINDEXED,
+    ref UNINDEXED,
+    timestamp UNINDEXED,
+    start_seconds UNINDEXED,
+    tokenize = 'trigram'
+);
+CREATE TABLE IF NOT EXISTS search_bigrams (
+    bigram TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    PRIMARY KEY (bigram, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_search_bigrams_doc ON search_bigrams(doc);
+"""
+
+# 全文搜索结果的类型
+SEARCH_KINDS = {
+    "transcript": "转录文本",
+    "cue": "字幕",
+    "translation": "中文翻译",
+    "ocr": "截图识别"
+}
+
+def parse_subtitle_timestamp(timestamp):
+    """解析SRT/VTT时间戳（或"开始 --> 结束"时间范围的开始时间），返回秒数"""
+    try:
+        start = str(timestamp).split("-->")[0].strip().replace(",", ".")
+        hours, minutes, seconds = start.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (ValueError, AttributeError):
+        return None
+
+class ResultsStore:
+    """基于SQLite（WAL模式）的本地结果库，每个线程（和进程）使用独立的连接"""
+    
+    def __init__(self, db_path=RESULTS_DB_PATH):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.search_enabled = False
+    
+    def connect(self):
+        # 进程池中的子进程不能复用父进程的连接，按进程ID区分
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(RESULTS_DB_SCHEMA)
+            has_search_index = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'search_bigrams'"
+            ).fetchone() is not None
+            try:
+                conn.executescript(SEARCH_INDEX_SCHEMA)
+                self.search_enabled = True
+            except sqlite3.OperationalError as e:
+                print(f"全文搜索不可用（需要SQLite 3.34及以上版本，当前为{sqlite3.sqlite_version}）: {str(e)}")
+                self.search_enabled = False
+            if self.search_enabled and not has_search_index:
+                # 旧版本的结果库没有全文索引（或没有两字索引），首次打开时根据已有数据建立
+                self.rebuild_search_index(conn)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+    
+    def video_id(self, conn, source, name=None):
+        conn.execute(
+            "INSERT OR IGNORE INTO videos (source, name, created_at) VALUES (?, ?, ?)",
+            (source, name or os.path.basename(source), time.time())
+        )
+        return conn.execute("SELECT id FROM videos WHERE source = ?", (source,)).fetchone()["id"]
+    
+    def record_frames(self, video_source, frames):
+        """记录提取的帧，frames为包含path、index、timestamp、likely_text的字典列表"""
+        with self.connect() as conn:
+            video_id = self.video_id(conn, video_source)
+            conn.executemany(
+                """INSERT INTO frames (video_id, path, frame_index, timestamp, likely_text, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(path) DO UPDATE SET video_id = excluded.video_id, frame_index = excluded.frame_index,
+                   timestamp = excluded.timestamp, likely_text = excluded.likely_text""",
+                [(video_id, frame["path"], frame.get("index"), frame.get("timestamp"),
+                  None if frame.get("likely_text") is None else int(frame["likely_text"]), time.time())
+                 for frame in frames]
+            )
+    
+    def set_frame_s3_uris(self, uris_by_path):
+        """记录帧上传到S3后的位置"""
+        with self.connect() as conn:
+            conn.executemany("UPDATE frames SET s3_uri = ? WHERE path = ?",
+                             [(uri, path) for path, uri in uris_by_path.items()])
+    
+    def record_ocr_results(self, results, model_name, language, batch_job_arn=None):
+        """记录OCR结果，每个结果包含image_ref（本地帧路径或S3 URI）、text、usage和error
+
+        传入batch_job_arn时每个批量推理任务的结果只记录一次，已记录过时不写入并返回False。
+        """
+        with self.connect() as conn:
+            if batch_job_arn and conn.execute(
+                "INSERT OR IGNORE INTO batch_jobs (job_arn, collected_at) VALUES (?, ?)", (batch_job_arn, time.time())
+            ).rowcount == 0:
+                return False
+            for result in results:
+                image_ref = result["image_ref"]
+                frame = conn.execute("SELECT id FROM frames WHERE path = ? OR s3_uri = ?", (image_ref, image_ref)).fetchone()
+                usage = result.get("usage") or {}
+                cursor = conn.execute(
+                    """INSERT INTO ocr_results (frame_id, image_ref, model, language, text, input_tokens, output_tokens,
+                       error, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (frame["id"] if frame else None, image_ref, model_name, language, result.get("text", ""),
+                     usage.get("input_tokens"), usage.get("output_tokens"), result.get("error", ""), time.time())
+                )
+                if result.get("text") and not result.get("error"):
+                    self.index_ocr_result(conn, cursor.lastrowid)
+        return True
+    
+    def frame_videos(self, paths):
+        """返回帧路径对应的视频来源"""
+        conn = self.connect()
+        videos = {}
+        paths = list(paths)
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            videos.update(
+                (row["path"], row["source"]) for row in conn.execute(
+                    f"""SELECT f.path, v.source FROM frames f JOIN videos v ON v.id = f.video_id
+                        WHERE f.path IN ({', '.join('?' for _ in chunk)})""",
+                    chunk
+                )
+            )
+        return videos
+    
+    def save_video_costs(self, run_id, model_name, per_video):
+        """保存一次识别运行中每个视频的用量和成本，同一运行继续处理时覆盖更新"""
+        with self.connect() as conn:
+            for source, usage in per_video.items():
+                conn.execute(
+                    """INSERT OR REPLACE INTO video_costs
+                       (run_id, video_id, model, calls, input_tokens, output_tokens, cost, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (run_id, self.video_id(conn, source), model_name, usage["calls"], usage["input_tokens"],
+                     usage["output_tokens"], usage["cost"], time.time())
+                )
+    
+    def video_cost_summary(self, source):
+        """返回视频所有识别运行的累计用量和成本"""
+        row = self.connect().execute(
+            """SELECT COUNT(c.run_id) AS runs, COALESCE(SUM(c.calls), 0) AS calls,
+                      COALESCE(SUM(c.input_tokens), 0) AS input_tokens, COALESCE(SUM(c.output_tokens), 0) AS output_tokens,
+                      COALESCE(SUM(c.cost), 0) AS cost
+               FROM video_costs c JOIN videos v ON v.id = c.video_id WHERE v.source = ?""",
+            (source,)
+        ).fetchone()
+        return dict(row)
+    
+    def latest_ocr_text(self, image_ref):
+        """返回图片最近一次成功的OCR结果，没有时返回None"""
+        row = self.connect().execute(
+            """SELECT text FROM ocr_results WHERE image_ref = ? AND (error IS NULL OR error = '')
+               ORDER BY created_at DESC LIMIT 1""",
+            (image_ref,)
+        ).fetchone()
+        return row["text"] if row else None
+    
+    def record_transcription_job(self, job_name, s3_uri, language_code, status="IN_PROGRESS"):
+        with self.connect() as conn:
+            video_id = self.video_id(conn, s3_uri)
+            now = time.time()
+            conn.execute(
+                """INSERT OR IGNORE INTO transcription_jobs (job_name, video_id, language_code, status, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (job_name, video_id, language_code, status, now, now)
+            )
+    
+    def save_transcription_result(self, job_name, result):
+        """保存转录任务的状态，任务完成时同时保存转录文本、翻译和字幕"""
+        with self.connect() as conn:
+            now = time.time()
+            conn.execute(
+                """INSERT INTO transcription_jobs (job_name, status, created_at, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(job_name) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at""",
+                (job_name, result.get("status"), now, now)
+            )
+            if result.get("status") != "COMPLETED":
+                return
+            
+            conn.execute(
+                """UPDATE transcription_jobs SET transcript = ?, translated_transcript = ?, source_language = ?,
+                   subtitle_files = ?, subtitle_contents = ? WHERE job_name = ?""",
+                (result.get("transcript"), result.get("translated_transcript"), result.get("source_language"),
+                 json.dumps(result.get("subtitle_files", {}), ensure_ascii=False),
+                 json.dumps(result.get("subtitle_contents", {}), ensure_ascii=False), job_name)
+            )
+            cues = result.get("subtitle_contents", {}).get("srt", {}).get("parsed_content", [])
+            conn.executemany(
+                """INSERT OR REPLACE INTO translated_cues (job_name, cue_index, timestamp, text, translated_text)
+                   VALUES (?, ?, ?, ?, ?)""",
+                [(job_name, item.get("index"), item.get("timestamp"), item.get("text"), item.get("translated_text"))
+                 for item in cues if isinstance(item, dict) and "text" in item]
+            )
+            self.index_transcription_job(conn, job_name)
+    
+    def get_transcription_result(self, job_name):
+        """返回已完成任务保存的结果，格式与check_transcribe_job_status一致；未完成或不存在时返回None"""
+        row = self.connect().execute(
+            "SELECT * FROM transcription_jobs WHERE job_name = ? AND status = 'COMPLETED'", (job_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "status": "COMPLETED",
+            "transcript": row["transcript"],
+            "translated_transcript": row["translated_transcript"],
+            "subtitle_files": json.loads(row["subtitle_files"] or "{}"),
+            "subtitle_contents": json.loads(row["subtitle_contents"] or "{}"),
+            "message": "转录任务已完成！（来自本地结果库）",
+            "source_language": row["source_language"]
+        }
+    
+    def add_search_rows(self, conn, rows):
+        """写入全文索引，rows为(content, kind, source, ref, timestamp, start_seconds)，同时记录每条内容的两字组合"""
+        for row in rows:
+            cursor = conn.execute(
+                "INSERT INTO search_index (content, kind, source, ref, timestamp, start_seconds) VALUES (?, ?, ?, ?, ?, ?)",
+                row
+            )
+            content = row[0].lower()
+            conn.executemany(
+                "INSERT OR IGNORE INTO search_bigrams (bigram, doc) VALUES (?, ?)",
+                [(bigram, cursor.lastrowid) for bigram in {content[i:i + 2] for i in range(len(content) - 1)}]
+            )
+    
+    def index_ocr_result(self, conn, ocr_id):
+        """将一条OCR结果加入全文索引，帧所属视频和时间戳一并保存"""
+        if not self.search_enabled:
+            return
+        row = conn.execute(
+            """SELECT o.text, 'ocr', COALESCE(v.source, o.image_ref), o.image_ref,
+                      CASE WHEN f.timestamp IS NULL THEN '' ELSE printf('%.3f', f.timestamp) END, f.timestamp
+               FROM ocr_results o LEFT JOIN frames f ON f.id = o.frame_id LEFT JOIN videos v ON v.id = f.video_id
+               WHERE o.id = ?""",
+            (ocr_id,)
+        ).fetchone()
+        if row is not None:
+            self.add_search_rows(conn, [tuple(row)])
+    
+    def index_transcription_job(self, conn, job_name):
+        """将转录文本、字幕及其中文翻译加入全文索引，重复保存时先删除旧的索引"""
+        if not self.search_enabled:
+            return
+        conn.execute(
+            "DELETE FROM search_bigrams WHERE doc IN (SELECT rowid FROM search_index WHERE ref = ? AND kind != 'ocr')",
+            (job_name,)
+        )
+        conn.execute("DELETE FROM search_index WHERE ref = ? AND kind != 'ocr'", (job_name,))
+        job = conn.execute(
+            """SELECT j.transcript, j.translated_transcript, v.source FROM transcription_jobs j
+               LEFT JOIN videos v ON v.id = j.video_id WHERE j.job_name = ?""",
+            (job_name,)
+        ).fetchone()
+        if job is None:
+            return
+        
+        source = job["source"] or job_name
+        rows = [(job["transcript"], "transcript", source, job_name, "", 0.0),
+                (job["translated_transcript"], "translation", source, job_name, "", 0.0)]
+        for cue in conn.execute(
+            "SELECT timestamp, text, translated_text FROM translated_cues WHERE job_name = ? ORDER BY cue_index",
+            (job_name,)
+        ):
+            start_seconds = parse_subtitle_timestamp(cue["timestamp"])
+            rows.append((cue["text"], "cue", source, job_name, cue["timestamp"], start_seconds))
+            rows.append((cue["translated_text"], "translation", source, job_name, cue["timestamp"], start_seconds))
+        self.add_search_rows(conn, [row for row in rows if row[0]])
+    
+    def rebuild_search_index(self, conn=None):
+        """根据已保存的OCR结果和转录任务重建全文索引"""
+        conn = conn or self.connect()
+        if not self.search_enabled:
+            return
+        with conn:
+            conn.execute("DELETE FROM search_index")
+            conn.execute("DELETE FROM search_bigrams")
+            for row in conn.execute(
+                "SELECT id FROM ocr_results WHERE text != '' AND (error IS NULL OR error = '')"
+            ).fetchall():
+                self.index_ocr_result(conn, row["id"])
+            for row in conn.execute("SELECT job_name FROM transcription_jobs WHERE status = 'COMPLETED'").fetchall():
+                self.index_transcription_job(conn, row["job_name"])
+    
+    def search(self, query, kinds=None, limit=100):
+        """全文搜索转录文本、字幕、翻译和OCR结果，返回匹配列表（最新的结果在前）
+
+        3个字符及以上使用trigram索引，2个字符使用两字索引，单个字符退回到逐行子串匹配（较慢）。
+        """
+        query = (query or "").strip()
+        conn = self.connect()
+        if not query or not self.search_enabled:
+            return []
+        
+        kind_filter = ""
+        params = []
+        if kinds:
+            kind_filter = f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            params = list(kinds)
+        
+        if len(query) >= 3:
+            # trigram分词按3个字符建立索引，中日韩文本不需要额外分词；整个查询作为短语匹配。
+            # 按rowid倒序（最新的结果在前）可以直接读取索引，避免对所有匹配计算相关度后再排序
+            sql = f"""SELECT kind, source, ref, timestamp, start_seconds,
+                      snippet(search_index, 0, '【', '】', '…', 24) AS snippet
+                      FROM search_index WHERE search_index MATCH ?{kind_filter} ORDER BY rowid DESC LIMIT ?"""
+            params = ['"' + query.replace('"', '""') + '"'] + params
+        elif len(query) == 2:
+            # 两个字符（如常见的中文词语）通过两字索引查找
+            # 从两字索引按文档ID倒序读取，再逐条按rowid取内容，达到LIMIT即停止
+            sql = f"""SELECT kind, source, ref, timestamp, start_seconds, content AS snippet
+                      FROM search_bigrams CROSS JOIN search_index ON search_index.rowid = search_bigrams.doc
+                      WHERE bigram = ?{kind_filter} ORDER BY doc DESC LIMIT ?"""
+            params = [query.lower()] + params
+        else:
+            # 单个字符时无法使用索引，退回到子串匹配
+            sql = f"""SELECT kind, source, ref, timestamp, start_seconds, content AS snippet
+                      FROM search_index WHERE content LIKE ? ESCAPE '\\'{kind_filter} LIMIT ?"""
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params = [f"%{escaped}%"] + params
+        
+        return [dict(row) for row in conn.execute(sql, params + [limit])]
+    
+    def get_watermark(self, prefix, task):
+        """返回前缀在该任务下的水位线（秒级时间戳），早于水位线的对象都已处理"""
+        row = self.connect().execute(
+            "SELECT watermark FROM prefix_watermarks WHERE prefix = ? AND task = ?", (prefix, task)
+        ).fetchone()
+        return row["watermark"] if row else 0.0
+    
+    def advance_watermark(self, prefix, task, watermark):
+        """推进水位线，水位线只会向后移动"""
+        with self.connect() as conn:
+            conn.execute(
+                """INSERT INTO prefix_watermarks (prefix, task, watermark, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(prefix, task) DO UPDATE SET watermark = MAX(watermark, excluded.watermark),
+                   updated_at = excluded.updated_at""",
+                (prefix, task, watermark, time.time())
+            )
+    
+    def manifest_etags(self, prefix, task, keys):
+        """返回清单中已处理对象的ETag"""
+        conn = self.connect()
+        etags = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            etags.update(
+                (row["key"], row["etag"]) for row in conn.execute(
+                    f"""SELECT key, etag FROM prefix_manifests
+                        WHERE prefix = ? AND task = ? AND key IN ({', '.join('?' for _ in chunk)})""",
+                    [prefix, task] + chunk
+                )
+            )
+        return etags
+    
+    def mark_processed(self, prefix, task, objects):
+        """记录处理成功的对象及其ETag"""
+        with self.connect() as conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO prefix_manifests (prefix, task, key, etag, last_modified, processed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(prefix, task, item["key"], item["etag"], item["last_modified"], time.time()) for item in objects]
+            )
+    
+    def list_transcription_jobs(self, limit=200):
+        """按时间倒序列出保存的转录任务"""
+        return [dict(row) for row in self.connect().execute(
+            """SELECT j.job_name, j.status, j.language_code, j.created_at, v.source, v.name
+               FROM transcription_jobs j LEFT JOIN videos v ON v.id = j.video_id
+               ORDER BY j.created_at DESC LIMIT ?""",
+            (limit,)
+        )]
+
+RESULTS_STORE = ResultsStore()
+
+# 增量处理时水位线向前保留的时间（秒），容忍上传耗时和时钟误差，这段时间内的对象仍按清单比较ETag
+WATERMARK_MARGIN_SECONDS = 15 * 60
+
+def list_s3_changes(s3_path, task, suffixes, s3_client=None, store=None):
+    """列出S3前缀下新增或修改过的对象（相对于该前缀和任务的处理清单）
+    
+    早于水位线的对象都已处理过，直接跳过；其余对象与清单中的ETag比较，只返回新增或ETag变化的对象。
+    返回的变更集在处理完成后传给commit_s3_changes，更新清单和水位线。
+    """
+    store = store or RESULTS_STORE
+    s3_client = s3_client or boto3.client('s3')
+    bucket, prefix = parse_s3_path(s3_path)
+    # 清单按规范化的前缀保存，s3://b/p 和 s3://b/p/ 共用同一个水位线
+    prefix_uri = f"s3://{bucket}/{prefix.strip('/') + '/' if prefix.strip('/') else ''}"
+    watermark = store.get_watermark(prefix_uri, task)
+    
+    candidates = []
+    listed = 0
+    max_last_modified = watermark
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            key = item['Key']
+            if not key.lower().endswith(suffixes) or is_thumbnail_key(key):
+                continue
+            listed += 1
+            last_modified = item['LastModified'].timestamp()
+            max_last_modified = max(max_last_modified, last_modified)
+            if last_modified > watermark:
+                candidates.append({"key": key, "etag": item.get('ETag', ''), "last_modified": last_modified})
+    
+    processed_etags = store.manifest_etags(prefix_uri, task, [item["key"] for item in candidates])
+    changed = [item for item in candidates if processed_etags.get(item["key"]) != item["etag"]]
+    
+    return {
+        "bucket": bucket,
+        "prefix": prefix_uri,
+        "task": task,
+        "changed": changed,
+        "max_last_modified": max_last_modified,
+        "stats": {
+            "listed": listed,
+            "skipped_by_watermark": listed - len(candidates),
+            "unchanged": len(candidates) - len(changed),
+            "changed": len(changed)
+        }
+    }
+
+def commit_s3_changes(change_set, processed_keys, store=None):
+    """将处理成功的对象写入清单，并在所有更早的对象都处理完后推进水位线"""
+    store = store or RESULTS_STORE
+    processed_keys = set(processed_keys)
+    store.mark_processed(change_set["prefix"], change_set["task"],
+                         [item for item in change_set["changed"] if item["key"] in processed_keys])
+    
+    # 水位线不能越过仍未处理成功的对象，否则下次运行会漏掉它们
+    pending = [item["last_modified"] for item in change_set["changed"] if item["key"] not in processed_keys]
+    limit = min(pending) if pending else change_set["max_last_modified"]
+    store.advance_watermark(change_set["prefix"], change_set["task"], limit - WATERMARK_MARGIN_SECONDS)
+
+def list_s3_videos(s3_path):
+    """列出S3路径下的所有视频文件并返回用于展示的格式"""
+    try:
+        if not s3_path:
+            return [], []
+            
+        # 处理s3://前缀
+        if s3_path.startswith('s3://'):
+            s3_path = s3_path[5:]  # 移除's3://'前缀
+            
+        # 解析bucket和prefix
+        parts = s3_path.strip('/').split('/', 1)
+        bucket = parts[0]
+        prefix = parts[1] if len(parts) > 1 else ""
+        
+        # 创建S3客户端
+        s3_client = boto3.client('s3')
+        
+        # 列出对象
+        response = s3_client.list_objects_v2(
+            Bucket=bucket,
+            Prefix=prefix
+        )
+        
+        # 筛选视频文件并生成预览URL
+        video_list = []
+        metadata_list = []
+        
+        for item in response.get('Contents', []):
+            if item['Key'].lower().endswith(('.mp4', '.mov', '.avi', '.mkv', '.wmv')):
+                # 生成预签名URL，有效期更长以支持视频播放
+                url = s3_client.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': bucket, 'Key': item['Key']},
+                    ExpiresIn=86400  # 24小时
+                )
+                video_list.append(url)
+                metadata_list.append({
+                    "key": item['Key'],
+                    "name": item['Key'].split('/')[-1],
+                    "size": item['Size']
+                })
+        
+        return [video_list, metadata_list]  # 返回视频URL列表和元数据列表
+    
+    except Exception as e:
+        print(f"S3视频列表错误: {str(e)}")
+        return [[f"错误: {str(e)}"], [{"key": "error"}]]
+
+# 缩略图配置：本地缩略图保存在帧目录的thumbs子目录中，
+# S3缩略图保存在帧目录的同级目录 <帧目录>_thumbs/ 中
+THUMBNAIL_WIDTH = 240
+THUMBNAIL_DIRNAME = "thumbs"
+THUMBNAIL_PREFIX_SUFFIX = "_thumbs"
+
+def thumbnail_path(frame_path):
+    """返回本地帧对应的缩略图路径"""
+    return os.path.join(os.path.dirname(frame_path), THUMBNAIL_DIRNAME, os.path.basename(frame_path))
+
+def save_frame_thumbnail(frame_path, frame):
+    """为本地帧生成缩略图，frame为BGR图像数组"""
+    thumb_path = thumbnail_path(frame_path)
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    height, width = frame.shape[:2]
+    if width > THUMBNAIL_WIDTH:
+        frame = cv2.resize(frame, (THUMBNAIL_WIDTH, max(1, int(height * THUMBNAIL_WIDTH / width))),
+                           interpolation=cv2.INTER_AREA)
+    cv2.imwrite(thumb_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
+    return thumb_path
+
+def gallery_thumbnails(frame_paths):
+    """返回用于Gallery展示的缩略图路径，没有缩略图时使用原图"""
+    thumbs = []
+    for frame_path in frame_paths or []:
+        thumb_path = thumbnail_path(frame_path)
+        thumbs.append(thumb_path if os.path.exists(thumb_path) else frame_path)
+    return thumbs
+
+def thumbnail_key(key):
+    """返回S3图片对应的缩略图Key（位于同级的 <目录>_thumbs/ 前缀下）"""
+    folder, _, name = key.rpartition('/')
+    return f"{folder}{THUMBNAIL_PREFIX_SUFFIX}/{name}"
+
+def is_thumbnail_key(key):
+    """判断S3 Key是否位于缩略图前缀下"""
+    return any(part.endswith(THUMBNAIL_PREFIX_SUFFIX) for part in key.split('/')[:-1])
+
+def list_s3_images(s3_path):
+    """列出S3路径下的所有图片并返回用于Gallery展示的格式"""
+    try:
+        if not s3_path:
+            return [], []
+            
+        # 处理s3://前缀
+        if s3_path.startswith('s3://'):
+            s3_path = s3_path[5:]  # 移除's3://'前缀
+            
+        # 解析bucket和prefix
+        parts = s3_path.strip('/').split('/', 1)
+        bucket = parts[0]
+        prefix = parts[1] if len(parts) > 1 else ""
+        
+        # 创建S3客户端
+        s3_client = boto3.client('s3')
+        
+        # 列出对象
+        response = s3_client.list_objects_v2(
+            Bucket=bucket,
+            Prefix=prefix
+        )
+        
+        # 筛选图片文件，缩略图单独记录，打包上传的帧归档按索引展开
+        image_keys = []
+        bundle_keys = []
+        existing_keys = set()
+        for item in response.get('Contents', []):
+            existing_keys.add(item['Key'])
+            if item['Key'].lower().endswith(('.png', '.jpg', '.jpeg')) and not is_thumbnail_key(item['Key']):
+                image_keys.append(item['Key'])
+            elif item['Key'].endswith(tuple(name + S3_BUNDLE_INDEX_SUFFIX for name in S3_BUNDLE_ARCHIVE_NAMES)):
+                bundle_keys.append(item['Key'][:-len(S3_BUNDLE_INDEX_SUFFIX)])
+        
+        # 缩略图前缀不在本次列表范围内时，单独列出对应的缩略图目录
+        thumb_prefixes = {thumbnail_key(key).rpartition('/')[0] + '/' for key in image_keys}
+        listed_prefixes = {key.rpartition('/')[0] + '/' for key in existing_keys}
+        for thumb_prefix in thumb_prefixes:
+            if thumb_prefix not in listed_prefixes:
+                thumb_response = s3_client.list_objects_v2(Bucket=bucket, Prefix=thumb_prefix)
+                existing_keys.update(item['Key'] for item in thumb_response.get('Contents', []))
+        
+        # 生成预览URL，Gallery优先使用缩略图，选中时再加载原图
+        image_list = []
+        metadata_list = []
+        
+        for key in image_keys:
+            thumb_key = thumbnail_key(key)
+            # 生成预签名URL
+            url = s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': bucket, 'Key': thumb_key if thumb_key in existing_keys else key},
+                ExpiresIn=3600
+            )
+            image_list.append(url)
+            metadata_list.append({"key": key})
+        
+        # 打包上传的帧：缩略图包只下载一次，Gallery使用本地缓存的缩略图
+        for archive_key in bundle_keys:
+            for local_path, frame_key in list_s3_bundle_frames(bucket, archive_key):
+                image_list.append(local_path)
+                metadata_list.append({"key": frame_key})
+        
+        return [image_list, metadata_list]  # 返回图片URL列表和元数据列表
+    
+    except Exception as e:
+        print(f"S3列表错误: {str(e)}")
+        return [[f"错误: {str(e)}"], [{"key": "error"}]]
+
+class S3ByteCache:
+    """S3对象字节的本地LRU缓存，按(bucket, key, 字节范围)缓存ETag和内容，并使用条件GET校验是否过期"""
+    
+    def __init__(self, max_bytes=256 * 1024 * 1024, revalidate_after=30, prefetch_workers=4):
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after  # 距上次校验不超过该秒数时直接使用缓存
+        self.entries = OrderedDict()  # (bucket, key, byte_range) -> {"etag", "data", "validated_at"}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers)
+        self.s3_client = None
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0}
+    
+    def _client(self):
+        if self.s3_client is None:
+            self.s3_client = boto3.client('s3')
+        return self.s3_client
+    
+    def _store(self, cache_key, etag, data):
+        with self.lock:
+            old = self.entries.pop(cache_key, None)
+            if old:
+                self.total_bytes -= len(old["data"])
+            if len(data) > self.max_bytes:
+                return
+            self.entries[cache_key] = {"etag": etag, "data": data, "validated_at": time.time()}
+            self.total_bytes += len(data)
+            # 超出容量时淘汰最久未使用的对象
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted["data"])
+    
+    def get(self, bucket, key, byte_range=None):
+        """返回对象字节，byte_range为(起始偏移, 长度)时只读取对象的这一部分；缓存命中时不重新下载"""
+        cache_key = (bucket, key, byte_range)
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry:
+                self.entries.move_to_end(cache_key)
+        
+        if entry and time.time() - entry["validated_at"] < self.revalidate_after:
+            self.stats["hits"] += 1
+            return entry["data"]
+        
+        s3_client = self._client()
+        params = {"Bucket": bucket, "Key": key}
+        if byte_range is not None:
+            params["Range"] = f"bytes={byte_range[0]}-{byte_range[0] + byte_range[1] - 1}"
+        if entry:
+            # 条件GET：ETag未变化时S3返回304，不传输对象内容
+            try:
+                response = s3_client.get_object(IfNoneMatch=entry["etag"], **params)
+            except botocore_exceptions.ClientError as e:
+                if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304:
+                    entry["validated_at"] = time.time()
+                    self.stats["revalidated"] += 1
+                    return entry["data"]
+                raise
+        else:
+            response = s3_client.get_object(**params)
+        
+        self.stats["misses"] += 1
+        data = response['Body'].read()
+        self._store(cache_key, response.get('ETag', ''), data)
+        return data
+    
+    def prefetch(self, bucket, keys):
+        """在后台预取对象，跳过已缓存的对象；keys中的元素可以是Key或(Key, 字节范围)"""
+        for key in keys:
+            key, byte_range = key if isinstance(key, tuple) else (key, None)
+            with self.lock:
+                cached = (bucket, key, byte_range) in self.entries
+            if not cached:
+                self.prefetch_pool.submit(self._prefetch_one, bucket, key, byte_range)
+    
+    def _prefetch_one(self, bucket, key, byte_range=None):
+        try:
+            self.get(bucket, key, byte_range)
+        except Exception as e:
+            print(f"预取图片错误 ({key}): {str(e)}")
+
+# 进程内共享的S3图片缓存
+S3_BYTE_CACHE = S3ByteCache()
+
+# 打包上传的帧：一次上传只有帧归档、缩略图包和索引三个对象，
+# 归档中的单帧用"<归档Key>#<帧文件名>"表示，通过索引中的字节范围读取
+S3_BUNDLE_ARCHIVE_NAME = "frames.jpgs"
+# 早期打包上传的完整帧归档，索引中的偏移同样指向JPEG字节，仍可浏览
+S3_BUNDLE_ARCHIVE_NAMES = (S3_BUNDLE_ARCHIVE_NAME, "frames.vfa")
+S3_BUNDLE_THUMBS_NAME = "thumbs.bin"
+S3_BUNDLE_INDEX_SUFFIX = ".index.json"
+S3_BUNDLE_FRAME_SEPARATOR = "#"
+
+def load_s3_bundle_index(bucket, archive_key):
+    """读取打包上传的帧索引，返回 {"frames": {帧文件名: 条目}, ...}"""
+    index = json.loads(S3_BYTE_CACHE.get(bucket, archive_key + S3_BUNDLE_INDEX_SUFFIX))
+    index["frames"] = {entry["name"]: entry for entry in index["frames"]}
+    return index
+
+def resolve_s3_frame(bucket, key):
+    """将图片Key解析为(对象Key, 字节范围)，普通图片的字节范围为None"""
+    archive_key, separator, name = key.partition(S3_BUNDLE_FRAME_SEPARATOR)
+    if not separator:
+        return key, None
+    entry = load_s3_bundle_index(bucket, archive_key)["frames"][name]
+    return archive_key, (entry["offset"], entry["length"])
+
+def read_s3_frame(bucket, key):
+    """读取S3上的一张图片，打包上传的帧通过范围GET只读取该帧的字节"""
+    return S3_BYTE_CACHE.get(bucket, *resolve_s3_frame(bucket, key))
+
+def is_safe_frame_name(name):
+    """帧名称是否为单纯的文件名，归档和索引来自其他机器或S3，名称中不能包含路径"""
+    return (isinstance(name, str) and name not in ("", ".", "..") and "\\" not in name
+            and not os.path.isabs(name) and os.path.basename(name) == name)
+
+def list_s3_bundle_frames(bucket, archive_key):
+    """列出打包上传的帧，缩略图包一次下载后缓存到本地，返回[(本地缩略图路径, 帧Key)]"""
+    index = json.loads(S3_BYTE_CACHE.get(bucket, archive_key + S3_BUNDLE_INDEX_SUFFIX))
+    unsafe = [entry["name"] for entry in index["frames"] if not is_safe_frame_name(entry["name"])]
+    if unsafe:
+        raise ValueError(f"帧索引中包含无效的帧名称: {unsafe[0]}")
+    thumbs_key = f"{archive_key.rpartition('/')[0]}/{index['thumbs']}" if index.get("thumbs") else None
+    thumbs = S3_BYTE_CACHE.get(bucket, thumbs_key) if thumbs_key else b""
+    
+    cache_dir = os.path.join(tempfile.gettempdir(), "s3_bundle_thumbs",
+                             hashlib.md5(f"{bucket}/{archive_key}/{index.get('created_at', '')}".encode()).hexdigest())
+    os.makedirs(cache_dir, exist_ok=True)
+    frames = []
+    for entry in index["frames"]:
+        frame_key = f"{archive_key}{S3_BUNDLE_FRAME_SEPARATOR}{entry['name']}"
+        local_path = os.path.join(cache_dir, entry["name"])
+        if not os.path.exists(local_path):
+            if "thumb_offset" in entry:
+                data = thumbs[entry["thumb_offset"]:entry["thumb_offset"] + entry["thumb_length"]]
+            else:
+                # 没有缩略图时通过范围GET读取原图
+                data = read_s3_frame(bucket, frame_key)
+            with open(local_path, "wb") as f:
+                f.write(data)
+        frames.append((local_path, frame_key))
+    return frames
+
+def upload_frame_bundle(frame_paths, bucket, folder_prefix, s3_client=None):
+    """将帧的JPEG字节依次拼接为一个对象上传，同时上传缩略图包和索引，返回 {帧路径: 帧Key}
+
+    只上传编码后的字节，不包含帧归档中的原始像素段；索引最后上传，
+    列出时看到索引就说明帧对象和缩略图包已经上传完成。
+    """
+    s3_client = s3_client or boto3.client('s3')
+    work_dir = tempfile.mkdtemp()
+    bundle_path = os.path.join(work_dir, S3_BUNDLE_ARCHIVE_NAME)
+    archive_key = f"{folder_prefix}{S3_BUNDLE_ARCHIVE_NAME}"
+    tags = load_frame_tags(frame_paths)
+    
+    entries = []
+    paths_by_name = {}
+    thumbs_path = os.path.join(work_dir, S3_BUNDLE_THUMBS_NAME)
+    with open(bundle_path, "wb") as bundle, open(thumbs_path, "wb") as thumbs:
+        for path in frame_paths:
+            name = os.path.basename(path)
+            try:
+                encoded = read_frame_bytes(path)
+            except OSError as e:
+                print(f"读取帧错误: {str(e)}")
+                continue
+            entry = {
+                "name": name,
+                "timestamp": tags.get(path, {}).get("timestamp"),
+                "offset": bundle.tell(),
+                "length": len(encoded)
+            }
+            bundle.write(encoded)
+            thumb_path = thumbnail_path(path)
+            if os.path.exists(thumb_path):
+                with open(thumb_path, "rb") as f:
+                    data = f.read()
+                entry.update(thumb_offset=thumbs.tell(), thumb_length=len(data))
+                thumbs.write(data)
+            entries.append(entry)
+            paths_by_name[name] = path
+    
+    s3_client.upload_file(Filename=bundle_path, Bucket=bucket, Key=archive_key)
+    has_thumbs = os.path.getsize(thumbs_path) > 0
+    if has_thumbs:
+        s3_client.upload_file(Filename=thumbs_path, Bucket=bucket, Key=f"{folder_prefix}{S3_BUNDLE_THUMBS_NAME}")
+    index = {
+        "version": 2,
+        "archive": S3_BUNDLE_ARCHIVE_NAME,
+        "thumbs": S3_BUNDLE_THUMBS_NAME if has_thumbs else None,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "frames": entries
+    }
+    s3_client.put_object(Bucket=bucket, Key=archive_key + S3_BUNDLE_INDEX_SUFFIX,
+                         Body=json.dumps(index, ensure_ascii=False).encode("utf-8"),
+                         ContentType="application/json")
+    return {
+        paths_by_name[entry["name"]]: f"{archive_key}{S3_BUNDLE_FRAME_SEPARATOR}{entry['name']}" for entry in entries
+    }
+
+def upload_frames_to_s3(s3_path, frame_paths, bundle=False):
+    """将提取的帧上传到S3，bundle为True时打包为一个帧归档上传"""
+    if not frame_paths or len(frame_paths) == 0:
+        return "没有可上传的帧，请先提取视频帧", None
+        
+    if not s3_path:
+        return "请提供有效的S3路径", None
+        
+    try:
+        # 处理s3://前缀
+        if s3_path.startswith('s3://'):
+            s3_path = s3_path[5:]  # 移除's3://'前缀
+            
+        # 解析bucket和prefix
+        parts = s3_path.strip('/').split('/', 1)
+        if len(parts) < 2:
+            return f"无效的S3路径: {s3_path}，格式应为 s3://bucket-name/path/", None
+            
+        bucket = parts[0]
+        prefix = parts[1]
+        
+        # 确保prefix以/结尾
+        if not prefix.endswith('/'):
+            prefix += '/'
+            
+        # 创建S3客户端
+        s3_client = boto3.client('s3')
+        
+        # 创建时间戳文件夹
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        folder_prefix = f"{prefix}{timestamp}/"
+        
+        # 并发上传文件，boto3客户端可以在线程间共享
+        existing_paths = [frame_path for frame_path in frame_paths if os.path.exists(frame_path)]
+        
+        if bundle:
+            # 打包上传：无论多少帧都只有拼接的JPEG对象、缩略图包和索引三个对象
+            frame_keys = upload_frame_bundle(existing_paths, bucket, folder_prefix, s3_client)
+            RESULTS_STORE.set_frame_s3_uris({
+                frame_path: f"s3://{bucket}/{frame_key}" for frame_path, frame_key in frame_keys.items()
+            })
+            full_s3_path = f"s3://{bucket}/{folder_prefix}"
+            return f"成功打包上传 {len(frame_keys)} 帧到 {full_s3_path}{S3_BUNDLE_ARCHIVE_NAME}", full_s3_path
+        
+        def upload_one(frame_path):
+            file_name = os.path.basename(frame_path)
+            s3_key = f"{folder_prefix}{file_name}"
+            s3_client.upload_file(
+                Filename=frame_path,
+                Bucket=bucket,
+                Key=s3_key
+            )
+            # 同时上传缩略图，供Gallery预览使用
+            if os.path.exists(thumbnail_path(frame_path)):
+                s3_client.upload_file(
+                    Filename=thumbnail_path(frame_path),
+                    Bucket=bucket,
+                    Key=thumbnail_key(s3_key)
+                )
+        
+        with ThreadPoolExecutor(max_workers=S3_TRANSFER_WORKERS) as executor:
+            list(executor.map(upload_one, existing_paths))
+        success_count = len(existing_paths)
+        RESULTS_STORE.set_frame_s3_uris({
+            frame_path: f"s3://{bucket}/{folder_prefix}{os.path.basename(frame_path)}"
+            for frame_path in existing_paths
+        })
+        
+        # 返回上传结果和完整的S3路径
+        full_s3_path = f"s3://{bucket}/{folder_prefix}"
+        return f"成功上传 {success_count} 帧到 {full_s3_path}", full_s3_path
+        
+    except Exception as e:
+        print(f"上传到S3时出错: {str(e)}")
+        return f"上传失败: {str(e)}", None
+
+def select_image(evt, s3_path):
+    """处理图片选择事件，加载选中的图片"""
+    try:
+        if not evt or not s3_path:
+            return None
+            
+        # 从事件中获取选中的图片Key
+        image_key = evt
+        
+        # 处理s3://前缀
+        if s3_path.startswith('s3://'):
+            s3_path = s3_path[5:]  # 移除's3://'前缀
+            
+        # 解析bucket和key
+        parts = s3_path.strip('/').split('/', 1)
+        bucket = parts[0]
+        
+        # 通过本地缓存下载图片，重复选择时无需重新下载；打包上传的帧只读取该帧的字节范围
+        image_data = read_s3_frame(bucket, image_key)
+        
+        # 转换为PIL图像
+        image = Image.open(io.BytesIO(image_data))
+        
+        return image
+        
+    except Exception as e:
+        print(f"选择图片错误: {str(e)}")
+        return None
+
+# 图像编码的默认配置（保持与原来一致的无损PNG）
+DEFAULT_IMAGE_ENCODING = {
+    "max_dimension": 0,      # 最长边上限，0表示不缩放
+    "grayscale": False,      # 是否转换为灰度图
+    "image_format": "PNG",   # PNG / JPEG / WEBP
+    "quality": 85            # JPEG/WEBP质量
+}
+
+# 用于比较的候选编码配置
+IMAGE_ENCODING_PRESETS = {
+    "PNG 原图": {"max_dimension": 0, "grayscale": False, "image_format": "PNG", "quality": 85},
+    "PNG 灰度": {"max_dimension": 0, "grayscale": True, "image_format": "PNG", "quality": 85},
+    "JPEG 85": {"max_dimension": 0, "grayscale": False, "image_format": "JPEG", "quality": 85},
+    "JPEG 70 灰度": {"max_dimension": 0, "grayscale": True, "image_format": "JPEG", "quality": 70},
+    "WEBP 80": {"max_dimension": 0, "grayscale": False, "image_format": "WEBP", "quality": 80},
+    "JPEG 75 最长边800": {"max_dimension": 800, "grayscale": False, "image_format": "JPEG", "quality": 75},
+    "WEBP 60 灰度 最长边600": {"max_dimension": 600, "grayscale": True, "image_format": "WEBP", "quality": 60}
+}
+
+def estimate_image_tokens(width, height):
+    """估算图片占用的输入token数（按Bedrock文档的 宽×高/750 近似计算）"""
+    # Claude会把最长边超过1568像素的图片缩小，这里同样按缩小后的尺寸估算
+    longest = max(width, height)
+    if longest > 1568:
+        ratio = 1568 / longest
+        width, height = int(width * ratio), int(height * ratio)
+    return max(1, int(width * height / 750))
+
+def encode_image_for_bedrock(image, max_dimension=0, grayscale=False, image_format="PNG", quality=85, original_bytes=None):
+    """按编码配置处理图像，返回(图像字节, 格式名, 宽, 高)"""
+    image_format = (image_format or "PNG").upper()
+    if image_format == "JPG":
+        image_format = "JPEG"
+    if image_format not in ("PNG", "JPEG", "WEBP"):
+        raise ValueError(f"不支持的图像格式: {image_format}")
+    
+    max_dimension = int(max_dimension or 0)
+    needs_resize = max_dimension > 0 and max(image.size) > max_dimension
+    needs_gray = grayscale and image.mode not in ("L", "LA")
+    
+    # 如果原始字节已经满足要求，直接复用，避免重新编码
+    if original_bytes is None and getattr(image, "filename", None) and os.path.exists(image.filename):
+        with open(image.filename, "rb") as f:
+            original_bytes = f.read()
+    if original_bytes is not None and not needs_resize and not needs_gray and image.format == image_format:
+        return original_bytes, image_format.lower(), image.size[0], image.size[1]
+    
+    # 缩放到最长边不超过max_dimension
+    if needs_resize:
+        ratio = max_dimension / max(image.size)
+        new_size = (max(1, int(image.size[0] * ratio)), max(1, int(image.size[1] * ratio)))
+        image = image.resize(new_size, Image.LANCZOS)
+    
+    if grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        # 如果是RGBA格式(带透明度的PNG)或调色板图像，则转换为RGB
+        image = image.convert("RGB")
+    
+    buffered = io.BytesIO()
+    if image_format == "PNG":
+        image.save(buffered, format="PNG", optimize=True)
+    else:
+        image.save(buffered, format=image_format, quality=int(quality))
+    
+    return buffered.getvalue(), image_format.lower(), image.size[0], image.size[1]
+
+def build_bedrock_request_body(model_name, image_bytes, image_format, system_prompt, full_user_prompt):
+    """根据模型类型构建Claude或Nova的invoke_model请求体"""
+    image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+    
+    if "Claude" in model_name:
+        # Claude模型使用invoke_model API，这是已知可用的方法
+        return {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 1000,
+            "system": system_prompt,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": full_user_prompt
+                        },
+                        {
+                            "type": "image",
+                            "source": {
+                                "type": "base64",
+                                "media_type": f"image/{image_format}",
+                                "data": image_base64
+                            }
+                        }
+                    ]
+                }
+            ]
+        }
+    
+    # Nova模型直接处理图像，但使用不同的请求结构
+    # 根据用户提供的示例构建请求
+    # 系统消息
+    system_list = [
+        {
+            "text": system_prompt
+        }
+    ]
+    
+    # 用户消息，先放图像再放文本
+    message_list = [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "image": {
+                        "format": image_format,
+                        "source": {
+                            "bytes": image_base64
+                        }
+                    }
+                },
+                {
+                    "text": full_user_prompt
+                }
+            ]
+        }
+    ]
+    
+    # 推理配置
+    inf_params = {
+        "maxTokens": 1000,
+        "temperature": 0.1,
+        "topP": 0.9,
+        "topK": 50
+    }
+    
+    # 构建完整请求
+    return {
+        "schemaVersion": "messages-v1",
+        "messages": message_list,
+        "system": system_list,
+        "inferenceConfig": inf_params
+    }
+
+def parse_bedrock_response(model_name, response_body):
+    """解析Claude或Nova的响应，返回(文本, 用量信息)"""
+    if "Claude" in model_name:
+        usage = response_body.get('usage', {})
+        return response_body['content'][0]['text'], {
+            "input_tokens": usage.get('input_tokens', 0),
+            "output_tokens": usage.get('output_tokens', 0)
+        }
+    
+    usage = response_body.get('usage', {})
+    usage_info = {
+        "input_tokens": usage.get('inputTokens', 0),
+        "output_tokens": usage.get('outputTokens', 0)
+    }
+    
+    # 从响应中提取文本
+    if 'output' in response_body and 'message' in response_body['output'] and 'content' in response_body['output']['message']:
+        content = response_body['output']['message']['content']
+        if isinstance(content, list) and len(content) > 0 and 'text' in content[0]:
+            return content[0]['text'], usage_info
+    
+    # 如果无法找到预期的结构，返回完整响应
+    return f"完整Nova响应: {json.dumps(response_body)}", usage_info
+
+def prepare_bedrock_ocr_request(image_bytes, image_format, model_name, language, system_prompt, user_prompt):
+    """构建OCR请求并打印调试信息，返回(模型ID, 请求体)"""
+    # 获取模型ID
+    model_id = get_model_id(model_name)
+    
+    # 准备提示词
+    language_name = get_language_name(language)
+    # 将语言信息添加到用户提示中
+    full_user_prompt = f"{user_prompt}\n语言: {language_name}"
+    
+    request_body = build_bedrock_request_body(model_name, image_bytes, image_format, system_prompt, full_user_prompt)
+    
+    if "Claude" in model_name:
+        print(f"使用Claude模型: {model_id}")
+    else:
+        print(f"使用Nova模型: {model_id}")
+        # 打印调试信息，但不包含图像数据
+        debug_request = dict(request_body)
+        debug_request["messages"] = [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "image": {
+                            "format": image_format,
+                            "source": {"bytes": "[图像数据已省略]"}
+                        }
+                    },
+                    {
+                        "text": full_user_prompt
+                    }
+                ]
+            }
+        ]
+        print(f"Nova请求结构(不含图像数据): {json.dumps(debug_request)}")
+    
+    return model_id, request_body
+
+# 各模型的按需价格（美元/千Token：输入, 输出），用于估算每帧的识别成本
+MODEL_PRICING = {
+    "Claude 3 Opus": (0.015, 0.075),
+    "Claude 3 Sonnet": (0.003, 0.015),
+    "Claude 3.5 Haiku": (0.0008, 0.004),
+    "Claude 3.5 Sonnet v1": (0.003, 0.015),
+    "Claude 3.5 Sonnet v2": (0.003, 0.015),
+    "Claude 3.7 Sonnet": (0.003, 0.015),
+    "Nova Lite": (0.00006, 0.00024),
+    "Nova Pro": (0.0008, 0.0032)
+}
+
+# 级联模式：先用便宜快速的模型识别，结果校验不通过时再升级到更强的模型
+OCR_CASCADE_MODELS = ["Nova Lite", "Claude 3.5 Haiku", "Claude 3.7 Sonnet"]
+CASCADE_MODEL_NAME = "级联模式 (" + " → ".join(OCR_CASCADE_MODELS) + ")"
+
+# 各语言字幕应使用的文字（Unicode字符名称中的文字名）
+LANGUAGE_SCRIPTS = {
+    "SA": ("ARABIC",),
+    "JP": ("HIRAGANA", "KATAKANA", "CJK"),
+    "KR": ("HANGUL",),
+    "FR": ("LATIN",),
+    "IT": ("LATIN",),
+    "DE": ("LATIN",),
+    "UA": ("CYRILLIC",),
+    "TR": ("LATIN",)
+}
+
+def estimate_ocr_cost(model_name, usage):
+    """根据Token用量估算一次调用的成本（美元）"""
+    input_price, output_price = MODEL_PRICING.get(model_name, (0.0, 0.0))
+    return (usage.get("input_tokens", 0) * input_price + usage.get("output_tokens", 0) * output_price) / 1000
+
+def script_matches_language(text, language, min_ratio=0.6):
+    """检查文本中的字母是否主要属于该语言使用的文字"""
+    scripts = LANGUAGE_SCRIPTS.get(language)
+    letters = [ch for ch in text if ch.isalpha()]
+    if not scripts or not letters:
+        return bool(letters)
+    matched = sum(1 for ch in letters if unicodedata.name(ch, "").startswith(scripts))
+    return matched / len(letters) >= min_ratio
+
+def validate_ocr_output(ocr_result, language):
+    """校验模型输出：能解析为JSON、原文不为空、原文的文字与所选语言一致，返回(是否通过, 原因)"""
+    data = parse_ocr_json(ocr_result)
+    if data is None:
+        return False, "输出不是有效的JSON"
+    original = data.get("原文") or data.get("original") or data.get("text") or ""
+    original = " ".join(original) if isinstance(original, list) else str(original).strip()
+    if not original:
+        return False, "原文为空"
+    if not script_matches_language(original, language):
+        return False, f"原文的文字与{get_language_name(language)}不符"
+    return True, ""
+
+def cascade_bedrock_ocr(image_bytes, image_format, language, system_prompt, user_prompt, item_ref=None, models=None):
+    """按级联顺序调用模型，输出校验通过即返回，否则升级到下一个模型
+
+    返回(文本, 用量信息)，用量信息汇总所有尝试的Token、成本和耗时，并记录最终模型和升级次数。
+    """
+    models = models or OCR_CASCADE_MODELS
+    start_time = time.time()
+    attempts = []
+    text = ""
+    for position, model_name in enumerate(models):
+        is_last = position == len(models) - 1
+        try:
+            # 只有最后一个模型失败时帧才算最终失败，前面的模型失败后会升级，不记入死信列表
+            text, usage = invoke_bedrock_ocr(image_bytes, image_format, model_name, language, system_prompt, user_prompt,
+                                             item_ref=item_ref if is_last else None)
+        except Exception as e:
+            if is_last:
+                raise
+            attempts.append({"model": model_name, "ok": False, "reason": f"调用失败: {str(e)}", "usage": {}})
+            continue
+        
+        ok, reason = validate_ocr_output(text, language)
+        attempts.append({"model": model_name, "ok": ok, "reason": reason, "usage": usage})
+        if ok:
+            break
+        if not is_last:
+            print(f"级联识别: {model_name} 的结果未通过校验（{reason}），升级到 {models[position + 1]}")
+    
+    return text, {
+        "input_tokens": sum(item["usage"].get("input_tokens", 0) for item in attempts),
+        "output_tokens": sum(item["usage"].get("output_tokens", 0) for item in attempts),
+        "model": attempts[-1]["model"],
+        "cost": sum(item["usage"].get("cost", 0.0) for item in attempts),
+        "latency": time.time() - start_time,
+        "escalations": len(attempts) - 1,
+        "validated": attempts[-1]["ok"]
+    }
+
+def summarize_ocr_usage(results):
+    """汇总一批识别结果的用量：升级率、每帧平均耗时和成本、各最终模型的帧数"""
+    usages = [item["usage"] for item in results if item.get("usage")]
+    if not usages:
+        return ""
+    
+    count = len(usages)
+    escalated = sum(1 for usage in usages if usage.get("escalations"))
+    total_cost = sum(usage.get("cost", 0.0) for usage in usages)
+    average_latency = sum(usage.get("latency", 0.0) for usage in usages) / count
+    final_models = {}
+    for usage in usages:
+        final_models[usage.get("model", "")] = final_models.get(usage.get("model", ""), 0) + 1
+    
+    summary = f"每帧平均耗时 {average_latency:.2f} 秒，平均成本 ${total_cost / count:.5f}，总成本 ${total_cost:.4f}"
+    if any("escalations" in usage for usage in usages):
+        summary += f"\n级联升级率: {escalated / count:.1%}，最终模型: " + "，".join(
+            f"{model} {frames} 帧" for model, frames in final_models.items()
+        )
+    return summary
+
+class OcrRunBudget:
+    """一次识别运行的Token和成本预算，按帧、视频和整个运行汇总用量
+
+    达到上限后，pause模式下不再发起新的调用，提高预算后可以继续处理剩余的帧；stop模式下直接结束。
+    """
+    
+    def __init__(self, max_cost=0.0, max_tokens=0, on_limit="pause"):
+        self.max_cost = float(max_cost or 0)
+        self.max_tokens = int(max_tokens or 0)
+        self.on_limit = on_limit
+        self.status = "running"
+        self.totals = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0}
+        self.per_video = {}
+        self.per_frame = {}
+        self.lock = threading.Lock()
+    
+    def exceeded(self):
+        tokens = self.totals["input_tokens"] + self.totals["output_tokens"]
+        return (self.max_cost > 0 and self.totals["cost"] >= self.max_cost) or \
+               (self.max_tokens > 0 and tokens >= self.max_tokens)
+    
+    def allow(self):
+        """是否还可以发起新的调用"""
+        with self.lock:
+            return self.status == "running"
+    
+    def charge(self, usage, frame=None, video=None):
+        """记录一次调用的用量，超出预算时暂停或停止后续调用"""
+        with self.lock:
+            for target in [self.totals] + \
+                          ([self.per_video.setdefault(video, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0})]
+                           if video else []) + \
+                          ([self.per_frame.setdefault(frame, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0})]
+                           if frame else []):
+                target["calls"] += 1
+                target["input_tokens"] += usage.get("input_tokens", 0)
+                target["output_tokens"] += usage.get("output_tokens", 0)
+                target["cost"] += usage.get("cost", 0.0)
+            if self.status == "running" and self.exceeded():
+                self.status = "paused" if self.on_limit == "pause" else "stopped"
+                print(f"识别预算已用完（{self.summary_unlocked()}），状态: {self.status}")
+    
+    def raise_limits(self, extra_cost=0.0, extra_tokens=0):
+        """提高预算并继续已暂停的运行"""
+        with self.lock:
+            if self.status != "paused":
+                return False
+            if self.max_cost > 0:
+                self.max_cost += float(extra_cost or 0)
+            if self.max_tokens > 0:
+                self.max_tokens += int(extra_tokens or 0)
+            if not self.exceeded():
+                self.status = "running"
+            return self.status == "running"
+    
+    def summary_unlocked(self):
+        limit = []
+        if self.max_cost > 0:
+            limit.append(f"成本上限 ${self.max_cost:.4f}")
+        if self.max_tokens > 0:
+            limit.append(f"Token上限 {self.max_tokens}")
+        return (f"调用 {self.totals['calls']} 次，输入Token {self.totals['input_tokens']}，"
+                f"输出Token {self.totals['output_tokens']}，成本 ${self.totals['cost']:.4f}"
+                + (f"（{'，'.join(limit)}）" if limit else ""))
+    
+    def summary(self):
+        with self.lock:
+            return self.summary_unlocked()
+
+# 已暂停的识别运行，按运行ID保存预算和剩余的帧，供"继续"操作使用；
+# 超过OCR_RUN_TTL_SECONDS仍未继续的运行会被清理，释放其中保存的帧列表和结果表格
+OCR_RUNS = {}
+OCR_RUN_TTL_SECONDS = 6 * 3600
+
+def prune_ocr_runs(now=None):
+    """清理暂停时间超过OCR_RUN_TTL_SECONDS的识别运行"""
+    now = now or time.time()
+    for run_id, run in list(OCR_RUNS.items()):
+        if now - run.get("paused_at", now) > OCR_RUN_TTL_SECONDS:
+            OCR_RUNS.pop(run_id, None)
+
+def register_ocr_run(run_id, run):
+    """登记已暂停的识别运行，同时清理过期的运行"""
+    prune_ocr_runs()
+    OCR_RUNS[run_id] = {**run, "paused_at": time.time()}
+
+def get_ocr_run(run_id):
+    """返回未过期的已暂停运行，不存在或已过期时返回None"""
+    prune_ocr_runs()
+    return OCR_RUNS.get(run_id)
+
+# Bedrock按模型的每分钟请求数上限，用于令牌桶限速，请根据账户在Service Quotas中的实际配额调整
+BEDROCK_MODEL_RPM = {
+    "Claude 3 Opus": 50,
+    "Claude 3 Sonnet": 100,
+    "Claude 3.5 Haiku": 200,
+    "Claude 3.5 Sonnet v1": 100,
+    "Claude 3.5 Sonnet v2": 100,
+    "Claude 3.7 Sonnet": 100,
+    "Nova Lite": 200,
+    "Nova Pro": 100
+}
+BEDROCK_DEFAULT_RPM = 100
+
+# 可以重试的Bedrock错误：限流、超时和服务暂时不可用
+BEDROCK_RETRYABLE_ERRORS = (
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    "InternalServerException"
+)
+
+# 可能只在某个区域出现的错误：该区域未开通模型或没有权限、模型在该区域不存在。
+# 这类错误计入区域的健康状况，并在其他区域重试一次
+BEDROCK_REGION_ERRORS = (
+    "AccessDeniedException",
+    "ResourceNotFoundException"
+)
+# ValidationException通常是请求本身的问题（图片过大或损坏、提示词或token数超限），不计入区域健康状况；
+# 只有模型在该区域不可用时返回的这类消息才按区域错误处理
+BEDROCK_REGION_VALIDATION_MESSAGES = (
+    "model identifier is invalid",
+)
+
+class TokenBucket:
+    """令牌桶限速：按固定速率补充令牌，允许一定的突发请求"""
+    
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, rate_per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """取出一个令牌，令牌不足时等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class BedrockLimiter:
+    """单个区域的自适应限流器
+
+    - AIMD并发控制：调用成功时并发上限缓慢增加，遇到限流时按比例降低，最终稳定在该区域的实际配额附近
+    - 每个模型一个令牌桶，控制请求速率（配额按区域计算，每个区域各自限速）
+    """
+    
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=32, decrease_factor=0.7, decrease_interval=2.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        # 同一批并发请求同时被限流时只降低一次
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self.last_decrease = 0.0
+        # 上次被限流时的并发上限，接近该值时放慢增加速度，减少反复试探配额造成的限流
+        self.ceiling = None
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.buckets = {}
+        self.stats = {"calls": 0, "throttled": 0, "errors": 0}
+    
+    def bucket(self, model_name):
+        with self.condition:
+            if model_name not in self.buckets:
+                self.buckets[model_name] = TokenBucket(BEDROCK_MODEL_RPM.get(model_name, BEDROCK_DEFAULT_RPM))
+            return self.buckets[model_name]
+    
+    def headroom(self):
+        """当前还能发起的并发请求数，用于在区域之间分配流量"""
+        return self.limit - self.in_flight
+    
+    def try_acquire(self):
+        """有空闲并发名额时占用一个并返回True，否则立即返回False"""
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            self.stats["calls"] += 1
+            return True
+    
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            self.stats["calls"] += 1
+    
+    def release(self, throttled=False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.stats["throttled"] += 1
+                now = time.monotonic()
+                if now - self.last_decrease >= self.decrease_interval:
+                    self.ceiling = self.limit
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self.last_decrease = now
+            else:
+                # 加性增加：大约每完成"当前并发上限"个请求，上限加1；接近上次限流时的上限后放慢到十分之一
+                step = 1 / self.limit
+                if self.ceiling is not None and self.limit >= self.ceiling * 0.9:
+                    step /= 10
+                self.limit = min(self.max_limit, self.limit + step)
+            self.condition.notify_all()
+    
+    def record_error(self):
+        with self.condition:
+            self.stats["errors"] += 1
+    
+    @staticmethod
+    def error_code(error):
+        """ClientError的错误码；流式响应中途出错（EventStreamError）时错误码为小写开头（如throttlingException），统一为首字母大写"""
+        if not isinstance(error, botocore_exceptions.ClientError):
+            return None
+        code = error.response.get("Error", {}).get("Code") or ""
+        return code[:1].upper() + code[1:]
+    
+    @staticmethod
+    def is_retryable(error):
+        if isinstance(error, botocore_exceptions.ClientError):
+            return BedrockLimiter.error_code(error) in BEDROCK_RETRYABLE_ERRORS
+        return isinstance(error, (botocore_exceptions.ReadTimeoutError, botocore_exceptions.ConnectTimeoutError,
+                                  botocore_exceptions.EndpointConnectionError))
+    
+    @staticmethod
+    def is_region_error(error):
+        code = BedrockLimiter.error_code(error)
+        if code == "ValidationException":
+            message = error.response.get("Error", {}).get("Message", "").lower()
+            return any(text in message for text in BEDROCK_REGION_VALIDATION_MESSAGES)
+        return code in BEDROCK_REGION_ERRORS
+    
+    @staticmethod
+    def is_throttle(error):
+        return BedrockLimiter.error_code(error) in ("ThrottlingException", "TooManyRequestsException")
+
+class BedrockRegionPool:
+    """所有Bedrock调用共享的多区域调度器
+
+    - 每个区域一个BedrockLimiter，配额按区域计算，总吞吐随配置的区域数增加
+    - 每次调用选择剩余并发额度最多的可用区域；被限流的区域并发上限降低，流量随之转移到其他区域
+    - 限流和超时错误按带随机抖动的指数退避重试，有其他可用区域时换到其他区域并缩短等待
+    - 连续出现连接错误或服务错误的区域暂停使用一段时间
+    - 带item_ref（帧路径或S3 Key）的请求多次重试后仍失败时记入死信列表，每个帧只保留最近一次失败，最多保留max_dead_letters条
+    """
+    
+    def __init__(self, regions, client_factory=None, max_attempts=6, base_delay=0.5, max_delay=20.0,
+                 unhealthy_after=3, cooldown=30.0, max_dead_letters=1000, **limiter_options):
+        self.regions = list(regions)
+        # client_factory(region)返回该区域的bedrock-runtime客户端，测试时可以换成本地替身
+        self.client_factory = client_factory
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.unhealthy_after = unhealthy_after
+        self.cooldown = cooldown
+        self.limiters = {region: BedrockLimiter(**limiter_options) for region in self.regions}
+        self.health = {region: {"errors": 0, "disabled_until": 0.0, "throttled_at": 0.0} for region in self.regions}
+        self.lock = threading.Lock()
+        self.max_dead_letters = max_dead_letters
+        self.dead_letters = OrderedDict()  # item_ref -> 最近一次失败的记录
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "failed": 0}
+    
+    def client(self, region):
+        return (self.client_factory or get_bedrock_runtime)(region)
+    
+    def available_regions(self, now):
+        return [region for region in self.regions if self.health[region]["disabled_until"] <= now]
+    
+    def recently_throttled(self, region, now):
+        return now - self.health[region]["throttled_at"] < self.limiters[region].decrease_interval
+    
+    def pick(self, avoid=None):
+        """选择本次调用使用的区域，并占用该区域的一个并发名额
+
+        优先选择最近没有被限流、还有剩余并发额度的区域，在这些区域中按剩余额度占并发上限的比例均匀分配；
+        没有这样的区域时选择剩余额度最多的区域（持续被限流的区域并发上限很低，很少被选中）。
+        名额在调度锁内占用，同时到达的调用不会都挤到同一个区域排队。
+        """
+        def score(region):
+            limiter = self.limiters[region]
+            ready = limiter.headroom() >= 1 and not self.recently_throttled(region, now)
+            return ready, limiter.headroom() / limiter.limit if ready else limiter.headroom(), random.random()
+        
+        now = time.monotonic()
+        with self.lock:
+            available = self.available_regions(now)
+            candidates = [region for region in available if region != avoid] or available
+            if not candidates:
+                # 所有区域都暂停使用时，选择最早恢复的区域
+                candidates = [min(self.regions, key=lambda region: self.health[region]["disabled_until"])]
+            ranked = sorted(candidates, key=score, reverse=True)
+            for region in ranked:
+                if self.limiters[region].try_acquire():
+                    return region
+            region = ranked[0]
+        
+        # 所有候选区域都没有空闲名额时，在最合适的区域等待（不持有调度锁）
+        self.limiters[region].acquire()
+        return region
+    
+    def has_alternative(self, region):
+        """除region外是否还有可用且最近没有被限流的区域"""
+        now = time.monotonic()
+        with self.lock:
+            return any(
+                other != region and not self.recently_throttled(other, now) for other in self.available_regions(now)
+            )
+    
+    def record_result(self, region, error=None, throttled=False):
+        with self.lock:
+            health = self.health[region]
+            if error is None:
+                health["errors"] = 0
+            elif throttled:
+                health["throttled_at"] = time.monotonic()
+            else:
+                self.limiters[region].record_error()
+                health["errors"] += 1
+                if health["errors"] >= self.unhealthy_after:
+                    health["disabled_until"] = time.monotonic() + self.cooldown
+                    health["errors"] = 0
+                    print(f"Bedrock区域 {region} 连续出错，暂停使用 {self.cooldown:.0f} 秒")
+    
+    def count(self, name):
+        """调用统计在多个线程中更新，在调度锁内累加"""
+        with self.lock:
+            self.stats[name] += 1
+    
+    def call(self, fn, model_name, item_ref=None):
+        """在限流器控制下调用fn(client)，可重试的错误自动退避重试，最终失败时记入死信列表并抛出异常"""
+        return self._call(fn, model_name, item_ref)[0]
+    
+    def call_stream(self, fn, model_name, item_ref=None):
+        """fn(client)返回流式响应，逐个产出流中的事件
+
+        只对建立连接的请求重试；读完整个流（或调用方停止读取）之前一直占用该区域的并发名额，
+        AIMD按实际进行中的请求数调整并发上限。读取途中出现的限流和连接错误同样计入区域健康状况，
+        已经输出的内容无法撤回，因此不再重试。
+        """
+        response, region = self._call(fn, model_name, item_ref, hold=True)
+        limiter = self.limiters[region]
+        throttled = False
+        try:
+            for event in response['body']:
+                yield event
+            self.record_result(region)
+        except Exception as e:
+            throttled = limiter.is_throttle(e)
+            if throttled:
+                self.count("throttled")
+            if throttled or limiter.is_retryable(e) or limiter.is_region_error(e):
+                self.record_result(region, e, throttled)
+            self.count("failed")
+            if item_ref:
+                self.add_dead_letter(item_ref, self.dead_letter_entry(item_ref, model_name, region, e, 1))
+            raise
+        finally:
+            limiter.release(throttled)
+    
+    def _call(self, fn, model_name, item_ref=None, hold=False):
+        """执行带重试的调用，返回(结果, 区域)；hold为True时成功后不释放并发名额，也不记录成功，由调用方处理"""
+        region = None
+        region_retried = False
+        for attempt in range(1, self.max_attempts + 1):
+            region = self.pick(avoid=region)
+            limiter = self.limiters[region]
+            limiter.bucket(model_name).acquire()
+            throttled = False
+            succeeded = False
+            try:
+                self.count("calls")
+                result = fn(self.client(region))
+                if not hold:
+                    self.record_result(region)
+                succeeded = True
+                return result, region
+            except Exception as e:
+                throttled = limiter.is_throttle(e)
+                if throttled:
+                    self.count("throttled")
+                retryable = limiter.is_retryable(e)
+                region_error = limiter.is_region_error(e)
+                if retryable or region_error:
+                    self.record_result(region, e, throttled)
+                # 区域相关的错误（如该区域未开通模型）在其他区域重试一次
+                retry_elsewhere = region_error and not region_retried and self.has_alternative(region)
+                region_retried = region_retried or retry_elsewhere
+                if not (retryable or retry_elsewhere) or attempt == self.max_attempts:
+                    self.count("failed")
+                    if item_ref:
+                        self.add_dead_letter(item_ref, self.dead_letter_entry(item_ref, model_name, region, e, attempt))
+                    raise
+                error = e
+            finally:
+                if not (hold and succeeded):
+                    limiter.release(throttled)
+            
+            # 带完全随机抖动的指数退避，避免多个请求同时重试；换到其他区域重试时只需短暂等待
+            if self.has_alternative(region):
+                delay = random.uniform(0, self.base_delay)
+            else:
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+            self.count("retries")
+            print(f"Bedrock调用失败（{region}），{delay:.1f} 秒后第 {attempt} 次重试: {str(error)}")
+            time.sleep(delay)
+    
+    @staticmethod
+    def dead_letter_entry(item_ref, model_name, region, error, attempts):
+        return {
+            "item": item_ref,
+            "model": model_name,
+            "region": region,
+            "error": str(error),
+            "attempts": attempts,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    def add_dead_letter(self, item_ref, entry):
+        """记录最终失败的帧，同一帧只保留最近一次失败，超出上限时丢弃最早的记录"""
+        with self.lock:
+            self.dead_letters.pop(item_ref, None)
+            self.dead_letters[item_ref] = entry
+            while len(self.dead_letters) > self.max_dead_letters:
+                self.dead_letters.popitem(last=False)
+    
+    def pop_dead_letters(self, items):
+        """取出指定帧的死信记录（用于重新处理），返回取出的记录"""
+        with self.lock:
+            return [self.dead_letters.pop(item) for item in dict.fromkeys(items) if item in self.dead_letters]
+    
+    def status(self):
+        """返回各区域的当前状态，便于在界面上展示"""
+        now = time.monotonic()
+        lines = [f"Bedrock调用: {self.stats['calls']}，限流: {self.stats['throttled']}，重试: {self.stats['retries']}，"
+                 f"失败: {self.stats['failed']}，死信: {len(self.dead_letters)}"]
+        for region in self.regions:
+            limiter = self.limiters[region]
+            line = (f"{region}: 并发上限 {limiter.limit:.1f}，进行中 {limiter.in_flight}，调用 {limiter.stats['calls']}，"
+                    f"限流 {limiter.stats['throttled']}，出错 {limiter.stats['errors']}")
+            if self.health[region]["disabled_until"] > now:
+                line += f"，暂停使用（{self.health[region]['disabled_until'] - now:.0f} 秒后恢复）"
+            lines.append(line)
+        return "\n".join(lines)
+
+# Bedrock调用使用的区域，逗号分隔；us.开头的跨区域推理配置文件可在us-east-1、us-east-2、us-west-2之间分配
+BEDROCK_REGIONS = [region.strip() for region in os.environ.get("BEDROCK_REGIONS", "us-west-2").split(",") if region.strip()]
+# 按区域覆盖bedrock-runtime的终端节点（格式: 区域=URL,区域=URL），用于接入本地替身服务进行测试
+BEDROCK_ENDPOINT_URLS = dict(
+    item.strip().split("=", 1) for item in os.environ.get("BEDROCK_ENDPOINT_URLS", "").split(",") if "=" in item
+)
+
+BEDROCK_LIMITER = BedrockRegionPool(BEDROCK_REGIONS)
+
+# Bedrock运行时客户端在线程间共享；关闭boto3自带的重试，由限流器统一处理限流
+_bedrock_runtime_clients = {}
+_bedrock_runtime_lock = threading.Lock()
+
+def get_bedrock_runtime(region_name=BEDROCK_REGIONS[0]):
+    from botocore.config import Config
+    
+    with _bedrock_runtime_lock:
+        if region_name not in _bedrock_runtime_clients:
+            _bedrock_runtime_clients[region_name] = boto3.client(
+                service_name='bedrock-runtime',
+                region_name=region_name,
+                endpoint_url=BEDROCK_ENDPOINT_URLS.get(region_name),
+                config=Config(retries={"max_attempts": 1, "mode": "standard"}, max_pool_connections=64)
+            )
+        return _bedrock_runtime_clients[region_name]
+
+def invoke_bedrock_ocr(image_bytes, image_format, model_name, language, system_prompt, user_prompt, item_ref=None):
+    """将编码后的图像发送给Bedrock模型，返回(文本, 用量信息)
+
+    调用经过共享的限流器，item_ref（帧路径或S3 Key）用于在最终失败时记入死信列表。
+    """
+    if model_name == CASCADE_MODEL_NAME:
+        return cascade_bedrock_ocr(image_bytes, image_format, language, system_prompt, user_prompt, item_ref=item_ref)
+    
+    start_time = time.time()
+    model_id, request_body = prepare_bedrock_ocr_request(
+        image_bytes, image_format, model_name, language, system_prompt, user_prompt
+    )
+    
+    # 发送请求，由限流器在配置的区域之间分配
+    response = BEDROCK_LIMITER.call(
+        lambda bedrock_runtime: bedrock_runtime.invoke_model(modelId=model_id, body=json.dumps(request_body)),
+        model_name,
+        item_ref
+    )
+    
+    # 解析响应
+    response_body = json.loads(response['body'].read())
+    if "Claude" not in model_name:
+        print(f"Nova响应结构: {json.dumps(response_body)}")
+    
+    text, usage = parse_bedrock_response(model_name, response_body)
+    usage.update(model=model_name, cost=estimate_ocr_cost(model_name, usage), latency=time.time() - start_time)
+    return text, usage
+
+def parse_bedrock_stream_event(model_name, event):
+    """解析流式响应中的一个事件，返回(增量文本, 用量信息或None)"""
+    if "Claude" in model_name:
+        event_type = event.get("type")
+        if event_type == "content_block_delta":
+            return event.get("delta", {}).get("text", ""), None
+        if event_type == "message_start":
+            usage = event.get("message", {}).get("usage", {})
+            return "", {"input_tokens": usage.get("input_tokens", 0)}
+        if event_type == "message_delta":
+            return "", {"output_tokens": event.get("usage", {}).get("output_tokens", 0)}
+        return "", None
+    
+    if "contentBlockDelta" in event:
+        return event["contentBlockDelta"].get("delta", {}).get("text", ""), None
+    if "metadata" in event:
+        usage = event["metadata"].get("usage", {})
+        return "", {"input_tokens": usage.get("inputTokens", 0), "output_tokens": usage.get("outputTokens", 0)}
+    return "", None
+
+def stream_bedrock_ocr(image_bytes, image_format, model_name, language, system_prompt, user_prompt):
+    """使用流式接口调用Bedrock模型，逐段产出(增量文本, 用量信息)"""
+    if model_name == CASCADE_MODEL_NAME:
+        # 级联模式需要校验完整输出后才能决定是否升级，一次性产出最终结果
+        yield cascade_bedrock_ocr(image_bytes, image_format, language, system_prompt, user_prompt)
+        return
+    
+    model_id, request_body = prepare_bedrock_ocr_request(
+        image_bytes, image_format, model_name, language, system_prompt, user_prompt
+    )
+    
+    # 只对建立流式连接的请求重试，开始输出后不再重试；读取流期间一直占用并发名额
+    for stream_event in BEDROCK_LIMITER.call_stream(
+        lambda bedrock_runtime: bedrock_runtime.invoke_model_with_response_stream(
+            modelId=model_id, body=json.dumps(request_body)
+        ),
+        model_name
+    ):
+        chunk = stream_event.get('chunk')
+        if not chunk:
+            continue
+        text, usage = parse_bedrock_stream_event(model_name, json.loads(chunk['bytes']))
+        if text or usage:
+            yield text, usage
+
+def extract_text_stream(image, model_name, language, system_prompt, user_prompt,
+                        max_dimension=0, grayscale=False, image_format="PNG", quality=85, errors=None):
+    """使用流式接口提取图像中的文字，逐步产出(当前文本, 耗时信息)
+
+    传入errors列表时，识别失败的错误信息会追加到其中，调用方据此判断是否失败，而不是检查文本内容。
+    """
+    if image is None:
+        yield "请先选择一个图片", ""
+        return
+    
+    start_time = time.time()
+    first_token_time = None
+    text = ""
+    usage = {}
+    
+    try:
+        # 按配置编码图像
+        image_bytes, encoded_format, encoded_width, encoded_height = encode_image_for_bedrock(
+            image, max_dimension, grayscale, image_format, quality
+        )
+        print(f"图像编码: {encoded_format}, {encoded_width}x{encoded_height}, {len(image_bytes)} 字节")
+        
+        for delta, delta_usage in stream_bedrock_ocr(
+            image_bytes, encoded_format, model_name, language, system_prompt, user_prompt
+        ):
+            if delta_usage:
+                usage.update(delta_usage)
+            if delta:
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                text += delta
+                yield text, f"首个Token耗时: {first_token_time:.2f} 秒（生成中...）"
+        
+        total_time = time.time() - start_time
+        timing = f"首个Token耗时: {first_token_time or total_time:.2f} 秒，总耗时: {total_time:.2f} 秒"
+        if usage:
+            timing += f"，输入Token: {usage.get('input_tokens', 0)}，输出Token: {usage.get('output_tokens', 0)}"
+        if "escalations" in usage:
+            timing += f"\n级联模式: 最终模型 {usage['model']}，升级 {usage['escalations']} 次，成本 ${usage['cost']:.5f}"
+        yield text, timing
+    
+    except Exception as e:
+        error_prefix = "错误" if "Claude" in model_name else "Nova API错误"
+        print(f"流式调用错误: {str(e)}")
+        if errors is not None:
+            errors.append(f"{error_prefix}: {str(e)}")
+        yield (f"{text}\n\n" if text else "") + f"{error_prefix}: {str(e)}", f"总耗时: {time.time() - start_time:.2f} 秒"
+
+def extract_text(image, model_name, language, system_prompt, user_prompt,
+                 max_dimension=0, grayscale=False, image_format="PNG", quality=85, errors=None):
+    """使用Bedrock提取图像中的文字，传入errors列表时识别失败的错误信息会追加到其中"""
+    try:
+        if image is None:
+            return "请先选择一个图片"
+        
+        # 按配置编码图像
+        image_bytes, encoded_format, encoded_width, encoded_height = encode_image_for_bedrock(
+            image, max_dimension, grayscale, image_format, quality
+        )
+        print(f"图像编码: {encoded_format}, {encoded_width}x{encoded_height}, {len(image_bytes)} 字节")
+        
+        if "Claude" in model_name:
+            text, usage = invoke_bedrock_ocr(image_bytes, encoded_format, model_name, language, system_prompt, user_prompt)
+            return text
+        
+        try:
+            text, usage = invoke_bedrock_ocr(image_bytes, encoded_format, model_name, language, system_prompt, user_prompt)
+            return text
+        except Exception as nova_error:
+            error_message = f"Nova API错误: {str(nova_error)}"
+            print(f"Nova调用错误: {str(nova_error)}")
+            if errors is not None:
+                errors.append(error_message)
+            return error_message
+        
+    except Exception as e:
+        if errors is not None:
+            errors.append(f"错误: {str(e)}")
+        return f"错误: {str(e)}"
+
+def compare_image_encodings(image, model_name=None, language=None, system_prompt=None, user_prompt=None, run_ocr=False):
+    """比较不同编码配置的请求体大小和输入token数，可选地实际调用模型检查识别结果"""
+    if image is None:
+        return []
+    
+    rows = []
+    for preset_name, options in IMAGE_ENCODING_PRESETS.items():
+        try:
+            image_bytes, encoded_format, encoded_width, encoded_height = encode_image_for_bedrock(image, **options)
+            base64_size = len(base64.b64encode(image_bytes))
+            input_tokens = estimate_image_tokens(encoded_width, encoded_height)
+            text = ""
+            
+            if run_ocr and model_name:
+                # 实际调用模型，使用响应中的真实token数
+                text, usage = invoke_bedrock_ocr(image_bytes, encoded_format, model_name, language, system_prompt, user_prompt)
+                input_tokens = usage.get("input_tokens") or input_tokens
+            
+            rows.append([
+                preset_name,
+                encoded_format,
+                f"{encoded_width}x{encoded_height}",
+                len(image_bytes),
+                base64_size,
+                input_tokens,
+                text
+            ])
+        except Exception as e:
+            print(f"编码比较错误 ({preset_name}): {str(e)}")
+            rows.append([preset_name, "", "", 0, 0, 0, f"错误: {str(e)}"])
+    
+    return rows
+
+# Bedrock批量推理任务的终态
+BATCH_JOB_FINAL_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+
+def build_batch_manifest(frame_items, model_name, language, system_prompt, user_prompt,
+                         max_dimension=0, grayscale=False, image_format="PNG", quality=85):
+    """将帧列表构建成Bedrock批量推理的JSONL清单，返回(JSONL文本, recordId到帧Key的映射)"""
+    language_name = get_language_name(language)
+    full_user_prompt = f"{user_prompt}\n语言: {language_name}"
+    
+    lines = []
+    record_map = {}
+    for index, (frame_key, image) in enumerate(frame_items):
+        image_bytes, encoded_format, _, _ = encode_image_for_bedrock(
+            image, max_dimension, grayscale, image_format, quality
+        )
+        # recordId使用与Bedrock自动生成相同的11位数字格式
+        record_id = f"{index:011d}"
+        record_map[record_id] = frame_key
+        lines.append(json.dumps({
+            "recordId": record_id,
+            "modelInput": build_bedrock_request_body(
+                model_name, image_bytes, encoded_format, system_prompt, full_user_prompt
+            )
+        }))
+    
+    return "\n".join(lines) + "\n", record_map
+
+def submit_batch_ocr_job(frame_items, batch_s3_path, role_arn, model_name, language, system_prompt, user_prompt,
+                         s3_client=None, bedrock_client=None, change_set=None, **encoding_options):
+    """写入JSONL清单到S3并提交Bedrock批量推理任务
+
+    增量处理时传入list_s3_changes返回的变更集，任务完成后据此更新处理清单和水位线。
+    """
+    try:
+        if not frame_items:
+            return {"status": "ERROR", "message": "没有可处理的帧"}
+        if not role_arn:
+            return {"status": "ERROR", "message": "请提供Bedrock批量推理服务角色ARN"}
+        if model_name == CASCADE_MODEL_NAME:
+            return {"status": "ERROR", "message": "批量推理不支持级联模式，请选择单个模型"}
+        
+        bucket, prefix = parse_s3_path(batch_s3_path)
+        if not bucket:
+            return {"status": "ERROR", "message": f"无效的S3路径: {batch_s3_path}"}
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        
+        s3_client = s3_client or boto3.client('s3')
+        bedrock_client = bedrock_client or boto3.client('bedrock', region_name=BEDROCK_REGIONS[0])
+        
+        job_name = f"ocr-batch-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        manifest, record_map = build_batch_manifest(
+            frame_items, model_name, language, system_prompt, user_prompt, **encoding_options
+        )
+        
+        input_key = f"{prefix}input/{job_name}.jsonl"
+        record_map_key = f"{prefix}input/{job_name}.records.json"
+        output_prefix = f"{prefix}output/"
+        
+        s3_client.put_object(Bucket=bucket, Key=input_key, Body=manifest.encode("utf-8"))
+        # 保存recordId到帧Key的映射，任务完成后用于关联结果
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=record_map_key,
+            Body=json.dumps({"model_name": model_name, "language": language, "records": record_map, "change_set": change_set},
+                            ensure_ascii=False).encode("utf-8")
+        )
+        
+        response = bedrock_client.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=role_arn,
+            modelId=get_model_id(model_name),
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{bucket}/{input_key}"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"s3://{bucket}/{output_prefix}"}}
+        )
+        
+        print(f"已提交批量推理任务: {response['jobArn']}, 共 {len(record_map)} 条记录")
+        return {
+            "status": "STARTED",
+            "job_arn": response["jobArn"],
+            "job_name": job_name,
+            "record_count": len(record_map),
+            "message": f"已提交批量推理任务 {job_name}，共 {len(record_map)} 帧\n清单: s3://{bucket}/{input_key}"
+        }
+    
+    except Exception as e:
+        print(f"提交批量推理任务错误: {str(e)}")
+        return {"status": "ERROR", "message": f"提交批量推理任务失败: {str(e)}"}
+
+def check_batch_ocr_job(job_arn, s3_client=None, bedrock_client=None):
+    """检查批量推理任务状态，完成后读取输出记录并关联回帧Key"""
+    try:
+        if not job_arn:
+            return {"status": "ERROR", "message": "请输入有效的批量任务ARN"}
+        
+        s3_client = s3_client or boto3.client('s3')
+        bedrock_client = bedrock_client or boto3.client('bedrock', region_name=BEDROCK_REGIONS[0])
+        
+        job = bedrock_client.get_model_invocation_job(jobIdentifier=job_arn)
+        status = job["status"]
+        
+        if status not in BATCH_JOB_FINAL_STATUSES:
+            return {"status": status, "message": f"批量推理任务状态: {status}"}
+        
+        if status not in ("Completed", "PartiallyCompleted"):
+            return {"status": status, "message": f"批量推理任务结束: {status} {job.get('message', '')}".strip()}
+        
+        # 读取记录映射
+        input_bucket, input_key = parse_s3_path(job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"])
+        record_map_key = input_key[:-len(".jsonl")] + ".records.json"
+        record_info = json.loads(s3_client.get_object(Bucket=input_bucket, Key=record_map_key)["Body"].read())
+        model_name = record_info["model_name"]
+        record_map = record_info["records"]
+        
+        # 输出文件位于 <输出前缀>/<任务ID>/<输入文件名>.out
+        output_bucket, output_prefix = parse_s3_path(job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"])
+        if output_prefix and not output_prefix.endswith('/'):
+            output_prefix += '/'
+        job_id = job_arn.split('/')[-1]
+        output_key = f"{output_prefix}{job_id}/{os.path.basename(input_key)}.out"
+        output_body = s3_client.get_object(Bucket=output_bucket, Key=output_key)["Body"].read().decode("utf-8")
+        
+        results = []
+        for line in output_body.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            frame_key = record_map.get(record.get("recordId"), record.get("recordId"))
+            if "modelOutput" in record:
+                text, usage = parse_bedrock_response(model_name, record["modelOutput"])
+                results.append({"frame_key": frame_key, "text": text, "usage": usage, "error": ""})
+            else:
+                error = record.get("error", {})
+                results.append({
+                    "frame_key": frame_key,
+                    "text": "",
+                    "usage": {},
+                    "error": error.get("errorMessage", str(error)) if isinstance(error, dict) else str(error)
+                })
+        
+        results.sort(key=lambda item: str(item["frame_key"]))
+        # 重复检查同一个已完成的任务时不再重复写入结果库和处理清单
+        recorded = RESULTS_STORE.record_ocr_results(
+            [{"image_ref": str(item["frame_key"]), **item} for item in results], model_name, record_info.get("language"),
+            batch_job_arn=job_arn
+        )
+        if recorded and record_info.get("change_set"):
+            # 增量处理：只把识别成功的图片记入清单，失败的图片下次运行时会重新处理
+            commit_s3_changes(record_info["change_set"], [item["frame_key"] for item in results if not item["error"]])
+        failed = sum(1 for item in results if item["error"])
+        message = f"批量推理任务已完成: 成功 {len(results) - failed} 帧，失败 {failed} 帧"
+        if not recorded:
+            message += "（结果此前已记录到结果库）"
+        return {
+            "status": status,
+            "results": results,
+            "message": message
+        }
+    
+    except Exception as e:
+        print(f"检查批量推理任务错误: {str(e)}")
+        return {"status": "ERROR", "message": f"检查批量推理任务时出错: {str(e)}"}
+
+def transcribe_video(s3_video_path, language_code):
+    """使用AWS Transcribe服务转录S3视频中的语音"""
+    try:
+        # 创建Transcribe客户端，指定us-west-2区域
+        transcribe_client = boto3.client('transcribe', region_name='us-west-2')
+        
+        # 生成唯一的任务名称
+        job_name = f"transcribe-job-{uuid.uuid4()}"
+        
+        # 将语言代码映射到AWS Transcribe支持的格式
+        language_mapping = {
+            "SA": "ar-SA",  # 阿拉伯语
+            "JP": "ja-JP",  # 日语
+            "KR": "ko-KR",  # 韩语
+            "FR": "fr-FR",  # 法语
+            "IT": "it-IT",  # 意大利语
+            "DE": "de-DE",  # 德语
+            "UA": "uk-UA",  # 乌克兰语
+            "TR": "tr-TR"   # 土耳其语
+        }
+        
+        # 获取对应的AWS Transcribe语言代码
+        aws_language_code = language_mapping.get(language_code, "en-US")  # 默认使用英语
+        
+        # 解析S3路径
+        if s3_video_path.startswith('s3://'):
+            s3_video_path = s3_video_path[5:]  # 移除's3://'前缀
+            
+        # 获取文件扩展名
+        file_extension = s3_video_path.split('.')[-1].lower()
+        # 映射文件扩展名到媒体格式
+        media_format_mapping = {
+            'mp4': 'mp4',
+            'mov': 'mov',
+            'avi': 'avi',
+            'mkv': 'mkv',
+            'wmv': 'wmv'
+        }
+        media_format = media_format_mapping.get(file_extension, 'mp4')  # 默认使用mp4
+        
+        # 解析bucket和key
+        parts = s3_video_path.strip('/').split('/', 1)
+        bucket = parts[0]
+        key = parts[1] if len(parts) > 1 else ""
+        
+        # 启动转录任务
+        # 确保MediaFileUri是正确的S3 URI格式
+        if not s3_video_path.startswith('s3://'):
+            s3_uri = f"s3://{bucket}/{key}"
+        else:
+            s3_uri = s3_video_path
+            
+        print(f"使用S3 URI: {s3_uri}")
+        
+        # 检查bucket是否存在
+        s3_client = boto3.client('s3')
+        try:
+            s3_client.head_bucket(Bucket=bucket)
+            print(f"确认S3存储桶存在: {bucket}")
+        except Exception as bucket_error:
+            print(f"检查存储桶时出错: {str(bucket_error)}")
+            return {
+                "status": "ERROR",
+                "message": f"转录错误: 无法访问存储桶 {bucket}，请确认存储桶存在且有访问权限"
+            }
+        
+        # 配置字幕输出
+        subtitle_formats = ["srt", "vtt"]
+        
+        # 启动转录任务，包含字幕输出配置；返回错误代码，批量转录遇到配额或限流时重新排队
+        try:
+            response = transcribe_client.start_transcription_job(
+                TranscriptionJobName=job_name,
+                Media={'MediaFileUri': s3_uri},
+                MediaFormat=media_format,
+                LanguageCode=aws_language_code,
+                Subtitles={
+                    'Formats': subtitle_formats,
+                    'OutputStartIndex': 1
+                }
+            )
+        except botocore_exceptions.ClientError as e:
+            return {
+                "status": "ERROR",
+                "code": e.response.get("Error", {}).get("Code", ""),
+                "message": f"转录错误: {str(e)}"
+            }
+        
+        # 记录到本地结果库，重启后仍可查看任务；任务已经启动，记录失败不影响返回结果
+        try:
+            RESULTS_STORE.record_transcription_job(job_name, s3_uri, language_code)
+        except Exception as e:
+            print(f"记录转录任务错误: {str(e)}")
+        
+        # 返回任务名称和初始状态
+        return {
+            "status": "STARTED",
+            "job_name": job_name,
+            "message": f"已启动转录任务 {job_name}，正在处理中...\n\n任务可能需要几分钟到几小时不等，具体取决于视频长度。\n请点击'检查任务状态'按钮查看进度。"
+        }
+            
+    except Exception as e:
+        return {
+            "status": "ERROR",
+            "message": f"转录错误: {str(e)}"
+        }
+
+# Translate客户端在翻译线程间共享；boto3创建客户端不是线程安全的，只在锁内创建一次
+_translate_client = None
+_translate_client_lock = threading.Lock()
+
+def get_translate_client():
+    global _translate_client
+    
+    with _translate_client_lock:
+        if _translate_client is None:
+            _translate_client = boto3.client('translate', region_name='us-west-2')
+        return _translate_client
+
+def translate_text(text, source_language_code, translate_client=None):
+    """使用AWS Translate将文本翻译成中文，translate_client为空时使用共享客户端"""
+    try:
+        translate_client = translate_client or get_translate_client()
+        
+        # 调用翻译API
+        response = translate_client.translate_text(
+            Text=text,
+            SourceLanguageCode=source_language_code,
+            TargetLanguageCode='zh'  # 中文
+        )
+        
+        # 返回翻译结果
+        return response['TranslatedText']
+    except Exception as e:
+        print(f"翻译错误: {str(e)}")
+        return f"[翻译失败: {str(e)}]"
+
+def parse_subtitle_file(url, format_type):
+    """下载并解析字幕文件内容"""
+    try:
+        import requests
+        response = requests.get(url)
+        
+        if response.status_code == 200:
+            content = response.text
+            
+            # 根据不同格式解析内容
+            if format_type == "srt":
+                # 处理SRT格式，保留时间戳信息
+                lines = content.split('\n')
+                parsed_content = []
+                
+                # 用于存储当前字幕条目
+                current_index = None
+                current_timestamp = None
+                current_text = []
+                
+                for line in lines:
+                    line = line.strip()
+                    
+                    # 处理序号行
+                    if line.isdigit():
+                        # 如果已有内容，先保存之前的条目
+                        if current_index is not None and current_timestamp is not None and current_text:
+                            parsed_content.append({
+                                "index": current_index,
+                                "timestamp": current_timestamp,
+                                "text": " ".join(current_text)
+                            })
+                        
+                        # 开始新条目
+                        current_index = line
+                        current_timestamp = None
+                        current_text = []
+                        continue
+                    
+                    # 处理时间戳行
+                    if '-->' in line:
+                        current_timestamp = line
+                        continue
+                    
+                    # 处理文本行
+                    if line:
+                        current_text.append(line)
+                
+                # 添加最后一个条目
+                if current_index is not None and current_timestamp is not None and current_text:
+                    parsed_content.append({
+                        "index": current_index,
+                        "timestamp": current_timestamp,
+                        "text": " ".join(current_text)
+                    })
+                
+                return {
+                    "format": format_type,
+                    "raw_content": content,
+                    "parsed_content": parsed_content
+                }
+                
+            elif format_type == "vtt":
+                # 简单处理VTT格式，提取文本内容
+                lines = content.split('\n')
+                parsed_content = []
+                current_text = ""
+                
+                # 跳过VTT头部
+                start_parsing = False
+                
+                for line in lines:
+                    if not start_parsing:
+                        if line.strip() == "":
+                            start_parsing = True
+                        continue
+                    
+                    # 跳过时间戳行
+                    if '-->' in line:
+                        if current_text:
+                            parsed_content.append(current_text.strip())
+                            current_text = ""
+                        continue
+                    
+                    # 收集文本行
+                    if line.strip():
+                        current_text += line + " "
+                    elif current_text:
+                        parsed_content.append(current_text.strip())
+                        current_text = ""
+                
+                # 添加最后一段文本
+                if current_text:
+                    parsed_content.append(current_text.strip())
+                
+                return {
+                    "format": format_type,
+                    "raw_content": content,
+                    "parsed_content": parsed_content
+                }
+            
+            else:
+                # 其他格式直接返回原始内容
+                return {
+                    "format": format_type,
+                    "raw_content": content,
+                    "parsed_content": [content]
+                }
+        else:
+            return {
+                "format": format_type,
+                "error": f"下载失败: HTTP状态码 {response.status_code}"
+            }
+    
+    except Exception as e:
+        return {
+            "format": format_type,
+            "error": f"解析错误: {str(e)}"
+        }
+
+# 转录后处理时同时进行的下载和翻译请求数
+TRANSLATE_WORKERS = 8
+# AWS Translate单次请求的文本上限为10000字节，留出余量
+TRANSLATE_MAX_BYTES = 9000
+
+def split_text_for_translation(text, max_bytes=TRANSLATE_MAX_BYTES):
+    """按句子将长文本切分为不超过max_bytes字节的片段"""
+    chunks = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?。！？])\s+", text.strip()):
+        while len(sentence.encode("utf-8")) > max_bytes:
+            # 单个句子超过上限时按字节截断（不截断多字节字符）
+            head = sentence.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
+            chunks.append(head)
+            sentence = sentence[len(head):]
+        candidate = f"{current} {sentence}" if current else sentence
+        if len(candidate.encode("utf-8")) > max_bytes:
+            chunks.append(current)
+            candidate = sentence
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+def cues_cover_transcript(transcript, cues):
+    """字幕条目依次拼接后是否与完整转录文本一致（忽略空白和大小写）"""
+    normalize = lambda text: "".join(text.split()).lower()
+    return bool(cues) and normalize(transcript) == normalize("".join(item["text"] for item in cues))
+
+def text_separator(text):
+    """拼接片段翻译时使用的分隔符，与原文一致：原文以空格分词时用空格，中日文等不以空格分词时不加分隔符"""
+    return " " if re.search(r"\s", text.strip()) else ""
+
+def is_translation_failed(text):
+    return text.startswith("[翻译失败")
+
+def download_transcript_text(transcript_uri):
+    """下载Transcribe输出的转录JSON，返回转录文本"""
+    import requests
+    transcript_data = requests.get(transcript_uri).json()
+    return transcript_data['results']['transcripts'][0]['transcript']
+
+def postprocess_transcription_job(job_name, job, workers=TRANSLATE_WORKERS):
+    """以小型任务图执行已完成转录任务的后处理，逐步产出结果
+
+    - 转录JSON、SRT和VTT同时下载，转录文本下载完成后立即产出
+    - 字幕逐条并发翻译（相同的文字只翻译一次），翻译完成一批就产出一次
+    - 字幕能覆盖完整转录文本时，全文翻译直接由字幕翻译拼接；否则分段翻译，并与字幕翻译同时进行
+    """
+    source_language = job['LanguageCode'].split('-')[0]  # 提取主要语言代码，如'fr-FR'变为'fr'
+    
+    # 获取字幕文件URI，从URI中提取格式（去掉带有安全令牌的查询参数）
+    subtitle_files = {}
+    for subtitle in job.get('Subtitles', {}).get('SubtitleFileUris', []):
+        format_match = subtitle.split('?')[0].split('.')[-1]
+        if format_match in ['srt', 'vtt']:
+            subtitle_files[format_match] = subtitle
+        else:
+            print(f"不支持的字幕格式: {format_match}")
+    
+    result = {
+        "status": "COMPLETED",
+        "transcript": "",
+        "translated_transcript": "翻译中...",
+        "subtitle_files": subtitle_files,
+        "subtitle_contents": {},
+        "message": "转录任务已完成，正在处理结果...",
+        "source_language": source_language
+    }
+    
+    # 客户端在提交翻译任务前创建，所有翻译线程共用
+    translate_client = get_translate_client()
+    with ThreadPoolExecutor(max_workers=max(len(subtitle_files) + 1, workers)) as executor:
+        # 第一层：转录结果和字幕文件同时下载
+        transcript_future = executor.submit(download_transcript_text, job['Transcript']['TranscriptFileUri'])
+        subtitle_futures = {
+            executor.submit(parse_subtitle_file, url, format_type): format_type
+            for format_type, url in subtitle_files.items()
+        }
+        
+        result["transcript"] = transcript_future.result()
+        yield {**result, "message": "转录任务已完成，正在下载字幕和翻译..."}
+        
+        # 字幕不能覆盖全文时，全文分段翻译不必等待字幕下载
+        transcript_futures = None
+        if "srt" not in subtitle_files and result["transcript"]:
+            transcript_futures = [executor.submit(translate_text, chunk, source_language, translate_client)
+                                  for chunk in split_text_for_translation(result["transcript"])]
+        
+        for future in as_completed(subtitle_futures):
+            format_type = subtitle_futures[future]
+            result["subtitle_contents"][format_type] = future.result()
+            print(f"已处理 {format_type} 格式字幕")
+        
+        # 第二层：字幕逐条翻译
+        cues = [
+            item for item in result["subtitle_contents"].get("srt", {}).get("parsed_content", [])
+            if isinstance(item, dict) and "text" in item
+        ]
+        if transcript_futures is None and result["transcript"] and not cues_cover_transcript(result["transcript"], cues):
+            transcript_futures = [executor.submit(translate_text, chunk, source_language, translate_client)
+                                  for chunk in split_text_for_translation(result["transcript"])]
+        
+        cue_futures = {executor.submit(translate_text, text, source_language, translate_client): text
+                       for text in dict.fromkeys(item["text"] for item in cues)}
+        translations = {}
+        last_yield = time.time()
+        for done_count, future in enumerate(as_completed(cue_futures), start=1):
+            translations[cue_futures[future]] = future.result()
+            if time.time() - last_yield >= 0.5 or done_count == len(cue_futures):
+                for item in cues:
+                    item["translated_text"] = translations.get(item["text"], "翻译中...")
+                yield {**result, "message": f"转录任务已完成，已翻译字幕 {done_count}/{len(cue_futures)} 条..."}
+                last_yield = time.time()
+        
+        # 第三层：完整转录文本的翻译，字幕翻译全部成功时直接拼接
+        if transcript_futures is None and any(is_translation_failed(text) for text in translations.values()):
+            transcript_futures = [executor.submit(translate_text, chunk, source_language, translate_client)
+                                  for chunk in split_text_for_translation(result["transcript"])]
+        separator = text_separator(result["transcript"])
+        if transcript_futures is not None:
+            result["translated_transcript"] = separator.join(future.result() for future in transcript_futures)
+        elif cues:
+            result["translated_transcript"] = separator.join(translations[item["text"]] for item in cues)
+        else:
+            result["translated_transcript"] = ""
+    
+    result["message"] = "转录任务已完成！"
+    RESULTS_STORE.save_transcription_result(job_name, result)
+    yield result
+
+def iter_transcribe_job_status(job_name):
+    """检查AWS Transcribe任务状态，任务完成时逐步产出后处理的结果，最后一次产出的是完整结果"""
+    try:
+        # 已完成的任务直接从本地结果库读取，不再重复下载和翻译
+        stored = RESULTS_STORE.get_transcription_result(job_name)
+        if stored is not None:
+            yield stored
+            return
+        
+        # 创建Transcribe客户端，指定us-west-2区域
+        transcribe_client = boto3.client('transcribe', region_name='us-west-2')
+        
+        # 获取任务状态
+        response = transcribe_client.get_transcription_job(
+            TranscriptionJobName=job_name
+        )
+        
+        # 提取任务状态
+        job_status = response['TranscriptionJob']['TranscriptionJobStatus']
+        
+        # 根据状态返回不同的信息
+        if job_status == 'COMPLETED':
+            yield from postprocess_transcription_job(job_name, response['TranscriptionJob'])
+            
+        elif job_status == 'FAILED':
+            # 任务失败
+            failure_reason = response['TranscriptionJob'].get('FailureReason', '未知错误')
+            result = {
+                "status": "FAILED",
+                "message": f"转录任务失败: {failure_reason}"
+            }
+            RESULTS_STORE.save_transcription_result(job_name, result)
+            yield result
+            
+        else:
+            # 任务仍在进行中
+            progress = response['TranscriptionJob'].get('Progress', 0)
+            yield {
+                "status": job_status,
+                "progress": progress,
+                "message": f"转录任务状态: {job_status}, 进度: {progress}%"
+            }
+            
+    except Exception as e:
+        yield {
+            "status": "ERROR",
+            "message": f"检查任务状态时出错: {str(e)}"
+        }
+
+def check_transcribe_job_status(job_name):
+    """检查AWS Transcribe任务状态，任务完成时返回下载和翻译后的完整结果"""
+    result = None
+    for result in iter_transcribe_job_status(job_name):
+        pass
+    return result
+
+# 批量转录时同时运行的Transcribe任务数上限，需低于账户的并发任务配额
+TRANSCRIBE_CONCURRENCY_LIMIT = 10
+TRANSCRIBE_POLL_INTERVAL = 15
+# 启动任务时遇到这些错误（超出并发配额、被限流）说明需要稍后再试，任务重新排队而不是标记为失败
+TRANSCRIBE_REQUEUE_ERROR_CODES = ("LimitExceededException", "ThrottlingException")
+
+def run_batch_transcription(s3_uris, language_code, max_concurrent=TRANSCRIBE_CONCURRENCY_LIMIT,
+                            poll_interval=TRANSCRIBE_POLL_INTERVAL, transcribe_fn=None, status_fn=None):
+    """批量转录多个S3视频：在并发上限内启动任务，其余排队，完成后执行与单个任务相同的后处理
+    
+    这是一个生成器，每轮轮询后返回所有任务的当前状态列表。
+    """
+    transcribe_fn = transcribe_fn or transcribe_video
+    status_fn = status_fn or check_transcribe_job_status
+    max_concurrent = max(1, int(max_concurrent))
+    
+    jobs = [{
+        "s3_uri": uri,
+        "name": uri.split('/')[-1],
+        "job_name": "",
+        "status": "QUEUED",
+        "progress": 0,
+        "message": "排队中",
+        "result": None
+    } for uri in s3_uris]
+    pending = list(range(len(jobs)))
+    running = []
+    
+    # 已完成任务的后处理（下载结果、翻译字幕）较慢，放在线程池中并发执行
+    with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+        while pending or running:
+            # 填满空闲的并发名额
+            while pending and len(running) < max_concurrent:
+                index = pending.pop(0)
+                job = jobs[index]
+                result = transcribe_fn(job["s3_uri"], language_code)
+                if result.get("status") == "STARTED":
+                    job.update(status="IN_PROGRESS", job_name=result["job_name"], message="已启动")
+                    running.append(index)
+                elif result.get("code") in TRANSCRIBE_REQUEUE_ERROR_CODES:
+                    # 超出服务端并发配额（可能有其他任务占用）时重新排队，下一轮再尝试
+                    pending.insert(0, index)
+                    break
+                else:
+                    job.update(status="ERROR", message=result.get("message", "启动失败"))
+            
+            yield jobs
+            if not running and not pending:
+                break
+            time.sleep(poll_interval)
+            
+            statuses = list(executor.map(lambda i: status_fn(jobs[i]["job_name"]), running))
+            still_running = []
+            for index, result in zip(running, statuses):
+                job = jobs[index]
+                status = result.get("status", "UNKNOWN")
+                job["status"] = status
+                job["message"] = result.get("message", "")
+                if status == "COMPLETED":
+                    job["progress"] = 100
+                    job["result"] = result
+                elif status in ("FAILED", "ERROR"):
+                    job["result"] = result
+                else:
+                    job["progress"] = result.get("progress", job["progress"])
+                    still_running.append(index)
+            running = still_running
+    
+    yield jobs
+
+# 文字预筛选的默认阈值
+TEXT_PRESENCE_THRESHOLDS = {
+    "min_contrast": 40,           # 灰度P95-P5范围的下限
+    "min_edge_density": 0.02,     # 边缘像素比例下限
+    "max_edge_density": 0.35,     # 边缘像素比例上限（过高通常是纹理或噪声）
+    "min_components": 3           # 类似字符的连通域数量下限
+}
+
+# 帧标签文件名，保存在帧所在目录中
+FRAME_TAGS_FILENAME = "frame_tags.json"
+
+def classify_text_presence(frame, thresholds=None):
+    """基于对比度、边缘密度和连通域统计，判断裁剪区域中是否可能包含字幕文字"""
+    thresholds = {**TEXT_PRESENCE_THRESHOLDS, **(thresholds or {})}
+    
+    if isinstance(frame, str):
+        frame = cv2.imread(frame)
+    if frame is None or frame.size == 0:
+        return False, {"contrast": 0.0, "edge_density": 0.0, "components": 0}
+    
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    
+    # 统一缩放到固定高度，保证阈值与裁剪尺寸无关，同时加快计算
+    target_height = 96
+    if gray.shape[0] != target_height:
+        target_width = max(1, int(gray.shape[1] * target_height / gray.shape[0]))
+        gray = cv2.resize(gray, (target_width, target_height), interpolation=cv2.INTER_AREA)
+    
+    # 对比度：亮度分布的P95-P5范围
+    p5, p95 = np.percentile(gray, [5, 95])
+    contrast = float(p95 - p5)
+    
+    # 笔画边缘密度
+    edges = cv2.Canny(gray, 80, 160)
+    edge_density = float(np.count_nonzero(edges)) / edges.size
+    
+    # 连通域统计：分别处理亮字和暗字，统计尺寸类似字符的连通域
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    components = 0
+    for mask in (binary, cv2.bitwise_not(binary)):
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count <= 1:
+            continue
+        stats = stats[1:]
+        w, h, area = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT], stats[:, cv2.CC_STAT_AREA]
+        char_like = (
+            (h >= target_height * 0.15) & (h <= target_height * 0.9) &
+            (w <= h * 3) & (area >= 10) & (area <= w * h * 0.95)
+        )
+        components = max(components, int(np.count_nonzero(char_like)))
+    
+    stats_info = {"contrast": contrast, "edge_density": edge_density, "components": components}
+    likely_text = (
+        contrast >= thresholds["min_contrast"] and
+        thresholds["min_edge_density"] <= edge_density <= thresholds["max_edge_density"] and
+        components >= thresholds["min_components"]
+    )
+    return likely_text, stats_info
+
+def load_frame_tags(frame_paths):
+    """读取帧目录中的标签文件，返回 {帧路径: 标签信息}"""
+    tags = {}
+    for directory in {os.path.dirname(path) for path in frame_paths}:
+        tags_path = os.path.join(directory, FRAME_TAGS_FILENAME)
+        if os.path.exists(tags_path):
+            try:
+                with open(tags_path, "r", encoding="utf-8") as f:
+                    for name, tag in json.load(f).items():
+                        tags[os.path.join(directory, name)] = tag
+            except Exception as e:
+                print(f"读取帧标签错误: {str(e)}")
+    return tags
+
+def filter_text_frames(frame_paths, thresholds=None):
+    """按文字预筛选结果拆分帧列表，返回(可能有文字的帧, 可能为空的帧)"""
+    tags = load_frame_tags(frame_paths) if thresholds is None else {}
+    kept, skipped = [], []
+    for path in frame_paths:
+        likely_text = tags.get(path, {}).get("likely_text")
+        if likely_text is None:
+            likely_text, _ = classify_text_presence(path, thresholds)
+        (kept if likely_text else skipped).append(path)
+    return kept, skipped
+
+# 帧归档：同一次提取的所有裁剪帧打包为一个文件，保存在帧所在目录中
+FRAME_ARCHIVE_FILENAME = "frames.vfa"
+FRAME_ARCHIVE_MAGIC = b"VSEFRAR1"
+# 文件头: 魔数(8字节) + 索引偏移(8字节) + 索引长度(8字节)，裁剪帧数据从64字节处开始
+FRAME_ARCHIVE_HEADER_SIZE = 64
+
+def frame_hash(frame):
+    """计算帧的64位差异哈希(dHash)，相似的画面哈希的汉明距离很小"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+class FrameArchiveWriter:
+    """逐帧写入帧归档
+
+    裁剪帧按固定尺寸依次写入原始像素段（尺寸不同的帧缩放到第一帧的尺寸），
+    编码后的JPEG字节先写入临时文件，关闭时追加到像素段之后，最后写入索引并更新文件头。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(b"\0" * FRAME_ARCHIVE_HEADER_SIZE)
+        self.encoded_file = tempfile.TemporaryFile()
+        self.encoded_size = 0
+        self.shape = None
+        self.frames = []
+    
+    def append(self, name, frame, timestamp=None, encoded=None, tags=None):
+        """写入一帧，encoded为该帧编码后的字节（可选），tags为附加的帧标签"""
+        if self.shape is None:
+            self.shape = list(frame.shape)
+        elif list(frame.shape) != self.shape:
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]), interpolation=cv2.INTER_AREA)
+        self.file.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        
+        entry = {"name": name, "timestamp": timestamp, "hash": f"{frame_hash(frame):016x}", "deleted": False,
+                 "tags": tags or {}}
+        if encoded is not None:
+            self.encoded_file.write(encoded)
+            entry.update(offset=self.encoded_size, length=len(encoded))
+            self.encoded_size += len(encoded)
+        self.frames.append(entry)
+    
+    def close(self):
+        """写入编码字节段和索引，返回归档路径"""
+        encoded_offset = self.file.tell()
+        self.encoded_file.seek(0)
+        shutil.copyfileobj(self.encoded_file, self.file)
+        self.encoded_file.close()
+        index = {
+            "version": 1,
+            "shape": self.shape or [0, 0, 3],
+            "count": len(self.frames),
+            "crops_offset": FRAME_ARCHIVE_HEADER_SIZE,
+            "encoded_offset": encoded_offset,
+            "frames": self.frames
+        }
+        write_frame_archive_index(self.file, index)
+        self.file.close()
+        return self.path
+
+def write_frame_archive_index(file, index):
+    """在文件末尾写入索引并更新文件头中的索引位置"""
+    index_bytes = json.dumps(index, ensure_ascii=False).encode("utf-8")
+    index_offset = index["encoded_offset"] + sum(frame.get("length", 0) for frame in index["frames"])
+    file.seek(index_offset)
+    file.write(index_bytes)
+    file.truncate()
+    file.seek(0)
+    file.write(FRAME_ARCHIVE_MAGIC + struct.pack("<QQ", index_offset, len(index_bytes)))
+
+class FrameArchive:
+    """只读方式打开的帧归档
+
+    裁剪帧通过np.memmap映射为 (帧数, 高, 宽, 通道) 的数组，读取和批量预处理都不需要逐个打开文件；
+    删除的帧只在索引中标记（墓碑），compact时才真正移除。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(FRAME_ARCHIVE_HEADER_SIZE)
+            if header[:8] != FRAME_ARCHIVE_MAGIC:
+                raise ValueError(f"不是有效的帧归档文件: {path}")
+            index_offset, index_length = struct.unpack("<QQ", header[8:24])
+            f.seek(index_offset)
+            self.index = json.loads(f.read(index_length).decode("utf-8"))
+        
+        self.frames = self.index["frames"]
+        self.names = {frame["name"]: position for position, frame in enumerate(self.frames)}
+        self.timestamps = np.array([frame["timestamp"] if frame["timestamp"] is not None else np.nan
+                                    for frame in self.frames], dtype=np.float64)
+        self.deleted = np.array([frame["deleted"] for frame in self.frames], dtype=bool)
+        self.crops = None
+        if self.frames:
+            self.crops = np.memmap(path, dtype=np.uint8, mode="r", offset=self.index["crops_offset"],
+                                   shape=(len(self.frames), *self.index["shape"]))
+    
+    def __len__(self):
+        return len(self.frames)
+    
+    def live_positions(self):
+        """未删除帧的位置"""
+        return np.flatnonzero(~self.deleted)
+    
+    def frame(self, name):
+        """按帧文件名返回裁剪帧（BGR数组视图）"""
+        return self.crops[self.names[name]]
+    
+    def encoded(self, name):
+        """按帧文件名返回编码后的字节，没有保存编码字节时返回None"""
+        entry = self.frames[self.names[name]]
+        if "offset" not in entry:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(self.index["encoded_offset"] + entry["offset"])
+            return f.read(entry["length"])
+    
+    def signatures(self, positions=None, size=(192, 32), chunk_size=128):
+        """批量计算缩略灰度签名，返回 (帧数, 高, 宽) 的float32数组"""
+        positions = self.live_positions() if positions is None else np.asarray(positions, dtype=int)
+        signatures = np.zeros((len(positions), size[1], size[0]), dtype=np.float32)
+        for start in range(0, len(positions), chunk_size):
+            batch = self.crops[positions[start:start + chunk_size]].astype(np.float32)
+            # 整批一次完成BGR转灰度，不逐帧调用cvtColor
+            gray = batch @ np.array([0.114, 0.587, 0.299], dtype=np.float32) if batch.ndim == 4 else batch
+            for offset, image in enumerate(gray):
+                signatures[start + offset] = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return signatures
+    
+    def change_ratios(self, positions=None, pixel_threshold=40):
+        """positions中相邻帧之间变化像素的百分比，第一帧为100"""
+        signatures = self.signatures(positions)
+        if len(signatures) == 0:
+            return np.zeros(0)
+        changes = np.mean(np.abs(np.diff(signatures, axis=0)) > pixel_threshold, axis=(1, 2)) * 100
+        return np.concatenate([[100.0], changes])
+    
+    def delete(self, names):
+        """将帧标记为已删除（墓碑），只重写索引"""
+        changed = False
+        for name in names:
+            position = self.names.get(name)
+            if position is not None and not self.frames[position]["deleted"]:
+                self.frames[position]["deleted"] = True
+                self.deleted[position] = True
+                changed = True
+        if changed:
+            with open(self.path, "r+b") as f:
+                write_frame_archive_index(f, self.index)
+        return changed
+    
+    def compact(self, output_path):
+        """写出只包含未删除帧的新归档，用于保存或传输到其他机器"""
+        writer = FrameArchiveWriter(output_path)
+        for position in self.live_positions():
+            entry = self.frames[position]
+            writer.append(entry["name"], self.crops[position], entry["timestamp"], self.encoded(entry["name"]),
+                          entry["tags"])
+        return writer.close()
+
+_frame_archives = {}
+_frame_archives_lock = threading.Lock()
+
+def open_frame_archive(directory):
+    """打开目录中的帧归档，按文件修改时间缓存，目录中没有归档时返回None"""
+    path = os.path.join(directory, FRAME_ARCHIVE_FILENAME)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _frame_archives_lock:
+        cached = _frame_archives.get(path)
+        if cached is None or cached[0] != (stat.st_mtime_ns, stat.st_size):
+            try:
+                cached = ((stat.st_mtime_ns, stat.st_size), FrameArchive(path))
+            except Exception as e:
+                print(f"读取帧归档错误: {str(e)}")
+                return None
+            _frame_archives[path] = cached
+        return cached[1]
+
+def read_frame_bytes(frame_path):
+    """读取帧的编码字节，帧所在目录有归档时从归档中读取"""
+    archive = open_frame_archive(os.path.dirname(frame_path))
+    name = os.path.basename(frame_path)
+    if archive is not None and name in archive.names:
+        encoded = archive.encoded(name)
+        if encoded is not None:
+            return encoded
+    with open(frame_path, "rb") as f:
+        return f.read()
+
+def frame_signatures(frame_paths):
+    """批量计算帧的缩略灰度签名，返回 {帧路径: 签名}
+
+    帧所在目录有归档时从内存映射中批量计算，否则逐个读取图片文件。
+    """
+    signatures = {}
+    by_directory = {}
+    for path in frame_paths:
+        by_directory.setdefault(os.path.dirname(path), []).append(path)
+    for directory, paths in by_directory.items():
+        archive = open_frame_archive(directory)
+        archived = [path for path in paths if archive is not None and os.path.basename(path) in archive.names]
+        if archived:
+            batch = archive.signatures([archive.names[os.path.basename(path)] for path in archived])
+            signatures.update(zip(archived, batch))
+        for path in paths:
+            if path not in signatures:
+                signatures[path] = frame_signature(path)
+    return signatures
+
+def frame_change_ratios(frame_paths, pixel_threshold=40):
+    """frame_paths中相邻帧之间变化像素的百分比，第一帧（以及无法读取的帧之后的一帧）为100
+
+    所有帧都在同一个帧归档中时由归档批量计算，否则按帧签名逐个比较。
+    """
+    if not frame_paths:
+        return []
+    directories = {os.path.dirname(path) for path in frame_paths}
+    if len(directories) == 1:
+        archive = open_frame_archive(directories.pop())
+        if archive is not None and all(os.path.basename(path) in archive.names for path in frame_paths):
+            positions = [archive.names[os.path.basename(path)] for path in frame_paths]
+            return [float(ratio) for ratio in archive.change_ratios(positions, pixel_threshold)]
+    
+    signatures = frame_signatures(frame_paths)
+    ratios = []
+    previous = None
+    for path in frame_paths:
+        signature = signatures.get(path)
+        if previous is None or signature is None:
+            ratios.append(100.0)
+        else:
+            ratios.append(float(np.mean(np.abs(signature - previous) > pixel_threshold)) * 100)
+        previous = signature
+    return ratios
+
+def pack_frame_archive(frame_paths, output_path):
+    """将帧列表打包为一个帧归档，已在归档中的帧直接复制像素和编码字节，其余帧从图片文件读取"""
+    tags = load_frame_tags(frame_paths)
+    writer = FrameArchiveWriter(output_path)
+    for path in frame_paths:
+        name = os.path.basename(path)
+        archive = open_frame_archive(os.path.dirname(path))
+        if archive is not None and name in archive.names:
+            frame, encoded = archive.frame(name), archive.encoded(name)
+        else:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            encoded = read_frame_bytes(path)
+        tag = tags.get(path, {})
+        writer.append(name, frame, tag.get("timestamp"), encoded,
+                      {key: value for key, value in tag.items() if key != "timestamp"})
+    return writer.close()
+
+def unpack_frame_archive(archive_path, output_dir=None):
+    """将帧归档展开为帧图片、缩略图和标签文件，返回帧路径列表
+
+    用于在其他机器上恢复一次提取的结果；展开的目录中保留归档副本。
+    """
+    archive = FrameArchive(archive_path)
+    unsafe = [entry["name"] for entry in archive.frames if not is_safe_frame_name(entry["name"])]
+    if unsafe:
+        raise ValueError(f"帧归档中包含无效的帧名称: {unsafe[0]}")
+    output_dir = output_dir or tempfile.mkdtemp()
+    frame_paths = []
+    frame_tags = {}
+    for position in archive.live_positions():
+        entry = archive.frames[position]
+        frame_path = os.path.join(output_dir, entry["name"])
+        crop = np.asarray(archive.crops[position])
+        encoded = archive.encoded(entry["name"])
+        if encoded is not None:
+            with open(frame_path, "wb") as f:
+                f.write(encoded)
+        else:
+            cv2.imwrite(frame_path, crop)
+        save_frame_thumbnail(frame_path, crop)
+        frame_tags[entry["name"]] = {"timestamp": entry["timestamp"], **entry["tags"]}
+        frame_paths.append(frame_path)
+    
+    with open(os.path.join(output_dir, FRAME_TAGS_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(frame_tags, f, ensure_ascii=False)
+    archive.compact(os.path.join(output_dir, FRAME_ARCHIVE_FILENAME))
+    return frame_paths
+
+def parse_ocr_json(ocr_result):
+    """解析模型输出中的JSON对象（含```json代码块），无法解析时返回None"""
+    if not ocr_result:
+        return None
+    
+    text = ocr_result.strip()
+    if text.startswith("```"):
+        # 去掉markdown代码块标记
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end+1])
+            return data if isinstance(data, dict) else None
+        except ValueError:
+            pass
+    return None
+
+def extract_original_text(ocr_result):
+    """从模型输出中提取字幕原文，支持JSON格式（含```json代码块）和纯文本"""
+    if not ocr_result:
+        return ""
+    
+    data = parse_ocr_json(ocr_result)
+    if data is not None:
+        for key in ("原文", "original", "text"):
+            if data.get(key):
+                value = data[key]
+                return " ".join(value) if isinstance(value, list) else str(value).strip()
+    
+    text = ocr_result.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    return text
+
+def frame_signature(frame_path, size=(192, 32)):
+    """计算帧的缩略灰度签名，用于快速判断裁剪区域是否变化"""
+    image = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def text_similarity(a, b):
+    """计算两段文字的相似度（忽略空白和大小写）"""
+    a = " ".join(a.split()).lower()
+    b = " ".join(b.split()).lower()
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+def format_subtitle_timestamp(seconds, format_type="srt"):
+    """将秒数格式化为SRT(00:00:01,000)或VTT(00:00:01.000)时间戳"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    separator = "," if format_type == "srt" else "."
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+def format_subtitle_cues(cues, format_type="srt"):
+    """将字幕条目格式化为与parse_subtitle_file相同结构的SRT/VTT结果"""
+    lines = [] if format_type == "srt" else ["WEBVTT", ""]
+    parsed_content = []
+    
+    for index, cue in enumerate(cues, start=1):
+        timestamp = (f"{format_subtitle_timestamp(cue['start'], format_type)} --> "
+                     f"{format_subtitle_timestamp(cue['end'], format_type)}")
+        lines.extend([str(index), timestamp, cue["text"], ""])
+        if format_type == "srt":
+            parsed_content.append({"index": str(index), "timestamp": timestamp, "text": cue["text"]})
+        else:
+            parsed_content.append(cue["text"])
+    
+    return {
+        "format": format_type,
+        "raw_content": "\n".join(lines),
+        "parsed_content": parsed_content
+    }
+
+def build_subtitle_timeline(frame_paths, ocr_fn, change_threshold=0.5, similarity_threshold=0.8, frame_interval=None):
+    """根据带时间戳的帧生成字幕时间轴
+
+    只对裁剪区域发生变化（变化像素百分比超过change_threshold）的帧调用ocr_fn，
+    然后将连续的相同或相似文字合并为一条字幕。返回(字幕条目列表, 统计信息)。
+    """
+    tags = load_frame_tags(frame_paths)
+    timestamps = [tags.get(path, {}).get("timestamp") for path in frame_paths]
+    
+    # 没有时间戳信息时按帧间隔推算
+    if frame_interval is None:
+        known = [t for t in timestamps if t is not None]
+        frame_interval = float(np.median(np.diff(known))) if len(known) > 1 else 1.0
+    timestamps = [t if t is not None else index * frame_interval for index, t in enumerate(timestamps)]
+    
+    # 第一步：合并前去重，只对裁剪区域变化的帧进行OCR；变化比例由帧归档批量计算
+    candidates = [path for path in frame_paths if tags.get(path, {}).get("likely_text") is not False]
+    change_ratios = dict(zip(candidates, frame_change_ratios(candidates)))
+    frame_texts = []
+    ocr_calls = 0
+    previous_skipped = True
+    last_text = ""
+    for path in frame_paths:
+        tag = tags.get(path, {})
+        if tag.get("likely_text") is False:
+            # 文字预筛选判断为空的帧直接视为无字幕，之后的第一帧重新识别
+            frame_texts.append("")
+            previous_skipped = True
+            continue
+        
+        if previous_skipped or change_ratios[path] > change_threshold:
+            last_text = extract_original_text(ocr_fn(path))
+            ocr_calls += 1
+        frame_texts.append(last_text)
+        previous_skipped = False
+    
+    # 第二步：合并后去抖，将连续的相同或相似文字合并为一条字幕
+    groups = []
+    for timestamp, text in zip(timestamps, frame_texts):
+        if groups and text and groups[-1]["texts"] and text_similarity(groups[-1]["texts"][-1], text) >= similarity_threshold:
+            groups[-1]["texts"].append(text)
+            groups[-1]["end"] = timestamp + frame_interval
+        elif text:
+            groups.append({"start": timestamp, "end": timestamp + frame_interval, "texts": [text]})
+        elif groups:
+            # 空帧结束当前字幕，避免跨越空白段合并
+            groups.append({"start": timestamp, "end": timestamp, "texts": []})
+    
+    cues = []
+    for group in groups:
+        if not group["texts"]:
+            continue
+        # 组内出现次数最多的文字作为该条字幕，消除个别帧的识别抖动
+        text = max(set(group["texts"]), key=group["texts"].count)
+        cues.append({"start": group["start"], "end": group["end"], "text": text})
+    
+    stats = {
+        "frames": len(frame_paths),
+        "ocr_calls": ocr_calls,
+        "skipped_ocr": len(frame_paths) - ocr_calls,
+        "cues": len(cues)
+    }
+    return cues, stats
+
+# 自适应采样的默认参数
+ADAPTIVE_SAMPLING = {
+    "min_fps": 0.5,             # 画面稳定时的最低采样率
+    "max_fps": 5.0,             # 检测到变化时的最高采样率
+    "change_threshold": 0.2,    # 字幕区域变化像素的百分比阈值，低于生成字幕时的阈值，避免漏掉只差几个字的字幕
+    "scene_threshold": 0.6      # 整帧灰度直方图相关系数低于该值视为镜头切换
+}
+
+def frame_histogram(frame):
+    """计算缩小后整帧的灰度直方图，用于快速检测镜头切换"""
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    histogram = cv2.calcHist([gray], [0], None, [32], [0, 256])
+    return cv2.normalize(histogram, histogram).flatten()
+
+# 远程视频（S3或HTTP URL）按块读取：解码器只下载实际读到的字节范围，
+# 下载过的块缓存在本地磁盘上，重复提取同一个视频时不再下载
+REMOTE_VIDEO_CHUNK_SIZE = int(os.environ.get("REMOTE_VIDEO_CHUNK_SIZE", 2 * 1024 * 1024))
+REMOTE_VIDEO_CACHE_DIR = os.environ.get("REMOTE_VIDEO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "remote_video_chunks"))
+REMOTE_VIDEO_CACHE_MAX_BYTES = int(os.environ.get("REMOTE_VIDEO_CACHE_MAX_BYTES", 4 * 1024 * 1024 * 1024))
+
+def is_remote_video(video_path):
+    """是否为S3路径或HTTP(S) URL形式的视频"""
+    return isinstance(video_path, str) and video_path.startswith(("s3://", "http://", "https://"))
+
+class RangeVideoReader(io.BufferedIOBase):
+    """通过HTTP Range请求按块读取远程视频的只读文件对象，供OpenCV直接解码
+
+    S3视频使用预签名URL读取。块文件按(对象, ETag, 块大小)保存在本地缓存目录中，
+    对象被覆盖后ETag变化，不会读到旧内容。
+    """
+    
+    def __init__(self, url, cache_key=None, chunk_size=REMOTE_VIDEO_CHUNK_SIZE, cache_dir=REMOTE_VIDEO_CACHE_DIR,
+                 max_retries=3):
+        super().__init__()
+        self.url = url
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.position = 0
+        self.chunk_index = None
+        self.chunk_data = b""
+        self.stats = {"fetched_chunks": 0, "fetched_bytes": 0, "cached_chunks": 0}
+        
+        # 读取第一个字节获取对象大小和ETag（预签名URL只对GET签名，不能使用HEAD）
+        _, headers = self._fetch(0, 0)
+        content_range = headers.get("Content-Range", "")
+        if "/" not in content_range:
+            raise ValueError("远程服务器不支持按字节范围读取")
+        self.size = int(content_range.rsplit("/", 1)[1])
+        etag = headers.get("ETag", "").strip('"')
+        
+        # 缓存目录不包含预签名URL的查询参数，每次生成的新签名仍能命中缓存
+        identity = f"{cache_key or url.split('?')[0]}|{etag}|{self.size}|{chunk_size}"
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha1(identity.encode("utf-8")).hexdigest())
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self.position
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+    
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        parts = []
+        while size > 0 and self.position < self.size:
+            index, offset = divmod(self.position, self.chunk_size)
+            data = self._chunk(index)[offset:offset + size]
+            if not data:
+                break
+            parts.append(data)
+            self.position += len(data)
+            size -= len(data)
+        return b"".join(parts)
+    
+    def read1(self, size=-1):
+        return self.read(size)
+    
+    def _chunk(self, index):
+        """返回第index块的内容：依次查找内存、磁盘缓存，都没有时从远程下载"""
+        if index == self.chunk_index:
+            return self.chunk_data
+        
+        chunk_path = os.path.join(self.cache_dir, f"{index}.chunk")
+        try:
+            with open(chunk_path, "rb") as f:
+                data = f.read()
+            os.utime(chunk_path)  # 更新访问时间，清理缓存时优先删除最久未使用的块
+            self.stats["cached_chunks"] += 1
+        except FileNotFoundError:
+            start = index * self.chunk_size
+            data, _ = self._fetch(start, min(start + self.chunk_size, self.size) - 1)
+            # 先写临时文件再重命名，多个进程同时提取同一视频时不会读到不完整的块
+            temp_path = f"{chunk_path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, chunk_path)
+            self.stats["fetched_chunks"] += 1
+            self.stats["fetched_bytes"] += len(data)
+        
+        self.chunk_index = index
+        self.chunk_data = data
+        return data
+    
+    def _fetch(self, start, end):
+        """下载[start, end]字节范围，返回(内容, 响应头)，网络错误时带退避重试"""
+        import urllib.error
+        import urllib.request
+        request = urllib.request.Request(self.url, headers={"Range": f"bytes={start}-{end}"})
+        for attempt in range(self.max_retries):
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    if response.status != 206:
+                        # 不支持Range的服务器会返回整个对象，不能继续读取
+                        raise ValueError("远程服务器不支持按字节范围读取")
+                    return response.read(), response.headers
+            except urllib.error.HTTPError as e:
+                # 预签名URL过期、无权限等客户端错误重试也不会成功
+                if e.code < 500 or attempt == self.max_retries - 1:
+                    raise
+                time.sleep(0.5 * (2 ** attempt))
+            except OSError:
+                if attempt == self.max_retries - 1:
+                    raise
+                time.sleep(0.5 * (2 ** attempt))
+    
+    def summary(self):
+        """本次读取的下载量统计"""
+        return (f"远程视频按需读取: 下载 {self.stats['fetched_chunks']} 块"
+                f"（{self.stats['fetched_bytes']/1024/1024:.1f} MB / 视频 {self.size/1024/1024:.1f} MB），"
+                f"本地缓存命中 {self.stats['cached_chunks']} 块")
+
+def prune_remote_video_cache(cache_dir=REMOTE_VIDEO_CACHE_DIR, max_bytes=REMOTE_VIDEO_CACHE_MAX_BYTES):
+    """块缓存超过容量上限时，删除最久未使用的块"""
+    try:
+        chunks = []
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                if name.endswith(".chunk"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    chunks.append((stat.st_mtime, stat.st_size, path))
+        
+        total_bytes = sum(size for _, size, _ in chunks)
+        for _, size, path in sorted(chunks):
+            if total_bytes <= max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+    except Exception as e:
+        print(f"清理远程视频缓存错误: {str(e)}")
+
+def open_video_capture(video_path):
+    """打开本地视频文件、S3视频(s3://bucket/key)或HTTP(S)视频URL，返回(VideoCapture, 远程读取器)
+
+    远程视频通过RangeVideoReader按块读取，本地视频的读取器为None。
+    OpenCV版本不支持从文件对象读取时，退回由FFmpeg直接读取预签名URL（没有本地块缓存）。
+    """
+    if not is_remote_video(video_path):
+        return cv2.VideoCapture(video_path), None
+    
+    url = video_path
+    if video_path.startswith("s3://"):
+        bucket, key = parse_s3_path(video_path)
+        url = boto3.client('s3').generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=3600
+        )
+    
+    if not hasattr(cv2, "IStreamReader"):
+        return cv2.VideoCapture(url), None
+    
+    prune_remote_video_cache()
+    reader = RangeVideoReader(url, cache_key=video_path if video_path.startswith("s3://") else None)
+    return cv2.VideoCapture(reader, cv2.CAP_FFMPEG, []), reader
+
+def extract_video_frames(video_path, x, y, width, height, fps, text_filter=False, text_thresholds=None, drop_empty=False,
+                         max_frames=50, adaptive=False, sampling_options=None):
+    """从视频中提取指定区域的帧，max_frames为0表示不限制数量
+
+    adaptive为True时忽略fps，按max_fps间隔用缩小后的画面低成本地检查变化：
+    字幕区域或整帧发生变化时保存该帧，画面稳定时只按min_fps保存。
+    """
+    if not video_path or not isinstance(video_path, str):
+        return "视频路径无效", []
+    
+    try:
+        # 打开视频文件，S3视频只下载解码时读到的字节范围
+        cap, reader = open_video_capture(video_path)
+        if not cap.isOpened():
+            return "无法打开视频文件", []
+        
+        # 获取视频属性
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = total_frames / video_fps if video_fps > 0 else 0
+        
+        # 计算提取的帧间隔，自适应模式下按最高采样率检查画面
+        sampling = {**ADAPTIVE_SAMPLING, **(sampling_options or {})}
+        check_fps = sampling["max_fps"] if adaptive else fps
+        frame_interval = int(video_fps / check_fps) if check_fps > 0 else 1
+        if frame_interval < 1:
+            frame_interval = 1
+        min_gap = video_fps / sampling["min_fps"] if sampling["min_fps"] > 0 else float("inf")
+        
+        # 准备存储提取的帧，同时写入帧归档
+        extracted_frames = []
+        temp_dir = tempfile.mkdtemp()
+        archive_writer = FrameArchiveWriter(os.path.join(temp_dir, FRAME_ARCHIVE_FILENAME))
+        
+        # 按指定间隔提取帧
+        frame_count = 0
+        saved_count = 0
+        frame_tags = {}
+        text_count = 0
+        empty_count = 0
+        last_signature = None
+        last_histogram = None
+        last_kept_frame = None
+        change_count = 0
+        
+        while True:
+            # 不需要的帧只grab不解码，减少解码开销
+            if not cap.grab():
+                break
+            
+            # 按指定间隔提取帧
+            if frame_count % frame_interval == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                
+                # 确保坐标不超出边界
+                frame_height, frame_width = frame.shape[:2]
+                crop_x = max(0, min(x, frame_width - 1))
+                crop_y = max(0, min(y, frame_height - 1))
+                crop_width = min(width, frame_width - crop_x)
+                crop_height = min(height, frame_height - crop_y)
+                
+                # 裁剪区域
+                cropped = None
+                if crop_width > 0 and crop_height > 0:
+                    cropped = frame[crop_y:crop_y+crop_height, crop_x:crop_x+crop_width]
+                
+                sample_reason = "interval"
+                if adaptive and cropped is not None:
+                    # 与上一个保存的帧比较：字幕区域用缩小后的变化像素比例，整帧用灰度直方图
+                    gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
+                    signature = cv2.resize(gray, (192, 32), interpolation=cv2.INTER_AREA).astype(np.int16)
+                    histogram = frame_histogram(frame)
+                    if last_signature is None:
+                        sample_reason = "first"
+                    elif np.count_nonzero(np.abs(signature - last_signature) > 40) * 100.0 / signature.size > sampling["change_threshold"]:
+                        sample_reason = "change"
+                    elif cv2.compareHist(last_histogram, histogram, cv2.HISTCMP_CORREL) < sampling["scene_threshold"]:
+                        sample_reason = "scene"
+                    elif frame_count - last_kept_frame >= min_gap:
+                        sample_reason = "interval"
+                    else:
+                        # 画面稳定，跳过该帧
+                        cropped = None
+                    
+                    if sample_reason in ("change", "scene"):
+                        change_count += 1
+                    if cropped is not None:
+                        last_signature = signature
+                        last_histogram = histogram
+                        last_kept_frame = frame_count
+                
+                if cropped is not None:
+                    # 文字预筛选，标记可能为空的帧
+                    likely_text = True
+                    if text_filter:
+                        likely_text, text_stats = classify_text_presence(cropped, text_thresholds)
+                        if likely_text:
+                            text_count += 1
+                        else:
+                            empty_count += 1
+                    
+                    if likely_text or not drop_empty:
+                        # 保存裁剪的帧
+                        file_name = f"frame_{saved_count:04d}.jpg"
+                        output_path = os.path.join(temp_dir, file_name)
+                        _, encoded = cv2.imencode(".jpg", cropped)
+                        jpeg_bytes = encoded.tobytes()
+                        with open(output_path, "wb") as f:
+                            f.write(jpeg_bytes)
+                        save_frame_thumbnail(output_path, cropped)
+                        extracted_frames.append(output_path)
+                        # 记录帧在视频中的时间戳，用于生成字幕时间轴
+                        frame_tags[file_name] = {"timestamp": round(frame_count / video_fps, 3) if video_fps > 0 else 0.0}
+                        if adaptive:
+                            frame_tags[file_name]["sample_reason"] = sample_reason
+                        if text_filter:
+                            frame_tags[file_name].update({"likely_text": likely_text, **text_stats})
+                        archive_writer.append(
+                            file_name, cropped, frame_tags[file_name]["timestamp"], jpeg_bytes,
+                            {key: value for key, value in frame_tags[file_name].items() if key != "timestamp"}
+                        )
+                        saved_count += 1
+                
+                # 限制提取的帧数量，避免过多
+                if max_frames and saved_count >= max_frames:
+                    break
+            
+            frame_count += 1
+        
+        # 释放资源
+        cap.release()
+        archive_writer.close()
+        
+        # 保存帧标签（时间戳和预筛选结果），供生成字幕和批量OCR跳过空帧
+        with open(os.path.join(temp_dir, FRAME_TAGS_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(frame_tags, f, ensure_ascii=False)
+        
+        RESULTS_STORE.record_frames(video_path, [
+            {"path": frame_path, "index": index, **frame_tags[os.path.basename(frame_path)]}
+            for index, frame_path in enumerate(extracted_frames)
+        ])
+        
+        # 返回结果信息和提取的帧路径
+        if adaptive:
+            result_info = (f"成功从视频中提取了 {saved_count} 帧，自适应采样: {sampling['min_fps']}~{sampling['max_fps']} fps，"
+                           f"检测到 {change_count} 次画面变化")
+        else:
+            result_info = f"成功从视频中提取了 {saved_count} 帧，帧率: {fps} fps"
+        if text_filter:
+            result_info += f"\n文字预筛选: 可能有文字 {text_count} 帧，可能为空 {empty_count} 帧"
+            if drop_empty:
+                result_info += f"，已跳过 {empty_count} 个空帧"
+        if reader is not None:
+            result_info += f"\n{reader.summary()}"
+        return result_info, extracted_frames
+    
+    except Exception as e:
+        # 处理异常
+        return f"提取视频帧时发生错误: {str(e)}", []
+
+def detect_subtitle_region(video_path, sample_count=30, analysis_width=640, band_threshold=0.35, padding=12):
+    """采样视频帧，自动检测字幕所在的高对比度文字区域，返回建议的截取区域"""
+    if not video_path or not isinstance(video_path, str):
+        return None, "视频路径无效"
+    
+    try:
+        cap, _ = open_video_capture(video_path)
+        if not cap.isOpened():
+            return None, "无法打开视频文件"
+        
+        video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        if video_width <= 0 or video_height <= 0 or total_frames <= 0:
+            cap.release()
+            return None, "无法读取视频信息"
+        
+        # 缩小分析尺寸以加快计算速度，最后再映射回原始坐标
+        scale = min(1.0, analysis_width / video_width)
+        small_width = max(1, int(video_width * scale))
+        small_height = max(1, int(video_height * scale))
+        
+        # 均匀采样若干帧，跳过片头片尾
+        sample_count = max(1, min(int(sample_count), total_frames))
+        positions = np.linspace(total_frames * 0.05, total_frames * 0.95, sample_count).astype(int)
+        
+        mser = cv2.MSER_create()
+        mser.setMinArea(max(8, int(small_width * small_height * 0.00002)))
+        mser.setMaxArea(max(64, int(small_width * small_height * 0.01)))
+        
+        edge_acc = np.zeros((small_height, small_width), dtype=np.float32)
+        text_acc = np.zeros((small_height, small_width), dtype=np.float32)
+        density_kernel = (max(3, small_width // 40), max(3, small_width // 160))
+        used_samples = 0
+        
+        for position in positions:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if scale < 1.0:
+                gray = cv2.resize(gray, (small_width, small_height), interpolation=cv2.INTER_AREA)
+            
+            # 边缘密度：字幕笔画会在水平方向上形成密集的强边缘簇
+            edges = (cv2.Canny(gray, 100, 200) > 0).astype(np.float32)
+            edge_acc += edges
+            mask = cv2.blur(edges, density_kernel) > 0.15
+            
+            # MSER：检测类似文字笔画的稳定极值区域，只保留字符形状的区域
+            regions, boxes = mser.detectRegions(gray)
+            if len(boxes) > 0:
+                boxes = np.asarray(boxes)
+                bw, bh = boxes[:, 2], boxes[:, 3]
+                keep = (bh >= 4) & (bh <= small_height * 0.15) & (bw <= bh * 3)
+                for bx, by, w, h in boxes[keep]:
+                    mask[by:by+h, bx:bx+w] = True
+            text_acc += mask
+            used_samples += 1
+        
+        cap.release()
+        
+        if used_samples == 0:
+            return None, "无法读取视频帧"
+        
+        edge_freq = edge_acc / used_samples
+        text_freq = text_acc / used_samples
+        
+        # 在多数帧中都出现但内容会变化的区域更可能是字幕，
+        # 而每帧都完全不变的边缘（台标、水印）会被削弱
+        score = text_freq * (1.0 - np.clip(edge_freq - 0.9, 0, 0.1) * 10)
+        
+        row_profile = score.mean(axis=1)
+        if row_profile.max() <= 0:
+            return None, "未检测到明显的文字区域"
+        
+        # 找出得分最高的连续行区间作为字幕带
+        active_rows = row_profile >= row_profile.max() * band_threshold
+        best_start, best_end, best_mass = 0, 0, 0.0
+        start = None
+        for i, active in enumerate(np.append(active_rows, False)):
+            if active and start is None:
+                start = i
+            elif not active and start is not None:
+                mass = float(row_profile[start:i].sum())
+                if mass > best_mass:
+                    best_start, best_end, best_mass = start, i, mass
+                start = None
+        
+        col_profile = score[best_start:best_end].mean(axis=0)
+        active_cols = np.flatnonzero(col_profile >= col_profile.max() * band_threshold)
+        if len(active_cols) == 0:
+            return None, "未检测到明显的文字区域"
+        
+        # 映射回原始分辨率并加上边距
+        x = max(0, int(active_cols[0] / scale) - padding)
+        y = max(0, int(best_start / scale) - padding)
+        right = min(video_width, int((active_cols[-1] + 1) / scale) + padding)
+        bottom = min(video_height, int(best_end / scale) + padding)
+        
+        region = {"x": x, "y": y, "width": right - x, "height": bottom - y}
+        area_ratio = region["width"] * region["height"] / (video_width * video_height)
+        
+        info = f"自动检测完成: 分析了 {used_samples} 帧\n"
+        info += f"建议区域: ({x},{y}) 宽度 {region['width']}，高度 {region['height']}\n"
+        info += f"区域占画面比例: {area_ratio*100:.1f}%"
+        return region, info
+    
+    except Exception as e:
+        print(f"字幕区域检测错误: {str(e)}")
+        return None, f"字幕区域检测时发生错误: {str(e)}"
+
+def run_frame_pipeline(video_path, x, y, width, height, fps, model_name, language, system_prompt, user_prompt,
+                       s3_path=None, max_frames=0, text_filter=True, text_thresholds=None,
+                       queue_size=8, upload_workers=4, ocr_workers=4, encoding_options=None, budget=None):
+    """以流水线方式执行 解码 → 编码 → S3上传 → Bedrock识别
+
+    各阶段通过有界队列连接，下游处理不过来时上游会阻塞（背压），
+    这样前面的帧在识别时后面的帧仍在解码，总耗时接近最慢阶段的耗时。
+    逐步产出(帧结果列表, 进度信息)。
+    传入budget时，预算暂停后剩余的帧照常提取但不识别，预算停止后不再解码新的帧。
+    调用方不再读取结果（如客户端断开连接）时，各阶段线程在短时间内退出，不会阻塞在队列上。
+    """
+    encoding_options = {**DEFAULT_IMAGE_ENCODING, **(encoding_options or {})}
+    
+    try:
+        cap, reader = open_video_capture(video_path) if video_path else (None, None)
+    except Exception as e:
+        yield [], f"无法打开视频文件: {str(e)}"
+        return
+    if cap is None or not cap.isOpened():
+        yield [], "无法打开视频文件"
+        return
+    
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_interval = max(1, int(video_fps / fps)) if fps > 0 else 1
+    
+    # S3上传目标
+    s3_client = None
+    if s3_path:
+        bucket, prefix = parse_s3_path(s3_path)
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        folder_prefix = f"{prefix}{datetime.now().strftime('%Y%m%d-%H%M%S')}/"
+        s3_client = boto3.client('s3')
+    
+    temp_dir = tempfile.mkdtemp()
+    archive_writer = FrameArchiveWriter(os.path.join(temp_dir, FRAME_ARCHIVE_FILENAME))
+    decode_queue = queue.Queue(maxsize=queue_size)
+    upload_queue = queue.Queue(maxsize=queue_size)
+    ocr_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue()
+    stage_busy = {"decode": 0.0, "encode": 0.0, "upload": 0.0, "ocr": 0.0}
+    stage_lock = threading.Lock()
+    stop_event = threading.Event()
+    
+    def add_busy(stage, seconds):
+        with stage_lock:
+            stage_busy[stage] += seconds
+    
+    def put(stage_queue, item):
+        """队列已满时阻塞等待下游消费，流水线停止后放弃并返回False"""
+        while not stop_event.is_set():
+            try:
+                stage_queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def get(stage_queue):
+        """取出下一项，流水线停止后返回None（与结束标记相同）"""
+        while not stop_event.is_set():
+            try:
+                return stage_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return None
+    
+    def decode_stage():
+        frame_count = 0
+        index = 0
+        try:
+            while not stop_event.is_set():
+                if budget is not None and budget.status == "stopped":
+                    break
+                start = time.time()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frame_count % frame_interval == 0:
+                    frame_height, frame_width = frame.shape[:2]
+                    crop_x = max(0, min(x, frame_width - 1))
+                    crop_y = max(0, min(y, frame_height - 1))
+                    cropped = frame[crop_y:crop_y+min(height, frame_height - crop_y),
+                                    crop_x:crop_x+min(width, frame_width - crop_x)].copy()
+                    timestamp = round(frame_count / video_fps, 3) if video_fps > 0 else 0.0
+                    add_busy("decode", time.time() - start)
+                    # 队列已满时阻塞，等待下游消费
+                    if not put(decode_queue, (index, timestamp, cropped)):
+                        break
+                    index += 1
+                    if max_frames and index >= max_frames:
+                        break
+                else:
+                    add_busy("decode", time.time() - start)
+                frame_count += 1
+        finally:
+            cap.release()
+            put(decode_queue, None)
+    
+    def encode_stage():
+        decode_finished = False
+        try:
+            while True:
+                item = get(decode_queue)
+                if item is None:
+                    decode_finished = True
+                    break
+                start = time.time()
+                index, timestamp, cropped = item
+                file_name = f"frame_{index:04d}.jpg"
+                frame_path = os.path.join(temp_dir, file_name)
+                try:
+                    ok, encoded = cv2.imencode(".jpg", cropped)
+                    if not ok:
+                        raise ValueError("JPEG编码失败")
+                    jpeg_bytes = encoded.tobytes()
+                    with open(frame_path, "wb") as f:
+                        f.write(jpeg_bytes)
+                    save_frame_thumbnail(frame_path, cropped)
+                    
+                    tag = {"timestamp": timestamp}
+                    if text_filter:
+                        likely_text, text_stats = classify_text_presence(cropped, text_thresholds)
+                        tag.update({"likely_text": likely_text, **text_stats})
+                    archive_writer.append(file_name, cropped, timestamp, jpeg_bytes,
+                                          {key: value for key, value in tag.items() if key != "timestamp"})
+                except Exception as e:
+                    # 单帧保存失败（如磁盘已满）时只记录该帧的错误，不影响其他阶段
+                    result_queue.put(("failed", index, {"timestamp": timestamp, "error": f"保存帧失败: {str(e)}"}))
+                    add_busy("encode", time.time() - start)
+                    continue
+                add_busy("encode", time.time() - start)
+                
+                result_queue.put(("frame", index, {"path": frame_path, "file_name": file_name, "tag": tag}))
+                if s3_client is not None:
+                    put(upload_queue, (index, frame_path, file_name))
+                if tag.get("likely_text") is False:
+                    # 预筛选为空的帧不发送给Bedrock
+                    result_queue.put(("ocr", index, {"text": "", "skipped": True}))
+                else:
+                    put(ocr_queue, (index, jpeg_bytes))
+        finally:
+            # 无论是否出错都通知下游结束，否则上传和识别线程会一直等待
+            try:
+                archive_writer.close()
+            except Exception as e:
+                print(f"帧归档写入错误: {str(e)}")
+            for _ in range(upload_workers if s3_client is not None else 0):
+                put(upload_queue, None)
+            for _ in range(ocr_workers):
+                put(ocr_queue, None)
+            # 编码阶段异常退出时继续取走剩余的帧，解码线程不会阻塞在已满的队列上
+            while not decode_finished:
+                decode_finished = get(decode_queue) is None
+    
+    def upload_stage():
+        while True:
+            item = get(upload_queue)
+            if item is None or stop_event.is_set():
+                break
+            index, frame_path, file_name = item
+            start = time.time()
+            try:
+                s3_key = f"{folder_prefix}{file_name}"
+                s3_client.upload_file(Filename=frame_path, Bucket=bucket, Key=s3_key)
+                if os.path.exists(thumbnail_path(frame_path)):
+                    s3_client.upload_file(Filename=thumbnail_path(frame_path), Bucket=bucket, Key=thumbnail_key(s3_key))
+                result_queue.put(("upload", index, {"s3_key": s3_key}))
+            except Exception as e:
+                result_queue.put(("upload", index, {"s3_key": "", "error": f"上传失败: {str(e)}"}))
+            add_busy("upload", time.time() - start)
+    
+    def ocr_stage():
+        while True:
+            item = get(ocr_queue)
+            if item is None or stop_event.is_set():
+                break
+            index, jpeg_bytes = item
+            frame_path = os.path.join(temp_dir, f"frame_{index:04d}.jpg")
+            if budget is not None and not budget.allow():
+                result_queue.put(("ocr", index, {"text": "", "budget_skipped": True}))
+                continue
+            start = time.time()
+            try:
+                image_bytes, encoded_format, _, _ = encode_image_for_bedrock(
+                    Image.open(io.BytesIO(jpeg_bytes)), original_bytes=jpeg_bytes, **encoding_options
+                )
+                text, usage = invoke_bedrock_ocr(image_bytes, encoded_format, model_name, language, system_prompt, user_prompt,
+                                                 item_ref=frame_path)
+                if budget is not None:
+                    budget.charge(usage, frame=frame_path, video=video_path)
+                result_queue.put(("ocr", index, {"text": text, "usage": usage}))
+            except Exception as e:
+                result_queue.put(("ocr", index, {"text": "", "error": f"识别失败: {str(e)}"}))
+            add_busy("ocr", time.time() - start)
+    
+    start_time = time.time()
+    decode_thread = threading.Thread(target=decode_stage, daemon=True)
+    threads = [decode_thread, threading.Thread(target=encode_stage, daemon=True)]
+    if s3_client is not None:
+        threads += [threading.Thread(target=upload_stage, daemon=True) for _ in range(upload_workers)]
+    threads += [threading.Thread(target=ocr_stage, daemon=True) for _ in range(ocr_workers)]
+    for thread in threads:
+        thread.start()
+    
+    # 收集各阶段结果，一帧在识别（以及上传）都完成后才算完成
+    results = {}
+    pending_stages = {}
+    done_count = 0
+    # 编码线程结束后不会再产生新的帧，此时只需等待下游线程，不依赖解码线程
+    try:
+        while any(thread.is_alive() for thread in threads if thread is not decode_thread) or not result_queue.empty():
+            try:
+                kind, index, payload = result_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            
+            result = results.setdefault(index, {"index": index})
+            if kind == "failed":
+                # 保存失败的帧没有后续阶段，直接算作完成
+                result.update(payload)
+                done_count += 1
+                continue
+            if kind == "frame":
+                result.update({"path": payload["path"], "timestamp": payload["tag"]["timestamp"], "tag": payload["tag"],
+                               "file_name": payload["file_name"]})
+                pending_stages[index] = 2 if s3_client is not None else 1
+                continue
+            
+            result.update(payload)
+            pending_stages[index] -= 1
+            if pending_stages[index] == 0:
+                done_count += 1
+                ordered = [results[key] for key in sorted(results)]
+                yield ordered, f"流水线处理中: 已完成 {done_count} 帧，用时 {time.time() - start_time:.1f} 秒"
+    finally:
+        # 正常结束时各阶段已经退出；调用方中途停止读取（GeneratorExit）时通知各阶段退出，
+        # 并清空队列，阻塞在队列上的线程立即返回，释放VideoCapture和归档文件
+        stop_event.set()
+        for stage_queue in (decode_queue, upload_queue, ocr_queue):
+            try:
+                while True:
+                    stage_queue.get_nowait()
+            except queue.Empty:
+                pass
+    
+    ordered = [results[key] for key in sorted(results)]
+    saved = [item for item in ordered if "path" in item]
+    
+    # 保存帧标签，与extract_video_frames的输出保持一致
+    with open(os.path.join(temp_dir, FRAME_TAGS_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({item["file_name"]: item["tag"] for item in saved}, f, ensure_ascii=False)
+    
+    # 写入本地结果库
+    RESULTS_STORE.record_frames(video_path, [
+        {"path": item["path"], "index": item["index"], **item["tag"]} for item in saved
+    ])
+    if s3_client is not None:
+        RESULTS_STORE.set_frame_s3_uris({
+            item["path"]: f"s3://{bucket}/{item['s3_key']}" for item in saved if item.get("s3_key")
+        })
+    RESULTS_STORE.record_ocr_results([
+        {"image_ref": item["path"], **item} for item in saved if not item.get("skipped") and not item.get("budget_skipped")
+    ], model_name, language)
+    
+    # 多线程阶段按工作线程数折算为实际占用时间
+    stage_times = {
+        "解码": stage_busy["decode"],
+        "编码": stage_busy["encode"],
+        "识别": stage_busy["ocr"] / ocr_workers
+    }
+    if s3_client is not None:
+        stage_times["上传"] = stage_busy["upload"] / upload_workers
+    total_time = time.time() - start_time
+    slowest_stage = max(stage_times, key=stage_times.get)
+    info = f"流水线处理完成: 共 {len(ordered)} 帧，总耗时 {total_time:.1f} 秒\n"
+    info += "各阶段耗时: " + "，".join(f"{stage} {seconds:.1f}秒" for stage, seconds in stage_times.items()) + "\n"
+    info += f"最慢阶段: {slowest_stage}，各阶段耗时之和: {sum(stage_times.values()):.1f} 秒"
+    skipped = sum(1 for item in ordered if item.get("skipped"))
+    if skipped:
+        info += f"\n文字预筛选跳过 {skipped} 帧"
+    if len(saved) < len(ordered):
+        info += f"\n{len(ordered) - len(saved)} 帧保存失败: {next(item['error'] for item in ordered if 'path' not in item)}"
+    usage_summary = summarize_ocr_usage(ordered)
+    if usage_summary:
+        info += f"\n{usage_summary}"
+    budget_skipped = sum(1 for item in ordered if item.get("budget_skipped"))
+    if budget is not None and budget.status != "running":
+        info += f"\n预算已{'暂停' if budget.status == 'paused' else '停止'}: {budget.summary()}"
+        if budget_skipped:
+            info += f"，{budget_skipped} 帧未识别"
+    if s3_client is not None:
+        info += f"\n已上传到 s3://{bucket}/{folder_prefix}"
+    if reader is not None:
+        info += f"\n{reader.summary()}"
+    yield ordered, info
+
+def ocr_local_frames(frame_paths, model_name, language, system_prompt, user_prompt,
+                     encoding_options=None, skip_empty=True, workers=BEDROCK_CONCURRENCY_LIMIT, budget=None):
+    """直接将本地提取的帧发送给Bedrock识别，不经过S3上传和下载，返回(结果列表, 统计信息)
+
+    传入budget(OcrRunBudget)时，每次调用的用量按帧和视频计入预算，预算用完后剩余的帧标记为budget_skipped。
+    """
+    encoding_options = {**DEFAULT_IMAGE_ENCODING, **(encoding_options or {})}
+    
+    if skip_empty:
+        ocr_paths, skipped_paths = filter_text_frames(frame_paths)
+    else:
+        ocr_paths, skipped_paths = list(frame_paths), []
+    frame_videos = RESULTS_STORE.frame_videos(ocr_paths) if budget is not None else {}
+    
+    def ocr_one(frame_path):
+        if budget is not None and not budget.allow():
+            return {"path": frame_path, "text": "", "budget_skipped": True}
+        try:
+            frame_bytes = read_frame_bytes(frame_path)
+            # 帧文件已经是JPEG，编码配置允许时直接复用原始字节
+            image_bytes, encoded_format, _, _ = encode_image_for_bedrock(
+                Image.open(io.BytesIO(frame_bytes)), original_bytes=frame_bytes, **encoding_options
+            )
+            text, usage = invoke_bedrock_ocr(image_bytes, encoded_format, model_name, language, system_prompt, user_prompt,
+                                             item_ref=frame_path)
+            if budget is not None:
+                budget.charge(usage, frame=frame_path, video=frame_videos.get(frame_path))
+            return {"path": frame_path, "text": text, "usage": usage}
+        except Exception as e:
+            print(f"帧识别错误 ({frame_path}): {str(e)}")
+            return {"path": frame_path, "text": "", "error": f"识别失败: {str(e)}"}
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        ocr_results = dict(zip(ocr_paths, executor.map(ocr_one, ocr_paths)))
+    
+    RESULTS_STORE.record_ocr_results(
+        [{"image_ref": path, **result} for path, result in ocr_results.items() if not result.get("budget_skipped")],
+        model_name, language
+    )
+    
+    tags = load_frame_tags(frame_paths)
+    results = []
+    for frame_path in frame_paths:
+        result = ocr_results.get(frame_path) or {"path": frame_path, "text": "", "skipped": True}
+        result["timestamp"] = tags.get(frame_path, {}).get("timestamp", "")
+        results.append(result)
+    
+    stats = {
+        "frames": len(frame_paths),
+        "ocr_calls": sum(1 for result in ocr_results.values() if not result.get("budget_skipped")),
+        "skipped": len(skipped_paths),
+        "errors": sum(1 for item in results if item.get("error")),
+        "budget_skipped": sum(1 for item in results if item.get("budget_skipped"))
+    }
+    return results, stats
@@ -0,0 +1,23 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import core
+
+def use_temp_results_store(test_case):
+    """测试期间把结果库换成临时目录中的库，结束后恢复，测试不会写入仓库根目录的results.db
+
+    同时设置RESULTS_DB_PATH，进程池中重新导入core的子进程也使用临时库。
+    """
+    directory = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, directory, True)
+    db_path = os.path.join(directory, "results.db")
+    patchers = [
+        mock.patch.dict(os.environ, {"RESULTS_DB_PATH": db_path}),
+        mock.patch.object(core, "RESULTS_STORE", core.ResultsStore(db_path))
+    ]
+    for patcher in patchers:
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    return core.RESULTS_STORE
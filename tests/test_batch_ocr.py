@@ -0,0 +1,157 @@
+"""Bedrock批量推理OCR的测试
+
+用本地目录代替S3、用本地替身代替Bedrock批量推理任务，验证 清单 → 记录映射 → .out输出 的关联。
+"""
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+import core
+from tests import use_temp_results_store
+
+class LocalBatchInferenceStandIn:
+    """本地批量推理替身：用本地目录模拟S3和Bedrock批量推理，读取清单并写出与真实格式一致的模型输出"""
+    
+    def __init__(self, root_dir, fake_text="本地模拟识别结果"):
+        self.root_dir = root_dir
+        self.fake_text = fake_text
+        self.jobs = {}
+    
+    def _path(self, bucket, key):
+        return os.path.join(self.root_dir, bucket, key)
+    
+    # S3接口
+    def put_object(self, Bucket, Key, Body):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body if isinstance(Body, bytes) else Body.encode("utf-8"))
+        return {}
+    
+    def get_object(self, Bucket, Key):
+        with open(self._path(Bucket, Key), "rb") as f:
+            return {"Body": io.BytesIO(f.read())}
+    
+    # Bedrock批量推理接口
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig):
+        job_id = uuid.uuid4().hex[:12]
+        job_arn = f"arn:aws:bedrock:us-west-2:000000000000:model-invocation-job/{job_id}"
+        
+        input_bucket, input_key = core.parse_s3_path(inputDataConfig["s3InputDataConfig"]["s3Uri"])
+        output_bucket, output_prefix = core.parse_s3_path(outputDataConfig["s3OutputDataConfig"]["s3Uri"])
+        if output_prefix and not output_prefix.endswith('/'):
+            output_prefix += '/'
+        
+        # 读取清单，为每条记录写出与真实格式一致的模拟输出
+        manifest = self.get_object(input_bucket, input_key)["Body"].read().decode("utf-8")
+        output_lines = []
+        for line in manifest.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "anthropic_version" in record["modelInput"]:
+                model_output = {
+                    "content": [{"type": "text", "text": self.fake_text}],
+                    "usage": {"input_tokens": 100, "output_tokens": 10}
+                }
+            else:
+                model_output = {
+                    "output": {"message": {"content": [{"text": self.fake_text}]}},
+                    "usage": {"inputTokens": 100, "outputTokens": 10}
+                }
+            output_lines.append(json.dumps({**record, "modelOutput": model_output}))
+        
+        output_key = f"{output_prefix}{job_id}/{os.path.basename(input_key)}.out"
+        self.put_object(output_bucket, output_key, "\n".join(output_lines) + "\n")
+        
+        self.jobs[job_arn] = {
+            "jobArn": job_arn,
+            "jobName": jobName,
+            "modelId": modelId,
+            "roleArn": roleArn,
+            "status": "Completed",
+            "inputDataConfig": inputDataConfig,
+            "outputDataConfig": outputDataConfig
+        }
+        return {"jobArn": job_arn}
+    
+    def get_model_invocation_job(self, jobIdentifier):
+        return self.jobs[jobIdentifier]
+
+class BatchOcrJobTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.store = use_temp_results_store(self)
+        self.stand_in = LocalBatchInferenceStandIn(self.root, fake_text="原文: 你好")
+        self.frame_keys = [f"frames/frame_{index:04d}.jpg" for index in range(3)]
+        self.frame_items = [(key, core.Image.new("RGB", (64, 16), (index * 40, 0, 0)))
+                            for index, key in enumerate(self.frame_keys)]
+    
+    def submit(self, model_name="Claude 3.5 Haiku", change_set=None):
+        return core.submit_batch_ocr_job(
+            self.frame_items, "s3://bucket/batch", "arn:aws:iam::000000000000:role/batch", model_name, "JP",
+            "system", "user", s3_client=self.stand_in, bedrock_client=self.stand_in, change_set=change_set
+        )
+    
+    def check(self, job_arn):
+        return core.check_batch_ocr_job(job_arn, s3_client=self.stand_in, bedrock_client=self.stand_in)
+    
+    def count(self, table):
+        return self.store.connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    
+    def test_submit_writes_manifest_and_record_map(self):
+        submitted = self.submit()
+        self.assertEqual(submitted["status"], "STARTED")
+        self.assertEqual(submitted["record_count"], 3)
+        
+        input_dir = os.path.join(self.root, "bucket", "batch", "input")
+        manifest_name = f"{submitted['job_name']}.jsonl"
+        with open(os.path.join(input_dir, manifest_name)) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        with open(os.path.join(input_dir, f"{submitted['job_name']}.records.json")) as f:
+            record_info = json.load(f)
+        self.assertEqual([record["recordId"] for record in records], sorted(record_info["records"]))
+        self.assertEqual(sorted(record_info["records"].values()), self.frame_keys)
+        self.assertIn("anthropic_version", records[0]["modelInput"])
+    
+    def test_check_joins_output_to_frame_keys(self):
+        # Claude和Nova的输出格式不同，替身按清单中的请求体分别写出
+        for model_name in ("Claude 3.5 Haiku", "Nova Pro"):
+            with self.subTest(model_name=model_name):
+                result = self.check(self.submit(model_name)["job_arn"])
+                self.assertEqual(result["status"], "Completed")
+                self.assertEqual([item["frame_key"] for item in result["results"]], self.frame_keys)
+                self.assertTrue(all(item["text"] == "原文: 你好" and not item["error"] for item in result["results"]))
+    
+    def test_repeated_check_records_results_once(self):
+        change_set = {
+            "prefix": "s3://bucket/frames/",
+            "task": "ocr",
+            "changed": [{"key": key, "etag": f"etag-{key}", "last_modified": 1000.0 + index}
+                        for index, key in enumerate(self.frame_keys)],
+            "max_last_modified": 1002.0
+        }
+        job_arn = self.submit(change_set=change_set)["job_arn"]
+        first = self.check(job_arn)
+        ocr_rows, search_rows = self.count("ocr_results"), self.count("search_index")
+        manifest = self.store.manifest_etags("s3://bucket/frames/", "ocr", self.frame_keys)
+        
+        with mock.patch.object(core, "commit_s3_changes") as commit:
+            second = self.check(job_arn)
+        self.assertEqual(ocr_rows, 3)
+        self.assertEqual(search_rows, 3)
+        self.assertEqual(len(manifest), 3)
+        self.assertEqual(second["results"], first["results"])
+        self.assertEqual(self.count("ocr_results"), ocr_rows)
+        self.assertEqual(self.count("search_index"), search_rows)
+        commit.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
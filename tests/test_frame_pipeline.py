@@ -0,0 +1,70 @@
+"""帧流水线（解码 → 编码 → 识别）的测试
+
+Bedrock识别用本地函数代替，测试视频由OpenCV现场生成。
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import core
+from tests import use_temp_results_store
+from tests.test_remote_video import write_test_video
+
+def fake_ocr(image_bytes, image_format, model_name, language, system_prompt, user_prompt, item_ref=None):
+    time.sleep(0.05)
+    return "原文: subtitle", {"input_tokens": 10, "output_tokens": 2}
+
+class FramePipelineTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.video_path = os.path.join(self.root, "video.mp4")
+        write_test_video(self.video_path, frame_count=120)
+        self.store = use_temp_results_store(self)
+        patcher = mock.patch.object(core, "invoke_bedrock_ocr", fake_ocr)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def run_pipeline(self, **options):
+        return core.run_frame_pipeline(self.video_path, 0, 160, 320, 80, 12, "Claude 3.5 Haiku", "JP", "system", "user",
+                                       text_filter=False, queue_size=2, ocr_workers=2, **options)
+    
+    def wait_for_threads(self, before, timeout=3.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            leftover = [thread for thread in threading.enumerate() if thread not in before and thread.is_alive()]
+            if not leftover:
+                return []
+            time.sleep(0.05)
+        return leftover
+    
+    def test_completes_and_records_frames(self):
+        *_, (results, info) = self.run_pipeline()
+        self.assertEqual(len(results), 120)
+        self.assertTrue(all(item["text"] == "原文: subtitle" for item in results))
+        self.assertIn("流水线处理完成", info)
+        self.assertEqual(len(self.store.frame_videos([item["path"] for item in results])), 120)
+    
+    def test_closing_generator_stops_stage_threads(self):
+        before = set(threading.enumerate())
+        pipeline = self.run_pipeline()
+        results, _ = next(pipeline)
+        self.assertLess(len(results), 120)
+        # 模拟客户端断开：Gradio关闭生成器，GeneratorExit在yield处抛出
+        pipeline.close()
+        self.assertEqual(self.wait_for_threads(before), [])
+    
+    def test_encode_failure_marks_frame_failed(self):
+        with mock.patch.object(core.cv2, "imencode", return_value=(False, None)):
+            *_, (results, info) = self.run_pipeline(max_frames=3)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all("JPEG编码失败" in item["error"] and "path" not in item for item in results))
+        self.assertIn("3 帧保存失败", info)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+"""Bedrock多区域调度的测试
+
+用假的bedrock-runtime客户端代替真实区域，不需要AWS账户。
+"""
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from botocore.exceptions import ClientError, EventStreamError
+
+import core
+
+MODEL_NAME = "Stand-in Model"
+
+def client_error(code, message=None):
+    return ClientError({"Error": {"Code": code, "Message": message or code}}, "InvokeModel")
+
+class FakeRuntime:
+    """按区域计数的假客户端，error_code不为空时每次调用都抛出该错误，stream_error_code不为空时流式响应读到末尾抛出该错误"""
+    
+    def __init__(self, region, error_code=None, latency=0.0, error_message=None, stream_error_code=None):
+        self.region = region
+        self.stream_error_code = stream_error_code
+        self.error_code = error_code
+        self.error_message = error_message
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+    
+    def invoke_model(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+        if self.error_code:
+            raise client_error(self.error_code, self.error_message)
+        time.sleep(self.latency)
+        return self.region
+    
+    def invoke_model_with_response_stream(self, **kwargs):
+        return {"body": self.stream_events()}
+    
+    def stream_events(self):
+        for index in range(3):
+            yield {"chunk": index}
+        if self.stream_error_code:
+            # 流式响应中途的错误码为小写开头
+            raise EventStreamError({"Error": {"Code": self.stream_error_code, "Message": self.stream_error_code}},
+                                   "InvokeModelWithResponseStream")
+
+class BedrockRegionPoolTest(unittest.TestCase):
+    
+    def setUp(self):
+        patcher = mock.patch.dict(core.BEDROCK_MODEL_RPM, {MODEL_NAME: 600000})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def make_pool(self, clients, **options):
+        options.setdefault("base_delay", 0.01)
+        return core.BedrockRegionPool(list(clients), client_factory=lambda region: clients[region], **options)
+    
+    def test_region_error_fails_over_and_disables_region(self):
+        clients = {"a": FakeRuntime("a", "AccessDeniedException"), "b": FakeRuntime("b")}
+        pool = self.make_pool(clients, unhealthy_after=3)
+        results = [pool.call(lambda client: client.invoke_model(), MODEL_NAME, f"frame-{index}")
+                   for index in range(20)]
+        
+        self.assertEqual(results, ["b"] * 20)
+        self.assertEqual(clients["b"].calls, 20)
+        # 区域错误计入连续错误数，达到unhealthy_after后该区域暂停使用
+        self.assertLessEqual(clients["a"].calls, 3)
+        self.assertGreater(pool.health["a"]["disabled_until"], time.monotonic())
+        self.assertEqual(len(pool.dead_letters), 0)
+    
+    def test_region_error_without_alternative_fails_once(self):
+        clients = {"a": FakeRuntime("a", "AccessDeniedException")}
+        pool = self.make_pool(clients)
+        with self.assertRaises(ClientError):
+            pool.call(lambda client: client.invoke_model(), MODEL_NAME, "frame-0")
+        with self.assertRaises(ClientError):
+            pool.call(lambda client: client.invoke_model(), MODEL_NAME)
+        
+        # 没有其他区域时不重试；只有带item_ref的调用记入死信
+        self.assertEqual(clients["a"].calls, 2)
+        self.assertEqual(list(pool.dead_letters), ["frame-0"])
+    
+    def test_validation_error_does_not_mark_region_unhealthy(self):
+        clients = {
+            "a": FakeRuntime("a", "ValidationException", error_message="Input is too long for requested model."),
+            "b": FakeRuntime("b", "ValidationException", error_message="Input is too long for requested model.")
+        }
+        pool = self.make_pool(clients, unhealthy_after=2)
+        for index in range(10):
+            with self.assertRaises(ClientError):
+                pool.call(lambda client: client.invoke_model(), MODEL_NAME, f"frame-{index}")
+        
+        # 请求本身的错误不在其他区域重试，也不让区域暂停使用
+        self.assertEqual(clients["a"].calls + clients["b"].calls, 10)
+        for region in ("a", "b"):
+            self.assertEqual(pool.health[region]["errors"], 0)
+            self.assertEqual(pool.health[region]["disabled_until"], 0.0)
+            self.assertEqual(pool.limiters[region].stats["errors"], 0)
+        self.assertEqual(len(pool.dead_letters), 10)
+    
+    def test_model_unavailable_validation_error_fails_over(self):
+        clients = {
+            "a": FakeRuntime("a", "ValidationException", error_message="The provided model identifier is invalid."),
+            "b": FakeRuntime("b")
+        }
+        pool = self.make_pool(clients)
+        results = [pool.call(lambda client: client.invoke_model(), MODEL_NAME) for _ in range(5)]
+        self.assertEqual(results, ["b"] * 5)
+    
+    def test_throttled_region_traffic_shifts(self):
+        clients = {
+            "a": FakeRuntime("a", "ThrottlingException"),
+            "b": FakeRuntime("b", latency=0.005),
+            "c": FakeRuntime("c", latency=0.005)
+        }
+        pool = self.make_pool(clients)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda index: pool.call(lambda client: client.invoke_model(), MODEL_NAME, f"frame-{index}"),
+                range(80)
+            ))
+        
+        self.assertEqual(len(results), 80)
+        self.assertNotIn("a", results)
+        self.assertGreater(results.count("b"), 0)
+        self.assertGreater(results.count("c"), 0)
+        self.assertEqual(pool.stats["failed"], 0)
+        self.assertLess(pool.limiters["a"].limit, 4)
+    
+    def test_dead_letters_are_bounded(self):
+        clients = {"a": FakeRuntime("a", "ValidationException")}
+        pool = self.make_pool(clients, max_dead_letters=5)
+        for index in range(12):
+            with self.assertRaises(ClientError):
+                pool.call(lambda client: client.invoke_model(), MODEL_NAME, f"frame-{index}")
+        self.assertEqual(list(pool.dead_letters), [f"frame-{index}" for index in range(7, 12)])
+    
+    def test_stream_holds_slot_until_consumed(self):
+        clients = {"a": FakeRuntime("a")}
+        pool = self.make_pool(clients)
+        limiter = pool.limiters["a"]
+        stream = pool.call_stream(lambda client: client.invoke_model_with_response_stream(), MODEL_NAME)
+        
+        self.assertEqual(next(stream), {"chunk": 0})
+        self.assertEqual(limiter.in_flight, 1)
+        self.assertEqual(list(stream), [{"chunk": 1}, {"chunk": 2}])
+        self.assertEqual(limiter.in_flight, 0)
+    
+    def test_stream_throttle_updates_region_health(self):
+        clients = {"a": FakeRuntime("a", stream_error_code="throttlingException")}
+        pool = self.make_pool(clients)
+        limiter = pool.limiters["a"]
+        stream = pool.call_stream(lambda client: client.invoke_model_with_response_stream(), MODEL_NAME, "frame-0")
+        with self.assertRaises(EventStreamError):
+            list(stream)
+        
+        self.assertGreater(pool.health["a"]["throttled_at"], 0.0)
+        self.assertLess(limiter.limit, 4)
+        self.assertEqual(limiter.stats["throttled"], 1)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual((pool.stats["throttled"], pool.stats["failed"]), (1, 1))
+        self.assertEqual(list(pool.dead_letters), ["frame-0"])
+    
+    def test_stream_service_error_marks_region_unhealthy(self):
+        clients = {"a": FakeRuntime("a", stream_error_code="internalServerException")}
+        pool = self.make_pool(clients, unhealthy_after=2)
+        for _ in range(2):
+            with self.assertRaises(EventStreamError):
+                list(pool.call_stream(lambda client: client.invoke_model_with_response_stream(), MODEL_NAME))
+        
+        self.assertEqual(pool.limiters["a"].stats["errors"], 2)
+        self.assertGreater(pool.health["a"]["disabled_until"], time.monotonic())
+    
+    def test_stats_are_exact_under_concurrency(self):
+        clients = {"a": FakeRuntime("a"), "b": FakeRuntime("b")}
+        pool = self.make_pool(clients, initial_limit=32, max_limit=64)
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            list(executor.map(lambda _: pool.call(lambda client: client.invoke_model(), MODEL_NAME), range(2000)))
+        
+        self.assertEqual(pool.stats["calls"], 2000)
+        self.assertEqual(sum(limiter.stats["calls"] for limiter in pool.limiters.values()), 2000)
+
+if __name__ == "__main__":
+    unittest.main()
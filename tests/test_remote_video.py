@@ -0,0 +1,165 @@
+"""远程视频按需读取的测试
+
+用本地支持Range请求的HTTP服务器代替S3预签名URL，测试视频由OpenCV现场生成。
+运行: python -m pytest tests 或 python -m unittest discover
+"""
+import http.server
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+import cv2
+import numpy as np
+
+import core
+from tests import use_temp_results_store
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """只读的静态文件服务，支持 Range: bytes=start-end，并记录每个请求的Range头"""
+    protocol_version = "HTTP/1.1"
+    root = None
+    requests = []
+    
+    def do_GET(self):
+        path = os.path.join(self.root, self.path.split("?")[0].lstrip("/"))
+        if not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        
+        size = os.path.getsize(path)
+        byte_range = self.headers.get("Range")
+        start, end = 0, size - 1
+        if byte_range:
+            match = re.match(r"bytes=(\d*)-(\d*)", byte_range)
+            start = int(match.group(1) or 0)
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"stand-in"')
+        self.end_headers()
+        RangeRequestHandler.requests.append(byte_range)
+        with open(path, "rb") as f:
+            f.seek(start)
+            self.wfile.write(f.read(end - start + 1))
+    
+    def log_message(self, *args):
+        pass
+
+def write_test_video(path, frame_count=48, fps=12, size=(320, 240)):
+    """写入一段每秒字幕变化一次的测试视频"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for index in range(frame_count):
+        frame = np.full((size[1], size[0], 3), 40, dtype=np.uint8)
+        cv2.rectangle(frame, (index * 5 % size[0], 20), (index * 5 % size[0] + 30, 60), (0, 160, 255), -1)
+        cv2.putText(frame, f"subtitle {index // fps}", (20, size[1] - 30), cv2.FONT_HERSHEY_SIMPLEX, 1,
+                    (255, 255, 255), 2)
+        writer.write(frame)
+    writer.release()
+
+@unittest.skipUnless(hasattr(cv2, "IStreamReader"), "OpenCV版本不支持从文件对象读取视频")
+class RangeVideoReaderTest(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        write_test_video(os.path.join(cls.root, "video.mp4"))
+        RangeRequestHandler.root = cls.root
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/video.mp4"
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.root, ignore_errors=True)
+    
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.store = use_temp_results_store(self)
+        RangeRequestHandler.requests.clear()
+    
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+    
+    def open_reader(self):
+        return core.RangeVideoReader(self.url, chunk_size=16 * 1024, cache_dir=self.cache_dir)
+    
+    def decode_frames(self, source, *args):
+        capture = cv2.VideoCapture(source, *args)
+        frames = []
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frames.append(frame)
+        capture.release()
+        return frames
+    
+    def test_reads_match_local_file(self):
+        reader = self.open_reader()
+        with open(os.path.join(self.root, "video.mp4"), "rb") as f:
+            data = f.read()
+        self.assertEqual(reader.size, len(data))
+        reader.seek(20000)
+        self.assertEqual(reader.read(50000), data[20000:70000])
+        reader.seek(-100, os.SEEK_END)
+        self.assertEqual(reader.read(), data[-100:])
+        self.assertTrue(all(header and header.startswith("bytes=") for header in RangeRequestHandler.requests))
+    
+    def test_decoded_frames_match_local_file(self):
+        local_frames = self.decode_frames(os.path.join(self.root, "video.mp4"))
+        remote_frames = self.decode_frames(self.open_reader(), cv2.CAP_FFMPEG, [])
+        self.assertEqual(len(remote_frames), len(local_frames))
+        for remote, local in zip(remote_frames, local_frames):
+            self.assertTrue(np.array_equal(remote, local))
+    
+    def test_second_open_uses_chunk_cache(self):
+        first = self.open_reader()
+        self.decode_frames(first, cv2.CAP_FFMPEG, [])
+        self.assertGreater(first.stats["fetched_chunks"], 1)
+        
+        # 第二次只需要读取第一个字节获取大小和ETag，内容全部来自块缓存
+        RangeRequestHandler.requests.clear()
+        second = self.open_reader()
+        self.decode_frames(second, cv2.CAP_FFMPEG, [])
+        self.assertEqual(second.stats["fetched_chunks"], 0)
+        self.assertGreater(second.stats["cached_chunks"], 0)
+        self.assertEqual(RangeRequestHandler.requests, ["bytes=0-0"])
+    
+    def test_prune_keeps_cache_under_limit(self):
+        reader = self.open_reader()
+        reader.read()
+        core.prune_remote_video_cache(self.cache_dir, max_bytes=40 * 1024)
+        cached_bytes = sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, files in os.walk(self.cache_dir) for name in files)
+        self.assertLessEqual(cached_bytes, 40 * 1024)
+    
+    def test_missing_object_raises(self):
+        import urllib.error
+        with self.assertRaises(urllib.error.HTTPError):
+            core.RangeVideoReader(self.url.replace("video.mp4", "missing.mp4"), cache_dir=self.cache_dir)
+    
+    def test_extract_frames_from_url_matches_local(self):
+        _, local_frames = core.extract_video_frames(os.path.join(self.root, "video.mp4"),
+                                                    0, 160, 320, 80, 1, max_frames=4)
+        _, remote_frames = core.extract_video_frames(self.url, 0, 160, 320, 80, 1, max_frames=4)
+        self.assertEqual(len(remote_frames), 4)
+        self.assertEqual(len(remote_frames), len(local_frames))
+        for remote, local in zip(remote_frames, local_frames):
+            with open(remote, "rb") as a, open(local, "rb") as b:
+                self.assertEqual(a.read(), b.read())
+        # 提取记录写入临时结果库
+        self.assertEqual(len(self.store.frame_videos(remote_frames)), 4)
+
+if __name__ == "__main__":
+    unittest.main()
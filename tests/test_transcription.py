@@ -0,0 +1,53 @@
+"""转录任务后处理的测试
+
+转录结果、字幕下载和AWS Translate都用本地函数代替，不需要AWS账户。
+"""
+import unittest
+from unittest import mock
+
+import core
+from tests import use_temp_results_store
+
+JOB = {
+    "LanguageCode": "en-US",
+    "Transcript": {"TranscriptFileUri": "https://example.invalid/transcript.json"},
+    "Subtitles": {"SubtitleFileUris": ["https://example.invalid/job.srt?token=x"]}
+}
+
+def fake_translate(text, source_language_code, translate_client=None):
+    return f"<{text}>"
+
+class PostprocessTranscriptionJobTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.store = use_temp_results_store(self)
+        for name, value in (("get_translate_client", lambda: None), ("translate_text", fake_translate)):
+            patcher = mock.patch.object(core, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def run_job(self, transcript, cue_texts):
+        cues = [{"index": str(index), "text": text} for index, text in enumerate(cue_texts, start=1)]
+        with mock.patch.object(core, "download_transcript_text", return_value=transcript), \
+                mock.patch.object(core, "parse_subtitle_file", return_value={"parsed_content": cues}):
+            *_, result = core.postprocess_transcription_job("job", JOB)
+        return result
+    
+    def test_cue_translations_keep_source_separator(self):
+        result = self.run_job("Hello there. How are you?", ["Hello there.", "How are you?"])
+        self.assertEqual(result["translated_transcript"], "<Hello there.> <How are you?>")
+        self.assertEqual(self.store.get_transcription_result("job")["translated_transcript"],
+                         result["translated_transcript"])
+    
+    def test_unspaced_source_joins_without_separator(self):
+        result = self.run_job("こんにちは。元気ですか？", ["こんにちは。", "元気ですか？"])
+        self.assertEqual(result["translated_transcript"], "<こんにちは。><元気ですか？>")
+    
+    def test_chunk_translations_keep_source_separator(self):
+        split = core.split_text_for_translation
+        with mock.patch.object(core, "split_text_for_translation", lambda text: split(text, max_bytes=24)):
+            result = self.run_job("First sentence here. Second sentence here.", ["Unrelated cue."])
+        self.assertEqual(result["translated_transcript"], "<First sentence here.> <Second sentence here.>")
+
+if __name__ == "__main__":
+    unittest.main()